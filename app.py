@@ -1,7 +1,8 @@
 import streamlit as st
 import config
+from utils import tracing
 from utils.session_state import init_session_state
-from components.sidebar import render_sidebar
+from components.sidebar import render_sidebar, render_debug_panel
 from components.upload_step import run_upload_step
 
 # 세션 초기화
@@ -24,5 +25,9 @@ PDF 분석 시 발생하는 환각(할루시네이션) 효과를 최소화 하
 페이지별 분석 결과는 테이블 형태로 제공되며, 엑셀로 복사할 수 있습니다.
 """)
 
-# PDF 업로드 및 분석 실행
-run_upload_step()
+# PDF 업로드 및 분석 실행 (실행 단위로 추적)
+with tracing.span("app_run"):
+    run_upload_step()
+
+# 사이드바 디버그 패널 (마지막 분석의 추적 정보)
+render_debug_panel()
@@ -0,0 +1,2 @@
+# benchmarks/__init__.py
+"""성능 측정 스크립트 모듈"""
\ No newline at end of file
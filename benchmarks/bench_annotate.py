@@ -0,0 +1,72 @@
+# bench_annotate.py - 페이지 번호 삽입 방식 비교
+#
+# 실행: python -m benchmarks.bench_annotate [PDF 경로] [--repeat N]
+
+import argparse, io
+from PyPDF2 import PdfReader, PdfWriter
+from reportlab.pdfgen import canvas
+from reportlab.lib.units import mm
+from services.pdf_service import PdfDocument
+from benchmarks.bench_pdf_document import DEFAULT_PDF, measure
+
+def legacy_annotate(pdf_bytes):
+    """기존 방식: 페이지마다 ReportLab 캔버스 생성 → 직렬화 → 재파싱 후 병합"""
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    writer = PdfWriter()
+    for idx, page in enumerate(reader.pages):
+        width = float(page.mediabox.width)
+        height = float(page.mediabox.height)
+
+        packet = io.BytesIO()
+        c = canvas.Canvas(packet, pagesize=(width, height))
+        c.setFont("Helvetica", 9)
+        c.drawString(10 * mm, height - 15 * mm, str(idx + 1))
+        c.save()
+
+        packet.seek(0)
+        overlay_pdf = PdfReader(packet)
+        page.merge_page(overlay_pdf.pages[0])
+        writer.add_page(page)
+
+    output_stream = io.BytesIO()
+    writer.write(output_stream)
+    return output_stream.getvalue()
+
+def single_pass_annotate(pdf_bytes):
+    """오버레이를 한 번의 캔버스 패스로 만들어 전체 문서에 병합"""
+    document = PdfDocument(pdf_bytes)
+    return document.write_pages(range(1, document.page_count + 1), stamp_page_numbers=True)
+
+def streamed_batches(pdf_bytes, batch_size=10):
+    """배치 분할과 동시에 번호 삽입 (전체 번호 문서를 만들지 않음)"""
+    document = PdfDocument(pdf_bytes)
+    for batch in document.iter_batches(batch_size):
+        document.slice_bytes(batch['start_page'], batch['end_page'], stamp_page_numbers=True)
+
+def legacy_annotate_then_split(pdf_bytes, batch_size=10):
+    """기존 파이프라인: 전체 번호 문서 생성 후 다시 파싱하여 분할"""
+    annotated = legacy_annotate(pdf_bytes)
+    document = PdfDocument(annotated)
+    for batch in document.iter_batches(batch_size):
+        document.slice_bytes(batch['start_page'], batch['end_page'])
+
+def main():
+    parser = argparse.ArgumentParser(description="페이지 번호 삽입 벤치마크")
+    parser.add_argument("pdf", nargs="?", default=DEFAULT_PDF)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with open(args.pdf, "rb") as f:
+        pdf_bytes = f.read()
+
+    results = {
+        "기존 (페이지별 캔버스)": measure(legacy_annotate, pdf_bytes, repeat=args.repeat),
+        "단일 패스 오버레이": measure(single_pass_annotate, pdf_bytes, repeat=args.repeat),
+        "기존 삽입 + 분할": measure(legacy_annotate_then_split, pdf_bytes, repeat=args.repeat),
+        "분할 중 삽입 (스트리밍)": measure(streamed_batches, pdf_bytes, repeat=args.repeat),
+    }
+    for name, seconds in results.items():
+        print(f"{name:<24} {seconds:.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# bench_batching.py - 배치 구성 전략 비교 (고정 크기 vs 적응형)
+#
+# 실제 API를 호출하지 않고, 배치 토큰 수에 비례하는 지연 모델로 처리 시간을 모의합니다.
+# 실행: python -m benchmarks.bench_batching [PDF 경로] [--concurrency N] [--runs N]
+
+import argparse, time
+from services.pdf_service import PdfDocument
+from services.batch_service import AdaptiveBatchPlanner, estimate_page_tokens, plan_fixed_batches
+from benchmarks.bench_pdf_document import DEFAULT_PDF
+
+# 모의 지연 모델: 호출당 고정 지연 + 토큰당 처리 시간, 토큰이 한도를 넘으면 시간 초과
+CALL_OVERHEAD_SECONDS = 2.0
+SECONDS_PER_TOKEN = 0.0015
+TIMEOUT_TOKENS = 30000
+TIMEOUT_SECONDS = 60.0
+
+def batch_tokens(document, batch):
+    return sum(estimate_page_tokens(document.page_stats(page_num)) for page_num in batch['pages'])
+
+def simulate(document, batches, concurrency):
+    """배치 목록의 모의 처리 결과 (벽시계 시간, 시간 초과 수, 배치별 지연)"""
+    latencies = []
+    timeouts = 0
+    for batch in batches:
+        tokens = batch_tokens(document, batch)
+        if tokens > TIMEOUT_TOKENS:
+            timeouts += 1
+            latencies.append(TIMEOUT_SECONDS)
+        else:
+            latencies.append(CALL_OVERHEAD_SECONDS + tokens * SECONDS_PER_TOKEN)
+
+    # concurrency개 작업자에 순서대로 배정했을 때의 완료 시각
+    workers = [0.0] * concurrency
+    for latency in latencies:
+        idx = workers.index(min(workers))
+        workers[idx] += latency
+    return max(workers) if workers else 0.0, timeouts, latencies
+
+def report(name, document, batches, concurrency, plan_seconds):
+    wall, timeouts, latencies = simulate(document, batches, concurrency)
+    sizes = [len(batch['pages']) for batch in batches]
+    print(
+        f"{name:<18} 배치 {len(batches):>4}개 | 페이지/배치 {min(sizes)}-{max(sizes)} | "
+        f"최대 지연 {max(latencies):5.1f}s | 시간 초과 {timeouts}개 | 모의 소요 {wall:6.1f}s | 계획 {plan_seconds:.3f}s"
+    )
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description="배치 구성 전략 벤치마크")
+    parser.add_argument("pdf", nargs="?", default=DEFAULT_PDF)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=3, help="적응형 계획기 학습 반복 횟수")
+    args = parser.parse_args()
+
+    with open(args.pdf, "rb") as f:
+        document = PdfDocument(f.read())
+    print(f"문서: {args.pdf} ({document.page_count}페이지)")
+
+    for batch_size in (5, 10, 20):
+        start = time.perf_counter()
+        batches = plan_fixed_batches(document, batch_size=batch_size)
+        report(f"fixed({batch_size})", document, batches, args.concurrency, time.perf_counter() - start)
+
+    planner = AdaptiveBatchPlanner()
+    for run in range(args.runs):
+        start = time.perf_counter()
+        batches = planner.plan(document)
+        latencies = report(f"adaptive(run {run + 1})", document, batches, args.concurrency, time.perf_counter() - start)
+        # 모의 결과를 계획기에 반영하여 다음 실행에서 예산 조정
+        for batch, latency in zip(batches, latencies):
+            planner.record(batch, latency, None if latency < TIMEOUT_SECONDS else TimeoutError())
+        print(f"{'':<18} → 다음 토큰 예산: {planner.token_budget}")
+
+if __name__ == "__main__":
+    main()
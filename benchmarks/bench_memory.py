@@ -0,0 +1,81 @@
+# bench_memory.py - 대용량 PDF의 최대 RSS 비교 (메모리 로드 vs 저메모리 모드)
+#
+# 합성 다중 페이지 PDF를 만들어 모드별로 새 프로세스에서 처리하고 최대 RSS를 측정합니다.
+# 분석 단계는 가짜 모델 백엔드를 사용하므로 API를 호출하지 않습니다.
+# 실행: python -m benchmarks.bench_memory [--pages 3000] [--max-peak-mb N]
+
+import argparse, multiprocessing, os, sys, tempfile, time
+from concurrent.futures import ProcessPoolExecutor
+from benchmarks.run_benchmarks import make_synthetic_pdf, current_rss_mb, peak_rss_mb
+
+MODES = ("in_memory", "low_memory")
+
+def run_mode(mode, pdf_path, cache_dir):
+    """작업 프로세스에서 문서 파싱 → 페이지 통계 → 배치 생성 → (가짜) 분석을 실행하고 측정값 반환"""
+    os.environ["PDF_ANALYZER_CACHE_DIR"] = cache_dir
+    os.environ["PDF_ANALYZER_STATE_DIR"] = os.path.join(cache_dir, "state")
+    os.environ["MODEL_BACKEND"] = "fake"
+
+    from services.model_service import FakeBackend, set_model_backend
+    from services.pdf_service import PdfDocument, get_pdf_document
+    from services.gemini_service import split_pdf_for_batch_analysis, cleanup_batch_files
+    from services.pipeline_service import analyze_question
+
+    set_model_backend(FakeBackend())
+    baseline = current_rss_mb()
+    start = time.perf_counter()
+
+    if mode == "in_memory":
+        # 기존 방식: 전체 바이트를 메모리에 올리고 배치 파일을 모두 먼저 생성
+        with open(pdf_path, "rb") as f:
+            document = PdfDocument(f.read())
+        for page_num in range(1, document.page_count + 1):
+            document.page_stats(page_num)
+        cleanup_batch_files(split_pdf_for_batch_analysis(document, lazy=False))
+        analyze_question(document, "capital requirement", validate=False, summarize=False)
+    else:
+        # 저메모리 모드: mmap 문서 + 배치를 분석 시점에 하나씩 생성
+        document = get_pdf_document(pdf_path)
+        for page_num in range(1, document.page_count + 1):
+            document.page_stats(page_num)
+        analyze_question(document, "capital requirement", validate=False, summarize=False)
+
+    return {
+        'mode': mode,
+        'pages': document.page_count,
+        'seconds': round(time.perf_counter() - start, 2),
+        'baseline_rss_mb': baseline,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="대용량 PDF 최대 RSS 벤치마크")
+    parser.add_argument("--pages", type=int, default=3000, help="합성 PDF 페이지 수")
+    parser.add_argument("--pdf", default=None, help="합성 PDF 대신 사용할 PDF 경로")
+    parser.add_argument("--max-peak-mb", type=float, default=None, help="저메모리 모드 최대 RSS 상한 (초과 시 종료 코드 1)")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory(prefix="pdf_analyzer_mem_") as work_dir:
+        pdf_path = args.pdf or make_synthetic_pdf(os.path.join(work_dir, f"synthetic_{args.pages}p.pdf"), args.pages)
+        print(f"문서: {pdf_path} ({os.path.getsize(pdf_path) / 1024 / 1024:.1f}MB)")
+
+        results = {}
+        for mode in MODES:
+            cache_dir = tempfile.mkdtemp(dir=work_dir, prefix=f"{mode}_")
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(run_mode, mode, pdf_path, cache_dir).result()
+            results[mode] = result
+            print(
+                f"{mode:<11} {result['pages']}페이지 {result['seconds']:>7.2f}s | "
+                f"시작 RSS {result['baseline_rss_mb'] or 0:7.1f}MB → 최대 RSS {result['peak_rss_mb']:7.1f}MB"
+            )
+
+    low_peak = results['low_memory']['peak_rss_mb']
+    print(f"최대 RSS 감소: {results['in_memory']['peak_rss_mb'] - low_peak:.1f}MB")
+    if args.max_peak_mb is not None and low_peak > args.max_peak_mb:
+        print(f"저메모리 모드 최대 RSS {low_peak:.1f}MB가 상한 {args.max_peak_mb:.1f}MB를 넘었습니다.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
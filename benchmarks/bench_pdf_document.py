@@ -0,0 +1,75 @@
+# bench_pdf_document.py - PdfReader 반복 파싱 vs PdfDocument 공유 비교
+#
+# 실행: python -m benchmarks.bench_pdf_document [PDF 경로] [--repeat N]
+
+import argparse, io, time
+from PyPDF2 import PdfReader, PdfWriter
+from services.pdf_service import PdfDocument
+
+DEFAULT_PDF = "Filereference/K-ICS 해설서.pdf"
+
+def legacy_pipeline(pdf_bytes, batch_size, preview_pages):
+    """기존 방식: 단계마다 PdfReader로 다시 파싱"""
+    # 페이지 번호 삽입 단계의 파싱 + 페이지 크기 조회
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    sizes = [(float(p.mediabox.width), float(p.mediabox.height)) for p in reader.pages]
+
+    # 배치 분할 단계의 파싱
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    total_pages = len(reader.pages)
+    for start_idx in range(0, total_pages, batch_size):
+        writer = PdfWriter()
+        for i in range(start_idx, min(start_idx + batch_size, total_pages)):
+            writer.add_page(reader.pages[i])
+        writer.write(io.BytesIO())
+
+    # 미리보기용 단일 페이지 추출마다 파싱
+    for page_num in preview_pages:
+        reader = PdfReader(io.BytesIO(pdf_bytes))
+        writer = PdfWriter()
+        writer.add_page(reader.pages[page_num - 1])
+        writer.write(io.BytesIO())
+    return sizes
+
+def document_pipeline(pdf_bytes, batch_size, preview_pages):
+    """PdfDocument 방식: 한 번 파싱한 문서를 공유"""
+    document = PdfDocument(pdf_bytes)
+    sizes = [document.page_size(n) for n in range(1, document.page_count + 1)]
+    for batch in document.iter_batches(batch_size):
+        document.slice_bytes(batch['start_page'], batch['end_page'])
+    for page_num in preview_pages:
+        document.write_pages([page_num])
+    return sizes
+
+def measure(fn, *args, repeat=3):
+    """repeat회 실행 중 최소 소요 시간(초)"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="PdfDocument 파싱 공유 벤치마크")
+    parser.add_argument("pdf", nargs="?", default=DEFAULT_PDF)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--previews", type=int, default=20, help="미리보기 페이지 추출 횟수")
+    args = parser.parse_args()
+
+    with open(args.pdf, "rb") as f:
+        pdf_bytes = f.read()
+    page_count = PdfDocument(pdf_bytes).page_count
+    preview_pages = [1 + (i * 7) % page_count for i in range(args.previews)]
+
+    legacy = measure(legacy_pipeline, pdf_bytes, args.batch_size, preview_pages, repeat=args.repeat)
+    shared = measure(document_pipeline, pdf_bytes, args.batch_size, preview_pages, repeat=args.repeat)
+
+    print(f"문서: {args.pdf} ({page_count}페이지, {len(pdf_bytes) / 1024 / 1024:.1f}MB)")
+    print(f"기존 (반복 파싱):    {legacy:.3f}s")
+    print(f"PdfDocument (공유): {shared:.3f}s")
+    print(f"개선 배율: {legacy / shared:.2f}x")
+
+if __name__ == "__main__":
+    main()
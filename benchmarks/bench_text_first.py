@@ -0,0 +1,96 @@
+# bench_text_first.py - 파일 업로드 분석과 텍스트 우선 분석의 전송량/토큰/시간 비교
+#
+# 같은 PDF를 모드별로 새 프로세스에서 분석하고, 추적 span에서 업로드/텍스트 전송 바이트와
+# 예상 입력 토큰을 합산합니다. 가짜 모델 백엔드를 사용하므로 API를 호출하지 않습니다.
+# 실행: python -m benchmarks.bench_text_first [PDF ...] [--pages 300] [--output text_first.json]
+
+import argparse, json, multiprocessing, os, tempfile, time
+from concurrent.futures import ProcessPoolExecutor
+from benchmarks.run_benchmarks import make_synthetic_pdf, peak_rss_mb
+
+MODES = ("file", "text_first")
+
+def run_mode(mode, pdf_path, cache_dir, latency):
+    """작업 프로세스에서 한 모드로 배치 분석을 실행하고 측정값 반환"""
+    os.environ["PDF_ANALYZER_CACHE_DIR"] = cache_dir
+    os.environ["PDF_ANALYZER_STATE_DIR"] = os.path.join(cache_dir, "state")
+    os.environ["MODEL_BACKEND"] = "fake"
+
+    from services.model_service import FakeBackend, set_model_backend
+    from services.batch_service import is_text_batch
+    from services.pdf_service import get_pdf_document
+    from services.gemini_service import prepare_analysis_batches, find_relevant_pages_with_gemini
+    from utils import tracing
+
+    backend = FakeBackend(latency=latency)
+    set_model_backend(backend)
+    document = get_pdf_document(pdf_path)
+    question = "capital requirement"
+
+    start = time.perf_counter()
+    with tracing.span("bench_text_first") as root:
+        batches, _ = prepare_analysis_batches(document, question, text_first=(mode == "text_first"))
+        pages, _ = find_relevant_pages_with_gemini(question, pdf_bytes=document, refined_prompt=question, batches=batches)
+    seconds = time.perf_counter() - start
+
+    totals = tracing.summarize_trace(root.trace_id)['totals']
+    estimated_tokens = sum(
+        span['attributes'].get('estimated_tokens', 0)
+        for span in tracing.export_json(root.trace_id) if span['name'] == "gemini.generate_content"
+    )
+    return {
+        'mode': mode,
+        'pages': document.page_count,
+        'batches': len(batches),
+        'text_batches': sum(1 for batch in batches if is_text_batch(batch)),
+        'found_pages': len(pages),
+        'seconds': round(seconds, 3),
+        'upload_bytes': totals['upload_bytes'],
+        'text_bytes': totals['text_bytes'],
+        'payload_bytes': totals['upload_bytes'] + totals['text_bytes'],
+        'estimated_tokens': estimated_tokens,
+        'backend_calls': backend.call_counts(),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="텍스트 우선 분석 벤치마크 (가짜 모델 백엔드)")
+    parser.add_argument("pdfs", nargs="*", help="비교할 PDF (생략 시 합성 PDF)")
+    parser.add_argument("--pages", type=int, default=300, help="합성 PDF 페이지 수")
+    parser.add_argument("--latency", type=float, default=0.2, help="가짜 모델 호출 지연 (초)")
+    parser.add_argument("--output", default=None, help="결과 JSON 저장 경로")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    results = []
+    with tempfile.TemporaryDirectory(prefix="pdf_analyzer_text_first_") as work_dir:
+        pdf_paths = args.pdfs or [make_synthetic_pdf(os.path.join(work_dir, f"synthetic_{args.pages}p.pdf"), args.pages)]
+        for pdf_path in pdf_paths:
+            by_mode = {}
+            for mode in MODES:
+                cache_dir = tempfile.mkdtemp(dir=work_dir, prefix=f"{mode}_")
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    result = executor.submit(run_mode, mode, pdf_path, cache_dir, args.latency).result()
+                result['pdf'] = os.path.basename(pdf_path)
+                by_mode[mode] = result
+                results.append(result)
+                print(
+                    f"{result['pdf']:<28} {mode:<10} {result['seconds']:>8.2f}s  배치 {result['batches']:>4} "
+                    f"(텍스트 {result['text_batches']:>4})  전송 {result['payload_bytes'] / 1024:>9.1f}KB  "
+                    f"예상 토큰 {result['estimated_tokens']:>9}"
+                )
+            file_result, text_result = by_mode["file"], by_mode["text_first"]
+            if file_result['payload_bytes'] and file_result['estimated_tokens']:
+                print(
+                    f"{'':<28} 전송량 {text_result['payload_bytes'] / file_result['payload_bytes']:.0%}, "
+                    f"토큰 {text_result['estimated_tokens'] / file_result['estimated_tokens']:.0%}, "
+                    f"시간 {text_result['seconds'] / file_result['seconds']:.0%} (파일 업로드 대비)"
+                )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({'created_at': time.strftime("%Y-%m-%dT%H:%M:%S%z"), 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"결과 저장: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+# run_benchmarks.py - API 할당량 없이 단계별 성능을 측정하는 벤치마크 모음
+#
+# 가짜 모델 백엔드(FakeBackend)를 사용하므로 실제 API를 호출하지 않습니다.
+# 각 (문서, 단계)는 별도 프로세스에서 실행하여 최대 RSS를 단계별로 측정하고,
+# 결과는 회귀 추적용 JSON으로 저장합니다.
+# 실행: python -m benchmarks.run_benchmarks [PDF ...] [--synthetic-pages 1000] [--output bench.json]
+
+import argparse, glob, json, multiprocessing, os, platform, resource, tempfile, time
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_PDFS = sorted(glob.glob("Filereference/*.pdf"))
+STAGES = ("parse", "annotate", "split", "render", "response_parse", "end_to_end")
+BENCHMARK_QUESTION = "요구자본의 정의"
+
+def make_synthetic_pdf(path, page_count):
+    """텍스트 줄이 채워진 page_count페이지짜리 합성 PDF 생성"""
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import A4
+
+    c = canvas.Canvas(path, pagesize=A4)
+    width, height = A4
+    for page_num in range(1, page_count + 1):
+        c.setFont("Helvetica", 10)
+        for line in range(40):
+            c.drawString(50, height - 60 - line * 18, f"Synthetic page {page_num} line {line}: capital requirement risk solvency ratio")
+        c.showPage()
+    c.save()
+    return path
+
+def current_rss_mb():
+    """현재 RSS (MB, /proc를 읽을 수 없으면 None)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def peak_rss_mb():
+    """프로세스 최대 RSS (MB)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS는 바이트, Linux는 KB 단위
+    return peak / 1024 / 1024 if platform.system() == "Darwin" else peak / 1024
+
+def run_stage(stage, pdf_path, cache_dir, backend_options, repeat):
+    """작업 프로세스에서 단계 하나를 실행하고 측정값 dict 반환"""
+    # 서비스 모듈을 불러오기 전에 캐시/작업 저장소 위치를 격리
+    os.environ["PDF_ANALYZER_CACHE_DIR"] = cache_dir
+    os.environ["PDF_ANALYZER_STATE_DIR"] = os.path.join(cache_dir, "state")
+    os.environ["MODEL_BACKEND"] = "fake"
+
+    from services.model_service import FakeBackend, set_model_backend
+    from services.pdf_service import PdfDocument
+    from services.batch_service import BatchStream
+    from services.gemini_service import (
+        split_pdf_for_batch_analysis, parse_page_info, get_model_call_count
+    )
+    from services.pipeline_service import analyze_question
+    from utils.rate_limiter import get_retry_metrics
+
+    backend = FakeBackend(**backend_options)
+    set_model_backend(backend)
+
+    with open(pdf_path, "rb") as f:
+        pdf_bytes = f.read()
+    page_count = PdfDocument(pdf_bytes).page_count
+
+    def parse():
+        document = PdfDocument(pdf_bytes)
+        for page_num in range(1, document.page_count + 1):
+            document.page_stats(page_num)
+
+    def annotate():
+        document = PdfDocument(pdf_bytes)
+        document.write_pages(range(1, document.page_count + 1), stamp_page_numbers=True)
+
+    def split():
+        # 배치 계획 후 스트림으로 배치 PDF를 차례로 생성/삭제
+        document = PdfDocument(pdf_bytes)
+        with BatchStream(document, split_pdf_for_batch_analysis(document)) as stream:
+            for _ in stream:
+                pass
+
+    def render():
+        document = PdfDocument(pdf_bytes)
+        for page_num in range(1, min(10, document.page_count) + 1):
+            document.render_page(page_num)
+
+    responses = [
+        backend.respond(f"이 PDF는 전체 문서의 {start}페이지부터 {min(start + 9, page_count)}페이지까지만 포함합니다.")
+        for start in range(1, page_count + 1, 10)
+    ]
+
+    def response_parse():
+        for response in responses:
+            parse_page_info(response)
+
+    run_count = [0]
+
+    def end_to_end():
+        # 실행마다 질문을 바꿔 캐시/작업 저장소 재사용 없이 전체 경로를 측정
+        run_count[0] += 1
+        analyze_question(pdf_bytes, f"{BENCHMARK_QUESTION} (run {run_count[0]})")
+
+    fn = {
+        'parse': parse, 'annotate': annotate, 'split': split, 'render': render,
+        'response_parse': response_parse, 'end_to_end': end_to_end,
+    }[stage]
+
+    baseline_rss = current_rss_mb()
+    calls_before = get_model_call_count()
+    durations = []
+    error = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            break
+        durations.append(time.perf_counter() - start)
+
+    best = min(durations) if durations else None
+    return {
+        'pdf': pdf_path,
+        'pages': page_count,
+        'stage': stage,
+        'runs': len(durations),
+        'best_seconds': best,
+        'mean_seconds': sum(durations) / len(durations) if durations else None,
+        'pages_per_second': page_count / best if best else None,
+        'baseline_rss_mb': baseline_rss,
+        'peak_rss_mb': peak_rss_mb(),
+        'model_calls': get_model_call_count() - calls_before,
+        'backend_calls': backend.call_counts(),
+        'retry_metrics': get_retry_metrics().snapshot(),
+        'error': error,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="오프라인 단계별 벤치마크 (가짜 모델 백엔드)")
+    parser.add_argument("pdfs", nargs="*", default=DEFAULT_PDFS)
+    parser.add_argument("--synthetic-pages", type=int, nargs="*", default=[1000], help="생성할 합성 PDF 페이지 수 (0이면 생략)")
+    parser.add_argument("--stages", nargs="*", default=list(STAGES), choices=STAGES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.2, help="가짜 모델 호출 지연 (초)")
+    parser.add_argument("--latency-jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="일시 오류 주입 비율")
+    parser.add_argument("--quota-error-rate", type=float, default=0.0, help="429 주입 비율")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    backend_options = {
+        'latency': args.latency,
+        'latency_jitter': args.latency_jitter,
+        'error_rate': args.error_rate,
+        'quota_error_rate': args.quota_error_rate,
+        'seed': args.seed,
+    }
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="pdf_analyzer_bench_") as work_dir:
+        pdf_paths = list(args.pdfs)
+        for page_count in args.synthetic_pages:
+            if page_count > 0:
+                pdf_paths.append(make_synthetic_pdf(os.path.join(work_dir, f"synthetic_{page_count}p.pdf"), page_count))
+
+        # spawn으로 단계마다 새 프로세스를 띄워 이전 단계의 메모리/캐시 영향을 제거
+        context = multiprocessing.get_context("spawn")
+        for pdf_path in pdf_paths:
+            for stage in args.stages:
+                cache_dir = tempfile.mkdtemp(dir=work_dir, prefix=f"{stage}_")
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    result = executor.submit(run_stage, stage, pdf_path, cache_dir, backend_options, args.repeat).result()
+                if pdf_path.startswith(work_dir):
+                    result['pdf'] = os.path.basename(pdf_path)
+                results.append(result)
+                seconds = f"{result['best_seconds']:.3f}s" if result['best_seconds'] is not None else "-"
+                throughput = f"{result['pages_per_second']:.1f}p/s" if result['pages_per_second'] else "-"
+                print(
+                    f"{os.path.basename(pdf_path):<28} {stage:<15} {seconds:>9} {throughput:>11} "
+                    f"RSS {result['peak_rss_mb']:7.1f}MB  호출 {result['model_calls']:>4}"
+                    + (f"  오류: {result['error']}" if result['error'] else "")
+                )
+
+    report = {
+        'created_at': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'backend': backend_options,
+        'repeat': args.repeat,
+        'results': results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"결과 저장: {args.output}")
+
+if __name__ == "__main__":
+    main()
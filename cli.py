@@ -0,0 +1,280 @@
+# cli.py - 브라우저 없이 PDF 폴더 × 질문 목록을 일괄 분석하는 명령줄 도구
+#
+# 실행 예: python cli.py analyze ./filings questions.txt -o results.jsonl --workers 4
+#          python cli.py analyze ./filings questions.txt -o results.csv --prefilter
+#          python cli.py index ./manuals --recursive && python cli.py query "요구자본의 정의" --analyze
+#          python cli.py cleanup-uploads
+
+import argparse, csv, json, logging, os, sys, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dotenv import load_dotenv
+
+logger = logging.getLogger("pdf_analyzer")
+
+# CSV 출력 컬럼 (웹 화면의 CSV 다운로드와 같은 한글 컬럼명 사용)
+CSV_COLUMNS = ['파일', '질문', '분석 질문', '페이지', '답변', '관련도', '최종 요약', '오류']
+
+def read_questions(path):
+    """질문 파일 읽기 (.csv는 첫 번째 열, 그 외는 한 줄에 질문 하나, #으로 시작하는 줄은 무시)"""
+    with open(path, encoding='utf-8-sig') as f:
+        if path.lower().endswith('.csv'):
+            lines = [row[0] for row in csv.reader(f) if row]
+        else:
+            lines = [line for line in f if not line.lstrip().startswith('#')]
+    return list(dict.fromkeys(line.strip() for line in lines if line.strip()))
+
+def find_pdfs(directory, recursive=False):
+    """디렉터리의 PDF 파일 경로 목록 (이름순)"""
+    if recursive:
+        paths = [
+            os.path.join(root, name)
+            for root, _, names in os.walk(directory)
+            for name in names if name.lower().endswith('.pdf')
+        ]
+    else:
+        paths = [
+            os.path.join(directory, name)
+            for name in os.listdir(directory) if name.lower().endswith('.pdf')
+        ]
+    return sorted(paths)
+
+def require_api_key():
+    """실제 Gemini 백엔드를 쓰는데 API 키가 없으면 오류를 남기고 False (가짜 백엔드는 키 불필요)"""
+    from services.model_service import MODEL_BACKEND
+
+    if MODEL_BACKEND == "fake" or os.getenv('GEMINI_API_KEY'):
+        return True
+    logger.error("GEMINI_API_KEY 환경변수(.env)가 설정되지 않았습니다.")
+    return False
+
+def init_worker(workers, log_level):
+    """작업 프로세스 초기화 (API 키 설정, API 한도를 프로세스 수로 나눔)"""
+    import google.generativeai as genai
+    from utils.rate_limiter import RateLimiter, set_rate_limiter, GEMINI_REQUESTS_PER_MINUTE, GEMINI_TOKENS_PER_MINUTE
+
+    load_dotenv()
+    logging.basicConfig(level=log_level, format="%(asctime)s [%(processName)s] %(message)s")
+    genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+    set_rate_limiter(RateLimiter(GEMINI_REQUESTS_PER_MINUTE / workers, GEMINI_TOKENS_PER_MINUTE / workers))
+
+def analyze_file(path, questions, options):
+    """작업 프로세스에서 PDF 하나를 모든 질문으로 분석하고 질문별 결과 레코드 목록 반환"""
+    from services.pipeline_service import analyze_question
+
+    name = os.path.basename(path)
+    records = []
+    try:
+        with open(path, 'rb') as f:
+            pdf_bytes = f.read()
+    except OSError as e:
+        return [{'pdf': path, 'question': question, 'error': str(e)} for question in questions]
+
+    for question in questions:
+        try:
+            result = analyze_question(
+                pdf_bytes, question,
+                on_status=lambda level, message: logger.log(logging.WARNING if level in ('warning', 'error') else logging.DEBUG, f"{name}: {message}"),
+                **options,
+            )
+            records.append({'pdf': path, **result, 'error': None})
+        except Exception as e:
+            logger.exception("%s: 질문 분석 실패 (%s)", name, question)
+            records.append({'pdf': path, 'question': question, 'error': str(e)})
+    return records
+
+class ResultWriter:
+    """분석 결과를 JSONL(질문별 한 줄) 또는 CSV(페이지별 한 줄)로 기록"""
+
+    def __init__(self, path, output_format):
+        self.output_format = output_format
+        self.file = open(path, 'w', encoding='utf-8-sig' if output_format == 'csv' else 'utf-8', newline='')
+        self.csv_writer = None
+        if output_format == 'csv':
+            self.csv_writer = csv.DictWriter(self.file, fieldnames=CSV_COLUMNS)
+            self.csv_writer.writeheader()
+
+    def write(self, record):
+        if self.output_format == 'jsonl':
+            self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        else:
+            base = {
+                '파일': record['pdf'],
+                '질문': record['question'],
+                '분석 질문': record.get('refined_question', ''),
+                '최종 요약': record.get('summary') or '',
+                '오류': record.get('error') or '',
+            }
+            rows = record.get('rows') or [{}]
+            for row in rows:
+                self.csv_writer.writerow({**base, '페이지': row.get('페이지', ''), '답변': row.get('답변', ''), '관련도': row.get('관련도', '')})
+        # 중간에 중단되어도 완료된 문서 결과는 남도록 바로 기록
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def run_analyze(args):
+    questions = read_questions(args.questions)
+    pdf_paths = find_pdfs(args.pdf_dir, recursive=args.recursive)
+    if not questions or not pdf_paths:
+        logger.error("분석할 질문(%d개) 또는 PDF(%d개)가 없습니다.", len(questions), len(pdf_paths))
+        return 1
+
+    output_format = args.format or ('csv' if args.output.lower().endswith('.csv') else 'jsonl')
+    options = {
+        'prefilter': args.prefilter,
+        'batch_strategy': args.batch_strategy,
+        'text_first': args.text_first,
+        'max_concurrency': args.max_concurrency,
+        'validate': not args.no_validate,
+        'summarize': not args.no_summary,
+    }
+    logger.info("PDF %d개 × 질문 %d개 분석 시작 (작업 프로세스 %d개)", len(pdf_paths), len(questions), args.workers)
+
+    started = time.monotonic()
+    failed = 0
+    writer = ResultWriter(args.output, output_format)
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                                 initargs=(args.workers, logger.getEffectiveLevel())) as executor:
+            futures = {executor.submit(analyze_file, path, questions, options): path for path in pdf_paths}
+            for done, future in enumerate(as_completed(futures), start=1):
+                path = futures[future]
+                try:
+                    records = future.result()
+                except Exception as e:
+                    records = [{'pdf': path, 'question': question, 'error': str(e)} for question in questions]
+                for record in records:
+                    writer.write(record)
+                errors = sum(1 for record in records if record.get('error'))
+                failed += errors
+                logger.info("[%d/%d] %s 완료%s", done, len(pdf_paths), os.path.basename(path),
+                            f" (실패 {errors}건)" if errors else "")
+    finally:
+        writer.close()
+        if not args.keep_uploads:
+            # 작업 프로세스가 모두 끝났으므로 이번 실행에서 올린 배치 파일을 바로 삭제
+            delete_uploaded_files()
+
+    logger.info("분석 완료: %.1f초, 결과 %s (실패 %d건)", time.monotonic() - started, args.output, failed)
+    return 1 if failed else 0
+
+def delete_uploaded_files():
+    """업로드 레지스트리에 등록된 원격 파일 삭제 (다른 분석이 실행 중이 아닐 때 호출)"""
+    import google.generativeai as genai
+    from services.upload_service import get_upload_registry
+
+    genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+    deleted = get_upload_registry().delete_all()
+    logger.info("업로드한 원격 파일 %d개 삭제", deleted)
+    return deleted
+
+def run_cleanup_uploads(args):
+    delete_uploaded_files()
+    return 0
+
+def run_index(args):
+    from services.corpus_service import get_corpus_index
+
+    pdf_paths = find_pdfs(args.pdf_dir, recursive=args.recursive)
+    index = get_corpus_index()
+    started = time.monotonic()
+    report = index.index_paths(
+        pdf_paths, workers=args.workers, prune=args.prune,
+        on_progress=lambda done, total, path: logger.info("[%d/%d] %s 색인 완료", done, total, os.path.basename(path)),
+    )
+    for path, error in report['failed']:
+        logger.error("%s: 색인 실패 (%s)", path, error)
+    stats = index.stats()
+    logger.info(
+        "색인 완료: %.1f초, 새로 색인 %d개 (%d페이지), 변경 없음 %d개, 제거 %d개 | 전체 %d개 문서 %d페이지",
+        time.monotonic() - started, report['indexed'], report['pages'], report['skipped'], report['removed'],
+        stats['documents'], stats['pages'],
+    )
+    return 1 if report['failed'] else 0
+
+def run_query(args):
+    from services.corpus_service import get_corpus_index, CORPUS_TOP_K
+
+    if not args.analyze:
+        # 로컬 검색만 실행 (API 호출 없음)
+        for hit in get_corpus_index().search(args.question, top_k=args.top_k or CORPUS_TOP_K):
+            snippet = " ".join(hit['text'].split())[:80]
+            print(f"{hit['score']:.3f}  {hit['path']}  p.{hit['page']}  {snippet}")
+        return 0
+
+    from services.pipeline_service import analyze_corpus_question
+
+    if not require_api_key():
+        return 1
+    init_worker(1, logger.getEffectiveLevel())
+    result = analyze_corpus_question(
+        args.question, top_k=args.top_k, max_concurrency=args.max_concurrency,
+        validate=not args.no_validate, summarize=not args.no_summary, text_first=args.text_first,
+        on_status=lambda level, message: logger.log(logging.WARNING if level in ('warning', 'error') else logging.INFO, message),
+    )
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        logger.info("결과 저장: %s", args.output)
+    for row in result['rows']:
+        print(f"{row['문서']}  p.{row['페이지']}  [{row['관련도']}] {row['답변']}")
+    if result['summary']:
+        print(f"\n{result['summary']}")
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="PDF AI 분석 도구 (명령줄 일괄 실행)")
+    parser.add_argument('-v', '--verbose', action='store_true', help="상세 로그 출력")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    analyze = subparsers.add_parser('analyze', help="PDF 폴더의 모든 문서를 질문 파일의 질문들로 분석")
+    analyze.add_argument('pdf_dir', help="PDF 파일이 있는 디렉터리")
+    analyze.add_argument('questions', help="질문 파일 (.txt: 한 줄에 하나, .csv: 첫 번째 열)")
+    analyze.add_argument('-o', '--output', required=True, help="결과 파일 경로 (.jsonl 또는 .csv)")
+    analyze.add_argument('--format', choices=('jsonl', 'csv'), help="출력 형식 (기본: 확장자로 판단)")
+    analyze.add_argument('--workers', type=int, default=max(1, min(4, os.cpu_count() or 1)), help="문서를 나눠 처리할 프로세스 수")
+    analyze.add_argument('--max-concurrency', type=int, default=None, help="문서당 동시 배치 수")
+    analyze.add_argument('--recursive', action='store_true', help="하위 디렉터리의 PDF도 포함")
+    analyze.add_argument('--prefilter', action='store_true', help="로컬 텍스트 검색으로 관련 페이지만 분석")
+    analyze.add_argument('--batch-strategy', choices=('fixed', 'adaptive'), default=None, help="배치 구성 전략")
+    analyze.add_argument('--text-first', action='store_true', default=None,
+                         help="텍스트 레이어가 충분한 페이지는 PDF 대신 추출 텍스트로 분석")
+    analyze.add_argument('--no-validate', action='store_true', help="답변 검증 생략")
+    analyze.add_argument('--no-summary', action='store_true', help="최종 요약 생략")
+    analyze.add_argument('--keep-uploads', action='store_true', help="분석 후 업로드한 배치 파일을 삭제하지 않음 (재실행 시 재사용)")
+    analyze.set_defaults(handler=run_analyze, needs_api_key=True)
+
+    index = subparsers.add_parser('index', help="PDF 폴더를 문서 간 검색용 로컬 색인에 추가 (바뀐 문서만 다시 색인)")
+    index.add_argument('pdf_dir', help="PDF 파일이 있는 디렉터리")
+    index.add_argument('--recursive', action='store_true', help="하위 디렉터리의 PDF도 포함")
+    index.add_argument('--workers', type=int, default=max(1, min(4, os.cpu_count() or 1)), help="텍스트 추출 프로세스 수")
+    index.add_argument('--prune', action='store_true', help="폴더에 없는 문서를 색인에서 제거")
+    index.set_defaults(handler=run_index, needs_api_key=False)
+
+    query = subparsers.add_parser('query', help="색인된 모든 문서에서 질문과 관련된 페이지 검색")
+    query.add_argument('question', help="질문")
+    query.add_argument('--top-k', type=int, default=None, help="후보 페이지 수")
+    query.add_argument('--analyze', action='store_true', help="후보 페이지만 AI로 분석·검증·요약 (API 사용)")
+    query.add_argument('-o', '--output', default=None, help="분석 결과 JSON 저장 경로 (--analyze)")
+    query.add_argument('--max-concurrency', type=int, default=None, help="문서당 동시 배치 수")
+    query.add_argument('--text-first', action='store_true', default=None,
+                       help="텍스트 레이어가 충분한 페이지는 PDF 대신 추출 텍스트로 분석")
+    query.add_argument('--no-validate', action='store_true', help="답변 검증 생략")
+    query.add_argument('--no-summary', action='store_true', help="최종 요약 생략")
+    query.set_defaults(handler=run_query, needs_api_key=False)
+
+    cleanup = subparsers.add_parser('cleanup-uploads', help="업로드 레지스트리에 등록된 원격 배치 파일 모두 삭제")
+    cleanup.set_defaults(handler=run_cleanup_uploads, needs_api_key=True)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    load_dotenv()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="%(asctime)s %(message)s")
+    if args.needs_api_key and not require_api_key():
+        return 1
+    return args.handler(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,7 @@
 import streamlit as st
+import json
+import pandas as pd
+from utils import tracing
 
 def render_sidebar():
     st.sidebar.title("소개")
@@ -22,4 +25,40 @@ def render_sidebar():
     st.sidebar.markdown("[기업 AI 인사이트 플랫폼](https://chrischangminlee.github.io/Enterprise-AI-Platform/)")
     st.sidebar.markdown("[기업 AI 연구소 유튜브](https://www.youtube.com/@EnterpriseAILab)")
     st.sidebar.markdown("[기업 AI 정보 오픈카톡방](https://open.kakao.com/o/gbr6iuGh)")
-    st.sidebar.markdown("[개발자 링크드인](https://www.linkedin.com/in/chrislee9407/)")
\ No newline at end of file
+    st.sidebar.markdown("[개발자 링크드인](https://www.linkedin.com/in/chrislee9407/)")
+
+def render_debug_panel():
+    """마지막 분석의 단계별 소요 시간/토큰/비용 추적 정보 (선택 표시)"""
+    if not st.sidebar.checkbox("🛠️ 디버그: 실행 추적 보기", value=False):
+        return
+    trace_id = st.session_state.get('trace_id')
+    if not trace_id:
+        st.sidebar.caption("분석을 실행하면 추적 정보가 표시됩니다.")
+        return
+
+    summary = tracing.summarize_trace(trace_id)
+    totals = summary['totals']
+    st.sidebar.caption(
+        f"토큰 {totals['total_tokens']:,} (입력 {totals['prompt_tokens']:,} / 출력 {totals['output_tokens']:,}) · "
+        f"예상 비용 ${totals['cost_usd']:.4f} · 재시도 {totals['retries']}회 (백오프 {totals['backoff_seconds']:.1f}초) · "
+        f"한도 대기 {totals['rate_limit_wait_seconds']:.1f}초 · 캐시 적중 {totals['cache_hits']}/{totals['cache_hits'] + totals['cache_misses']} · "
+        f"업로드 {totals['upload_bytes'] / 1024:.0f}KB"
+    )
+    if summary['spans']:
+        st.sidebar.dataframe(
+            pd.DataFrame(summary['spans']).rename(columns={'span': '구간', 'count': '횟수', 'seconds': '합계(초)', 'errors': '오류'}),
+            use_container_width=True,
+            hide_index=True
+        )
+    st.sidebar.download_button(
+        "📥 추적 JSON",
+        data=json.dumps(tracing.export_json(trace_id), ensure_ascii=False, indent=2).encode('utf-8'),
+        file_name=f"trace_{trace_id}.json",
+        mime="application/json"
+    )
+    st.sidebar.download_button(
+        "📥 OpenTelemetry (OTLP JSON)",
+        data=json.dumps(tracing.export_otlp(trace_id), ensure_ascii=False).encode('utf-8'),
+        file_name=f"trace_{trace_id}.otlp.json",
+        mime="application/json"
+    )
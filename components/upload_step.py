@@ -1,8 +1,22 @@
 import streamlit as st
 import pandas as pd
 import io
-from services.pdf_service import annotate_pdf_with_page_numbers, convert_pdf_to_images
-from services.gemini_service import find_relevant_pages_with_gemini, generate_final_summary, validate_answers_with_prompt
+import json
+import queue
+from services.pdf_service import (
+    get_pdf_document, release_spool_file, render_pages_from_queue, spool_pdf_upload, use_low_memory_mode
+)
+from services.gemini_service import (
+    find_relevant_pages_with_gemini, find_relevant_pages_for_questions, build_question_list,
+    generate_final_summary, validate_answers_with_prompt, get_model_call_count,
+    enhance_user_prompt, prepare_analysis_batches
+)
+from services.pipeline_service import build_table_rows, EMPTY_ANSWER_TEXT
+from services.batch_service import TEXT_FIRST_MODE
+from services.cache_service import get_cache, sha256_bytes
+from utils.rate_limiter import get_retry_metrics
+from utils.stage_graph import StageGraph
+from utils import tracing
 
 def run_upload_step():
     st.header("PDF 업로드 및 질문 입력")
@@ -38,6 +52,8 @@ def run_upload_step():
                     st.success("✅ 예시 PDF가 로드되었습니다!")
                     st.rerun()
 
+    multi_mode = st.radio("분석 모드", ["단일 질문", "다중 질문"], horizontal=True) == "다중 질문"
+
     with st.form("upload_form"):
         col3, col4 = st.columns(2)
         with col3:
@@ -48,80 +64,149 @@ def run_upload_step():
                 pdf_file = st.file_uploader("PDF 파일을 선택하세요", type=['pdf'])
 
         with col4:
-            user_prompt_input = st.text_input("분석 요청사항 입력", placeholder="예:이창민의 경력")
+            if multi_mode:
+                user_prompt_input = None
+                questions_input = st.text_area("분석 요청사항 입력 (한 줄에 하나씩)", placeholder="예:\n이창민의 경력\n이창민의 학력")
+                questions_csv = st.file_uploader("또는 질문 CSV 업로드 (첫 번째 열 또는 '질문' 열)", type=['csv'])
+            else:
+                user_prompt_input = st.text_input("분석 요청사항 입력", placeholder="예:이창민의 경력")
+                use_prefilter = st.checkbox("⚡ 빠른 분석 (로컬 텍스트 검색으로 관련 페이지만 분석)", value=False)
+                use_adaptive_batches = st.checkbox("🧮 페이지 분량에 따라 배치 크기 자동 조절", value=False)
+                use_text_first = st.checkbox("📄 텍스트 우선 분석 (텍스트 페이지는 PDF 대신 추출 텍스트 전송)", value=TEXT_FIRST_MODE)
 
         submitted = st.form_submit_button("PDF 분석 시작", type="primary")
 
-    if submitted and user_prompt_input:
-        # PDF 파일 확인
-        if st.session_state.get('example_pdf_loaded', False):
-            pdf_bytes_to_process = st.session_state['example_pdf_bytes']
-            # pdf_source = "예시 PDF (changminlee_intro.pdf)"
-        elif pdf_file:
-            pdf_bytes_to_process = pdf_file.read()
-            # pdf_source = pdf_file.name
-        else:
-            st.error("PDF 파일을 선택하거나 예시 PDF를 로드해주세요.")
+    if submitted and multi_mode:
+        questions = build_question_list(read_question_inputs(questions_input, questions_csv))
+        if not questions:
+            st.error("질문을 한 개 이상 입력하거나 질문 CSV를 업로드해주세요.")
             st.stop()
+        run_multi_question_analysis(get_selected_pdf_source(pdf_file), questions)
+
+    elif submitted and user_prompt_input:
+        # PDF 파일 확인
+        pdf_source = get_selected_pdf_source(pdf_file)
 
         # 각 단계별 placeholder 생성
         step1_placeholder = st.empty()
         step2_placeholder = st.empty()
-        step3_placeholder = st.empty()
+        batch_strategy = "adaptive" if use_adaptive_batches else "fixed"
+
+        # 서로 의존하지 않는 단계(문서 파싱/배치 분할과 질문 개선)는 동시에 실행하고,
+        # 미리보기 렌더링은 분석 중 백그라운드에서 진행
+        graph = StageGraph()
+        render_queue = queue.Queue()
+        graph.add("문서 파싱", lambda: get_pdf_document(pdf_source))
+        graph.add("질문 개선", lambda: enhance_user_prompt(user_prompt_input))
+        if use_prefilter:
+            # 사전 필터는 개선된 질문이 필요하므로 질문 개선 이후 실행
+            graph.add("배치 분할", lambda document, refined: prepare_analysis_batches(
+                document, refined, prefilter=True, batch_strategy=batch_strategy, text_first=use_text_first
+            ), deps=("문서 파싱", "질문 개선"))
+        else:
+            graph.add("배치 분할", lambda document: prepare_analysis_batches(
+                document, batch_strategy=batch_strategy, text_first=use_text_first
+            ), deps=("문서 파싱",))
+        graph.add("미리보기 렌더링", lambda document: render_pages_from_queue(document, render_queue), deps=("문서 파싱",))
+        batches = []
         
         try:
             # 세션 초기화
             st.session_state.analysis_results = []
             st.session_state.user_prompt = user_prompt_input
+            st.session_state.trace_id = tracing.current_trace_id()
+            graph.start()
 
-            # 1단계: PDF 페이지 번호 삽입
-            step1_placeholder.info("📝 **1/3단계:** PDF에 페이지 번호 삽입 중...")
-            numbered_bytes = annotate_pdf_with_page_numbers(pdf_bytes_to_process)
-            st.session_state.original_pdf_bytes = numbered_bytes
-            step1_placeholder.success("📝 **1/3단계:** PDF에 페이지 번호 삽입 완료 ✅")
-
-            # 2단계: PDF를 이미지로 변환
-            step2_placeholder.info("🖼️ **2/3단계:** PDF를 이미지로 변환 중...")
-            st.session_state.pdf_images = convert_pdf_to_images(numbered_bytes)
-            
-            if not st.session_state.pdf_images:
-                step2_placeholder.warning("🖼️ **2/3단계:** PDF 이미지 변환 실패 ⚠️ (분석은 계속 진행)")
-            else:
-                step2_placeholder.success("🖼️ **2/3단계:** PDF를 이미지로 변환 완료 ✅")
+            # 1단계: PDF 문서 파싱·배치 분할과 질문 개선을 동시에 진행 (페이지 번호는 배치 분할 시 삽입)
+            step1_placeholder.info("📝 **1/2단계:** PDF 문서 준비 및 질문 분석 중...")
+            document = graph.result("문서 파싱")
+            st.session_state.original_pdf_source = pdf_source
+            st.session_state.pdf_hash = document.sha256
+            refined_prompt = graph.result("질문 개선")
+            st.session_state.refined_prompt = refined_prompt
+            batches, prefilter_report = graph.result("배치 분할")
+            st.session_state.prefilter_report = prefilter_report
+            step1_placeholder.success(f"📝 **1/2단계:** PDF 문서 준비 완료 ({document.page_count}페이지) ✅")
 
-            # 3단계: AI 분석 실행
-            step3_placeholder.info("🤖 **3/3단계:** AI가 관련 페이지 분석 중... (시간이 다소 걸릴 수 있습니다)")
+            # 2단계: AI 분석 실행 (페이지 이미지는 미리보기 시 필요한 페이지만 렌더링)
+            step2_placeholder.info("🤖 **2/2단계:** AI가 관련 페이지 분석 중... (시간이 다소 걸릴 수 있습니다)")
             
             # 상태 업데이트용 placeholder 생성
             status_placeholder = st.empty()
+            # 배치가 끝날 때마다 채워지는 중간 결과 테이블
+            live_table = st.empty()
+            live_rows = {}
+            progress_bar = st.progress(0)
+
+            def on_batch_result(found_pages, found_info):
+                # 찾은 페이지는 바로 백그라운드 렌더링 대기열에 추가
+                render_queue.put(found_pages)
+                for page_num in found_pages:
+                    info = found_info.get(page_num, {})
+                    live_rows[page_num] = {
+                        '페이지': page_num,
+                        '답변': info.get('page_response') or EMPTY_ANSWER_TEXT,
+                        '관련도': info.get('relevance', ''),
+                    }
+                if live_rows:
+                    live_table.dataframe(
+                        pd.DataFrame([live_rows[p] for p in sorted(live_rows)]),
+                        use_container_width=True,
+                        hide_index=True
+                    )
             
-            # 배치 분석 방식으로 실행
-            pages, page_info = find_relevant_pages_with_gemini(
-                user_prompt_input, 
-                pdf_bytes=numbered_bytes, 
-                status_placeholder=status_placeholder
-            )
+            # 할당량 소진으로 일부 배치만 분석된 경우 (완료 배치 수, 전체 배치 수)
+            partial_batches = []
+
+            # 배치 분석 방식으로 실행 (결과는 배치가 끝나는 대로 표시)
+            with graph.timed("배치 분석"):
+                pages, page_info = find_relevant_pages_with_gemini(
+                    user_prompt_input, 
+                    pdf_bytes=document, 
+                    status_placeholder=status_placeholder,
+                    batch_strategy=batch_strategy,
+                    refined_prompt=refined_prompt,
+                    batches=batches,
+                    on_batch_result=on_batch_result,
+                    on_progress=lambda done, total: progress_bar.progress(done / total),
+                    # 스트리밍 응답에서 찾은 페이지는 배치가 끝나기 전에 미리보기 렌더링 시작
+                    on_page_result=lambda found_pages, _: render_queue.put(found_pages),
+                    on_partial=lambda done, total: partial_batches.append((done, total))
+                )
+            render_queue.put(None)
+            st.session_state.stage_timings = graph.timing_rows()
             
-            # 분석 완료 후 상태 메시지 정리
+            # 분석 완료 후 상태 메시지와 중간 결과 정리 (검증/요약은 바로 이어서 시작)
             status_placeholder.empty()
+            live_table.empty()
+            progress_bar.empty()
             
             # 결과를 세션에 저장
             st.session_state.relevant_pages = pages
             st.session_state.page_info = page_info
-            
-            step3_placeholder.success("🤖 **3/3단계:** AI 관련 페이지 분석 완료 ✅")
+
+            step2_placeholder.success("🤖 **2/2단계:** AI 관련 페이지 분석 완료 ✅")
 
             # 모든 진행 단계 블록 제거
             step1_placeholder.empty()
             step2_placeholder.empty()
-            step3_placeholder.empty()
             
             # 분석 완료 표시
+            if partial_batches:
+                done, total = partial_batches[-1]
+                st.warning(
+                    f"⚠️ API 할당량이 소진되어 전체 {total}개 배치 중 {done}개만 분석했습니다. "
+                    "같은 질문으로 다시 실행하면 남은 배치부터 이어서 분석합니다."
+                )
             if not pages:
                 st.error("❌ 관련 페이지를 찾을 수 없습니다. 다시 시도해주세요.")
                 return
             else:
                 st.success(f"✅ **분석 완료!** AI가 {len(pages)}개의 관련 페이지를 찾았습니다!")
+
+            report = st.session_state.get('prefilter_report')
+            if report:
+                st.caption(f"⚡ 사전 필터: 전체 {report['total_pages']}페이지 중 {report['selected_pages']}페이지 분석, {report['skipped_pages']}페이지 건너뜀 (텍스트 없는 페이지 {report['untextable_pages']}개는 항상 포함)")
             
             # 결과 표시
             display_analysis_results()
@@ -131,7 +216,6 @@ def run_upload_step():
             # 모든 진행 단계 블록 제거
             step1_placeholder.empty()
             step2_placeholder.empty()
-            step3_placeholder.empty()
             
             st.error(f"❌ **오류 발생:** {str(e)}")
             
@@ -139,12 +223,149 @@ def run_upload_step():
             st.error("상세 오류 정보:")
             st.code(traceback.format_exc())
             st.error("위 오류가 지속되면 페이지를 새로고침하고 다시 시도해주세요.")
+
+        finally:
+            # 렌더링 단계 종료 후 나머지 단계는 기다리지 않고 정리 (배치 PDF는 분석 중에만 존재)
+            render_queue.put(None)
+            graph.shutdown(wait=False)
     
     # 이전 분석 결과가 있으면 표시
+    elif multi_mode and st.session_state.get('multi_results'):
+        display_multi_question_results()
     elif hasattr(st.session_state, 'relevant_pages') and st.session_state.relevant_pages:
         display_analysis_results()
 
 
+def render_usage_caption():
+    """캐시 적중/미스, 모델 호출, 재시도/대기 누적 현황 표시"""
+    cache_stats = get_cache().stats()
+    retry_stats = get_retry_metrics().snapshot()
+    st.caption(
+        f"💾 캐시 적중 {cache_stats['hits']}회 / 미스 {cache_stats['misses']}회 · "
+        f"🤖 모델 호출 누적 {get_model_call_count()}회 · "
+        f"🔁 재시도 {retry_stats['retries']}회 (할당량 초과 {retry_stats['throttles']}회, "
+        f"대기 {retry_stats['wait_seconds'] + retry_stats['backoff_seconds']:.0f}초)"
+    )
+
+
+def get_selected_pdf_source(pdf_file):
+    """예시 PDF 바이트 또는 업로드된 PDF 반환 (없으면 오류 표시 후 중단)
+
+    큰 파일(또는 저메모리 모드)은 바이트를 복사하지 않고 디스크에 저장한 경로를 반환하며,
+    이후 단계는 이 파일을 mmap으로 읽습니다.
+    """
+    if st.session_state.get('example_pdf_loaded', False):
+        return st.session_state['example_pdf_bytes']
+    if pdf_file:
+        if use_low_memory_mode(pdf_file.size):
+            previous = st.session_state.get('spooled_pdf_path')
+            path = spool_pdf_upload(pdf_file)
+            # 같은 세션의 이전 spool 파일은 바로 삭제
+            if previous and previous != path:
+                release_spool_file(previous)
+            st.session_state.spooled_pdf_path = path
+            return path
+        return pdf_file.read()
+    st.error("PDF 파일을 선택하거나 예시 PDF를 로드해주세요.")
+    st.stop()
+
+
+def reset_analysis_session(keys):
+    """세션 상태 키를 지우고, 디스크에 저장한 업로드 파일은 문서를 닫은 뒤 바로 삭제"""
+    spooled_path = st.session_state.get('spooled_pdf_path')
+    if spooled_path:
+        release_spool_file(spooled_path)
+    for key in [*keys, 'spooled_pdf_path']:
+        if key in st.session_state:
+            del st.session_state[key]
+
+
+def read_question_inputs(questions_input, questions_csv):
+    """입력창(한 줄에 하나)과 CSV 파일에서 질문 목록 수집"""
+    question_texts = (questions_input or "").splitlines()
+    if questions_csv is not None:
+        try:
+            df_questions = pd.read_csv(questions_csv)
+            column = next((c for c in df_questions.columns if str(c).strip().lower() in ('질문', 'question')), df_questions.columns[0])
+            question_texts.extend(df_questions[column].dropna().astype(str).tolist())
+        except Exception as e:
+            st.error(f"질문 CSV 읽기 실패: {e}")
+    return question_texts
+
+
+def run_multi_question_analysis(pdf_bytes, questions):
+    """여러 질문을 배치당 한 번의 호출로 분석하고 결과를 세션에 저장"""
+    status_placeholder = st.empty()
+    st.session_state.trace_id = tracing.current_trace_id()
+    try:
+        document = get_pdf_document(pdf_bytes)
+        status_placeholder.info(f"🤖 질문 {len(questions)}개를 {document.page_count}페이지 문서에서 함께 분석 중...")
+        progress_bar = st.progress(0)
+        results = find_relevant_pages_for_questions(
+            questions,
+            pdf_bytes=document,
+            status_placeholder=status_placeholder,
+            on_progress=lambda done, total: progress_bar.progress(done / total)
+        )
+        progress_bar.empty()
+        status_placeholder.empty()
+    except Exception as e:
+        import traceback
+        status_placeholder.empty()
+        st.error(f"❌ **오류 발생:** {str(e)}")
+        st.code(traceback.format_exc())
+        return
+
+    st.session_state.multi_results = {
+        'questions': questions,
+        'results': results,
+    }
+    st.session_state.original_pdf_source = pdf_bytes
+    st.session_state.pdf_hash = document.sha256
+    display_multi_question_results()
+
+
+def display_multi_question_results():
+    """질문별 분석 결과를 하나의 테이블과 CSV로 표시"""
+    multi_results = st.session_state.multi_results
+    st.header("📊 질문별 분석 결과")
+
+    rows = []
+    for question in multi_results['questions']:
+        pages, page_info = multi_results['results'].get(question['id'], ([], {}))
+        if not pages:
+            rows.append({'질문 ID': question['id'], '질문': question['question'], '페이지': None, '답변': "관련 페이지 없음", '관련도': ""})
+        for page_num in pages:
+            info = page_info.get(page_num, {})
+            answer = info.get('page_response') or EMPTY_ANSWER_TEXT
+            rows.append({
+                '질문 ID': question['id'],
+                '질문': question['question'],
+                '페이지': page_num,
+                '답변': answer,
+                '관련도': info.get('relevance', ''),
+            })
+
+    df = pd.DataFrame(rows)
+    st.dataframe(df, use_container_width=True, hide_index=True)
+
+    csv_buffer = io.StringIO()
+    df.to_csv(csv_buffer, index=False, encoding='utf-8')
+    st.download_button(
+        label="📥 질문별 결과 CSV 형태로 다운받기",
+        data=csv_buffer.getvalue().encode('utf-8-sig'),
+        file_name=f"질문별_분석결과_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.csv",
+        mime="text/csv;charset=utf-8-sig",
+        type="primary"
+    )
+
+    render_usage_caption()
+
+    if st.button("🔄 새로운 분석 시작", type="primary", key="reset_multi"):
+        reset_analysis_session(['multi_results', 'original_pdf_source', 'pdf_hash', 'example_pdf_loaded', 'example_pdf_bytes'])
+        st.rerun()
+
+
 def display_analysis_results():
     """분석 결과를 테이블 형태로 표시"""
     st.header("📊 분석 결과")
@@ -157,46 +378,51 @@ def display_analysis_results():
     # 최종 요약은 아래에서 테이블 생성 후 표시
     
     # 결과 데이터 준비 - 상과 중 모두 포함
-    table_data = []
-    for page_num in st.session_state.relevant_pages:
-        if page_num in st.session_state.page_info:
-            info = st.session_state.page_info[page_num]
-            # 답변이 비어있는 경우 처리
-            answer = info['page_response']
-            if not answer or answer.strip() == "":
-                answer = "관련 내용이 포함된 페이지"
-            
-            table_data.append({
-                '페이지': page_num,
-                '답변': answer,
-                '관련도': info['relevance'],
-            })
+    table_data = build_table_rows(st.session_state.relevant_pages, st.session_state.page_info)
     
-    if table_data:
-        # 2단계: 답변 검증 (refined_prompt에 실제로 답변하는지 확인)
-        if hasattr(st.session_state, 'refined_prompt'):
+    if table_data and hasattr(st.session_state, 'refined_prompt'):
+        # 검증/요약은 분석 입력이 바뀔 때만 다시 실행 (미리보기 등 재실행 시 재사용)
+        postprocess_key = sha256_bytes(json.dumps(
+            [st.session_state.refined_prompt, table_data], ensure_ascii=False, sort_keys=True
+        ).encode('utf-8'))
+
+        if st.session_state.get('postprocess_key') != postprocess_key:
+            # 2단계: 답변 검증 (refined_prompt에 실제로 답변하는지 확인)
             validation_placeholder = st.empty()
+            # 원본 PDF가 있으면 페이지 텍스트로 명확한 답변은 로컬에서 판정
+            source_document = None
+            if st.session_state.get('original_pdf_source'):
+                source_document = get_pdf_document(
+                    st.session_state.original_pdf_source,
+                    pdf_hash=st.session_state.get('pdf_hash')
+                )
             validated_data = validate_answers_with_prompt(
                 table_data,
                 st.session_state.refined_prompt,
-                validation_placeholder
+                validation_placeholder,
+                document=source_document
             )
             validation_placeholder.empty()
-            
-            # 검증된 데이터로 업데이트
-            table_data = validated_data
-        
-        # 3단계: 최종 요약 생성 (검증된 답변들로만)
-        if table_data and hasattr(st.session_state, 'refined_prompt'):
-            summary_placeholder = st.empty()
-            final_summary = generate_final_summary(
-                table_data,
-                st.session_state.refined_prompt,
-                summary_placeholder
-            )
-            summary_placeholder.empty()
+
+            # 3단계: 최종 요약 생성 (검증된 답변들로만)
+            final_summary = None
+            if validated_data:
+                summary_placeholder = st.empty()
+                final_summary = generate_final_summary(
+                    validated_data,
+                    st.session_state.refined_prompt,
+                    summary_placeholder
+                )
+                summary_placeholder.empty()
+
+            st.session_state.validated_data = validated_data
             st.session_state.final_summary = final_summary
-            
+            st.session_state.postprocess_key = postprocess_key
+
+        # 검증된 데이터로 업데이트
+        table_data = st.session_state.validated_data
+
+    if table_data:
         # 최종 요약 표시
         if hasattr(st.session_state, 'final_summary') and st.session_state.final_summary:
             st.markdown("### 📋 최종 답변")
@@ -279,18 +505,28 @@ def display_analysis_results():
                     del st.session_state.preview_data
                     st.rerun()
             
-            # 이미지 표시
-            if hasattr(st.session_state, 'pdf_images') and st.session_state.pdf_images:
-                page_idx = page_num - 1
-                if 0 <= page_idx < len(st.session_state.pdf_images):
+            # 이미지 표시 (해당 페이지만 렌더링, 캐시된 경우 재사용)
+            if st.session_state.get('original_pdf_source'):
+                document = get_pdf_document(
+                    st.session_state.original_pdf_source,
+                    pdf_hash=st.session_state.get('pdf_hash')
+                )
+                page_image = document.render_page(int(page_num))
+                if page_image:
                     st.image(
-                        st.session_state.pdf_images[page_idx], 
+                        page_image, 
                         caption=f"페이지 {page_num}", 
                         use_column_width=True
                     )
             
         
         
+        # 캐시/API 사용 현황
+        render_usage_caption()
+        if st.session_state.get('stage_timings'):
+            with st.expander("⏱️ 단계별 소요 시간"):
+                st.dataframe(pd.DataFrame(st.session_state.stage_timings), use_container_width=True, hide_index=True)
+
         # 사용 팁
         st.info("💡 **팁:** '👁️ 보기' 버튼을 클릭하면 해당 페이지를 미리볼 수 있습니다.")
     
@@ -300,8 +536,7 @@ def display_analysis_results():
     # 새로운 분석 시작 버튼
     if st.button("🔄 새로운 분석 시작", type="primary"):
         # 세션 상태 초기화
-        for key in ['relevant_pages', 'page_info', 'user_prompt', 'refined_prompt', 'final_summary',
-                    'original_pdf_bytes', 'pdf_images', 'example_pdf_loaded', 'example_pdf_bytes']:
-            if key in st.session_state:
-                del st.session_state[key]
+        reset_analysis_session(['relevant_pages', 'page_info', 'user_prompt', 'refined_prompt', 'final_summary',
+                                'validated_data', 'postprocess_key', 'original_pdf_source', 'pdf_hash', 'multi_results',
+                                'stage_timings', 'example_pdf_loaded', 'example_pdf_bytes'])
         st.rerun()
\ No newline at end of file
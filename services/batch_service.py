@@ -0,0 +1,371 @@
+# batch_service.py - 배치 구성 전략 (고정 크기 / 적응형)
+
+import os, queue, re, tempfile, threading
+from contextlib import contextmanager
+from services.pdf_service import as_pdf_document
+from utils import tracing
+
+# 배치 구성 전략: "fixed" (페이지 수 고정) 또는 "adaptive" (예상 토큰 예산 기준)
+BATCH_STRATEGY = os.getenv("BATCH_STRATEGY", "fixed")
+
+# 페이지 비용 추정 상수 (Gemini는 PDF 페이지를 이미지+텍스트로 처리)
+TOKENS_PER_PAGE = 258
+CHARS_PER_TOKEN = 3
+TOKENS_PER_IMAGE = 258
+CONTENT_BYTES_PER_TOKEN = 200
+
+# 텍스트 우선 모드: 텍스트 레이어가 충분한 페이지는 PDF 대신 추출 텍스트를 전송
+TEXT_FIRST_MODE = os.getenv("TEXT_FIRST_MODE", "0") == "1"
+# 텍스트 페이지로 분류할 최소 글자 수
+TEXT_PAGE_MIN_CHARS = int(os.getenv("TEXT_PAGE_MIN_CHARS", "200"))
+# 글자당 콘텐츠 스트림 바이트가 이보다 크면 도형/차트 위주 페이지로 봄
+TEXT_PAGE_MAX_CONTENT_RATIO = 40
+# 추출 텍스트 중 단어 글자(한글/영문/숫자) 비율이 이보다 낮으면 깨진 텍스트로 봄
+TEXT_PAGE_MIN_WORD_RATIO = 0.5
+# 텍스트 배치 하나에 담을 최대 페이지 수 (파일 배치보다 저렴하므로 더 크게 묶음)
+TEXT_BATCH_MAX_PAGES = int(os.getenv("TEXT_BATCH_MAX_PAGES", "20"))
+
+_WORD_CHAR_PATTERN = re.compile(r"[0-9A-Za-z가-힣]")
+_BLANK_PATTERN = re.compile(r"[ \t\u00a0]+")
+
+# 배치 스트림이 소비자보다 앞서 만들어 둘 수 있는 최대 배치 수
+BATCH_LOOKAHEAD = int(os.getenv("BATCH_LOOKAHEAD", "2"))
+
+# 적응형 배치 예산 설정
+ADAPTIVE_TOKEN_BUDGET = int(os.getenv("ADAPTIVE_TOKEN_BUDGET", "12000"))
+ADAPTIVE_MIN_TOKEN_BUDGET = 2000
+ADAPTIVE_MAX_TOKEN_BUDGET = 60000
+ADAPTIVE_MAX_PAGES = 20
+# 이 시간보다 오래 걸린 배치는 예산을 줄이고, 절반 이하이면 조금씩 늘림
+ADAPTIVE_TARGET_SECONDS = float(os.getenv("ADAPTIVE_TARGET_SECONDS", "30"))
+# 실패한 배치를 더 작게 나누어 같은 실행 안에서 다시 분석하는 최대 횟수
+ADAPTIVE_RESPLIT_ROUNDS = int(os.getenv("ADAPTIVE_RESPLIT_ROUNDS", "2"))
+
+def estimate_page_tokens(stats):
+    """page_stats 결과로 페이지 처리 토큰 수 추정"""
+    return (
+        TOKENS_PER_PAGE
+        + stats['text_chars'] // CHARS_PER_TOKEN
+        + stats['image_count'] * TOKENS_PER_IMAGE
+        + stats['content_bytes'] // CONTENT_BYTES_PER_TOKEN
+    )
+
+def make_batch(pages, estimated_tokens=None):
+    """페이지 목록으로 배치 정보 생성"""
+    batch = {'start_page': pages[0], 'end_page': pages[-1], 'pages': list(pages)}
+    if estimated_tokens is not None:
+        batch['estimated_tokens'] = estimated_tokens
+    return batch
+
+class AdaptiveBatchPlanner:
+    """페이지별 예상 비용으로 토큰 예산까지 배치를 채우고, 관측된 지연/실패로 예산을 조정"""
+
+    def __init__(self, token_budget=ADAPTIVE_TOKEN_BUDGET, min_budget=ADAPTIVE_MIN_TOKEN_BUDGET,
+                 max_budget=ADAPTIVE_MAX_TOKEN_BUDGET, max_pages=ADAPTIVE_MAX_PAGES, target_seconds=ADAPTIVE_TARGET_SECONDS):
+        self.token_budget = token_budget
+        self.min_budget = min_budget
+        self.max_budget = max_budget
+        self.max_pages = max_pages
+        self.target_seconds = target_seconds
+        self._lock = threading.Lock()
+
+    def plan(self, pdf_bytes, pages=None):
+        """예산 안에서 페이지를 순서대로 묶은 배치 목록"""
+        document = as_pdf_document(pdf_bytes)
+        if pages is None:
+            pages = range(1, document.page_count + 1)
+        with self._lock:
+            budget = self.token_budget
+        return self._pack(document, pages, budget)
+
+    def split(self, pdf_bytes, batch):
+        """실패한 배치를 현재 예산과 배치 예상 비용의 절반 중 작은 예산으로 다시 나눈 배치 목록
+
+        페이지가 둘 이상이면 항상 두 개 이상의 배치로 나뉩니다.
+        """
+        document = as_pdf_document(pdf_bytes)
+        estimated = batch.get('estimated_tokens')
+        if estimated is None:
+            estimated = sum(estimate_page_tokens(document.page_stats(page_num)) for page_num in batch['pages'])
+        with self._lock:
+            budget = min(self.token_budget, max(1, estimated // 2))
+        return self._pack(document, batch['pages'], budget)
+
+    def _pack(self, document, pages, budget):
+        batches = []
+        current, current_tokens = [], 0
+        for page_num in sorted(pages):
+            tokens = estimate_page_tokens(document.page_stats(page_num))
+            if current and (current_tokens + tokens > budget or len(current) >= self.max_pages):
+                batches.append(make_batch(current, current_tokens))
+                current, current_tokens = [], 0
+            current.append(page_num)
+            current_tokens += tokens
+        if current:
+            batches.append(make_batch(current, current_tokens))
+        return batches
+
+    def record(self, batch, seconds, error=None):
+        """배치 결과를 반영하여 다음 계획의 예산 조정"""
+        with self._lock:
+            if error is not None or seconds > self.target_seconds:
+                # 실패/시간 초과 배치 크기 기준으로 예산 축소
+                used = batch.get('estimated_tokens', self.token_budget)
+                self.token_budget = max(self.min_budget, int(min(self.token_budget, used) * 0.7))
+            elif seconds < self.target_seconds / 2:
+                self.token_budget = min(self.max_budget, int(self.token_budget * 1.1))
+
+def plan_fixed_batches(pdf_bytes, batch_size=10, pages=None):
+    """batch_size 페이지씩 고정 크기 배치"""
+    return list(as_pdf_document(pdf_bytes).iter_batches(batch_size, pages=pages))
+
+_planner = AdaptiveBatchPlanner()
+
+def get_batch_planner():
+    """프로세스 전역 적응형 배치 계획기 (실행 간 학습 내용 유지)"""
+    return _planner
+
+@tracing.traced("plan_batches")
+def plan_batches(pdf_bytes, strategy=None, batch_size=10, pages=None):
+    """전략에 따라 배치 목록 생성"""
+    strategy = strategy or BATCH_STRATEGY
+    if strategy == "adaptive":
+        return get_batch_planner().plan(pdf_bytes, pages=pages)
+    if strategy == "fixed":
+        return plan_fixed_batches(pdf_bytes, batch_size=batch_size, pages=pages)
+    raise ValueError(f"알 수 없는 배치 전략: {strategy}")
+
+def classify_page(stats, text):
+    """페이지를 "text"(추출 텍스트로 충분) 또는 "file"(스캔/이미지/도형 위주)로 분류"""
+    if stats['image_count'] or stats['text_chars'] < TEXT_PAGE_MIN_CHARS:
+        return "file"
+    if stats['content_bytes'] > stats['text_chars'] * TEXT_PAGE_MAX_CONTENT_RATIO:
+        return "file"
+    visible = [ch for ch in text if not ch.isspace()]
+    word_chars = sum(1 for ch in visible if _WORD_CHAR_PATTERN.match(ch))
+    if not visible or word_chars / len(visible) < TEXT_PAGE_MIN_WORD_RATIO:
+        return "file"
+    return "text"
+
+def compact_page_text(text):
+    """연속 공백과 빈 줄을 줄인 페이지 텍스트"""
+    lines = (_BLANK_PATTERN.sub(" ", line).strip() for line in (text or "").splitlines())
+    return "\n".join(line for line in lines if line)
+
+@tracing.traced("plan_text_first_batches")
+def plan_text_first_batches(pdf_bytes, strategy=None, batch_size=10, pages=None, text_batch_size=TEXT_BATCH_MAX_PAGES):
+    """텍스트 페이지는 텍스트 배치로, 나머지 페이지는 전략에 따른 파일 배치로 묶은 목록 (시작 페이지 순)
+
+    텍스트 배치는 'mode': "text"와 페이지별 압축 텍스트('page_texts')를 가집니다.
+    """
+    document = as_pdf_document(pdf_bytes)
+    if pages is None:
+        pages = range(1, document.page_count + 1)
+    text_pages, file_pages = [], []
+    for page_num in sorted(pages):
+        text = document.page_text(page_num)
+        if classify_page(document.page_stats(page_num), text) == "text":
+            text_pages.append(page_num)
+        else:
+            file_pages.append(page_num)
+    tracing.set_attributes(text_pages=len(text_pages), file_pages=len(file_pages))
+
+    batches = plan_batches(document, strategy=strategy, batch_size=batch_size, pages=file_pages) if file_pages else []
+    for start_idx in range(0, len(text_pages), text_batch_size):
+        batch = make_batch(text_pages[start_idx:start_idx + text_batch_size])
+        batch['mode'] = "text"
+        batch['page_texts'] = [compact_page_text(document.page_text(page_num)) for page_num in batch['pages']]
+        batches.append(batch)
+    return sorted(batches, key=lambda batch: batch['start_page'])
+
+def is_text_batch(batch):
+    """파일 업로드 없이 추출 텍스트로 분석하는 배치인지 여부"""
+    return batch.get('mode') == "text"
+
+def resplit_failed_batches(pdf_bytes, batches, strategy=None):
+    """적응형 전략일 때 실패한 파일 배치를 계획기로 더 작게 나눈 재시도 배치 목록
+
+    텍스트 배치와 한 페이지짜리 배치는 나누어도 달라지지 않으므로 제외합니다.
+    """
+    if (strategy or BATCH_STRATEGY) != "adaptive":
+        return []
+    planner = get_batch_planner()
+    retry_batches = []
+    for batch in batches:
+        if is_text_batch(batch) or len(batch['pages']) < 2:
+            continue
+        stamp_page_numbers = batch.get('stamp_page_numbers', True)
+        retry_batches.extend(
+            {'path': None, 'stamp_page_numbers': stamp_page_numbers, **part} for part in planner.split(pdf_bytes, batch)
+        )
+    return retry_batches
+
+def record_batch_result(batch, seconds, error=None, strategy=None):
+    """적응형 전략일 때 배치 처리 결과를 계획기에 반영 (할당량 소진은 배치 크기와 무관하므로 제외)"""
+    if error is not None and "QUOTA_EXHAUSTED" in str(error):
+        return
+    if is_text_batch(batch):
+        # 텍스트 배치는 파일 배치와 비용 구조가 달라 예산 학습에서 제외
+        return
+    if (strategy or BATCH_STRATEGY) == "adaptive":
+        get_batch_planner().record(batch, seconds, error)
+
+class BatchBuffer:
+    """배치 스트림이 만든 배치 PDF 하나 (메모리 바이트 또는 스트림 임시 디렉터리의 파일)
+
+    with 블록이나 release()로 반납하면 파일이 바로 삭제되고 스트림의 자리가 비워집니다.
+    """
+
+    def __init__(self, stream, batch, data=None, path=None):
+        self.stream = stream
+        self.batch = batch
+        self.data = data
+        self.path = path
+        self._released = False
+
+    def read(self):
+        """배치 PDF 바이트"""
+        if self.data is not None:
+            return self.data
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def release(self):
+        self.stream._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+_STREAM_END = object()
+
+class BatchStream:
+    """배치 PDF를 필요할 때 생성하는 스트림 (컨텍스트 관리자)
+
+    동시에 존재하는 버퍼는 lookahead개 이하이며, with 블록이 끝나면 남은 버퍼와
+    임시 디렉터리가 모두 삭제됩니다 (중간에 예외가 나도 동일).
+    - 순서대로 소비: for buffer in stream (또는 여러 스레드에서 take())
+      → 백그라운드에서 lookahead개까지 미리 생성
+    - 원하는 배치를 바로 사용: with stream.open(batch) as buffer (여러 스레드에서 동시 호출 가능)
+    in_memory가 True이면 파일 대신 바이트로 보관합니다.
+    """
+
+    def __init__(self, document, batches=(), lookahead=BATCH_LOOKAHEAD, in_memory=False):
+        self.document = as_pdf_document(document)
+        self.batches = list(batches)
+        self.lookahead = max(1, lookahead)
+        self.in_memory = in_memory
+        self._slots = threading.Semaphore(self.lookahead)
+        self._ready = queue.Queue()
+        self._closed = threading.Event()
+        self._lock = threading.Lock()
+        self._live = set()
+        self._producer = None
+        self._tmpdir = None
+
+    def __enter__(self):
+        if not self.in_memory:
+            self._tmpdir = tempfile.TemporaryDirectory(prefix="pdf_analyzer_batches_")
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """생성 중단 후 남은 버퍼와 임시 디렉터리 삭제"""
+        self._closed.set()
+        if self._producer is not None:
+            self._producer.join()
+        with self._lock:
+            live = list(self._live)
+        for buffer in live:
+            self._release(buffer)
+        if self._tmpdir is not None:
+            self._tmpdir.cleanup()
+            self._tmpdir = None
+
+    def _acquire_slot(self):
+        # 닫히면 대기 중인 생성자가 바로 빠져나오도록 짧게 나누어 대기
+        while not self._closed.is_set():
+            if self._slots.acquire(timeout=0.1):
+                return True
+        return False
+
+    def _materialize(self, batch):
+        data = self.document.write_pages(batch['pages'], stamp_page_numbers=batch.get('stamp_page_numbers', True))
+        if self.in_memory:
+            buffer = BatchBuffer(self, batch, data=data)
+        else:
+            if self._tmpdir is None:
+                raise RuntimeError("배치 스트림은 with 블록 안에서 사용해야 합니다.")
+            fd, path = tempfile.mkstemp(suffix=".pdf", dir=self._tmpdir.name)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            buffer = BatchBuffer(self, batch, path=path)
+        with self._lock:
+            self._live.add(buffer)
+        return buffer
+
+    def _release(self, buffer):
+        with self._lock:
+            if buffer._released:
+                return
+            buffer._released = True
+            self._live.discard(buffer)
+        if buffer.path and os.path.exists(buffer.path):
+            os.unlink(buffer.path)
+        buffer.data = None
+        self._slots.release()
+
+    @contextmanager
+    def open(self, batch):
+        """batch를 생성하여 사용하고 블록이 끝나면 삭제"""
+        if not self._acquire_slot():
+            raise RuntimeError("닫힌 배치 스트림입니다.")
+        try:
+            buffer = self._materialize(batch)
+        except BaseException:
+            self._slots.release()
+            raise
+        with buffer:
+            yield buffer
+
+    def _produce(self):
+        try:
+            for batch in self.batches:
+                if not self._acquire_slot():
+                    return
+                try:
+                    buffer = self._materialize(batch)
+                except Exception as e:
+                    self._slots.release()
+                    self._ready.put(e)
+                    return
+                self._ready.put(buffer)
+        finally:
+            self._ready.put(_STREAM_END)
+
+    def take(self):
+        """다음 배치 버퍼 (모두 소비하면 None). 사용 후 release()로 반납해야 다음 배치가 생성됩니다"""
+        with self._lock:
+            if self._producer is None:
+                self._producer = threading.Thread(target=self._produce, name="batch-stream", daemon=True)
+                self._producer.start()
+        item = self._ready.get()
+        if item is _STREAM_END or isinstance(item, Exception):
+            # 다른 소비자도 종료를 알 수 있도록 종료 표시를 되돌려 둠
+            self._ready.put(_STREAM_END)
+            if isinstance(item, Exception):
+                raise item
+            return None
+        return item
+
+    def __iter__(self):
+        while True:
+            buffer = self.take()
+            if buffer is None:
+                return
+            with buffer:
+                yield buffer
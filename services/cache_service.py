@@ -0,0 +1,163 @@
+# cache_service.py - 분석 결과 디스크 캐시
+
+import hashlib, json, os, tempfile, threading, time
+from utils import tracing
+
+# 캐시 설정 (환경변수로 변경 가능)
+CACHE_DIR = os.getenv("PDF_ANALYZER_CACHE_DIR", os.path.join(tempfile.gettempdir(), "pdf_analyzer_cache"))
+CACHE_TTL_SECONDS = int(os.getenv("PDF_ANALYZER_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_MAX_BYTES = int(os.getenv("PDF_ANALYZER_CACHE_MAX_BYTES", str(500 * 1024 * 1024)))
+# 정리 대상이 아닌 상태 파일(작업 저장소, 업로드 레지스트리) 위치
+STATE_DIR = os.getenv("PDF_ANALYZER_STATE_DIR", os.path.join(CACHE_DIR, "state"))
+# 캐시가 직접 기록하는 항목 파일 확장자 (정리/삭제는 이 파일들만 대상)
+CACHE_ENTRY_SUFFIXES = (".json", ".bin")
+
+def sha256_bytes(data):
+    """바이트 데이터의 SHA-256 해시"""
+    return hashlib.sha256(data).hexdigest()
+
+def sha256_file(path, chunk_size=1024 * 1024):
+    """파일 내용의 SHA-256 해시 (전체를 메모리에 올리지 않고 나누어 읽음)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def make_cache_key(stage, **parts):
+    """단계 이름과 입력값들로 캐시 키 생성"""
+    payload = json.dumps({'stage': stage, **parts}, ensure_ascii=False, sort_keys=True, default=str)
+    return f"{stage}-{sha256_bytes(payload.encode('utf-8'))}"
+
+class ResultCache:
+    """크기/TTL 기반으로 정리되는 디스크 캐시 (JSON 값과 바이트 값 지원)"""
+
+    def __init__(self, cache_dir=CACHE_DIR, ttl_seconds=CACHE_TTL_SECONDS, max_bytes=CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key, ext):
+        return os.path.join(self.cache_dir, f"{key}.{ext}")
+
+    def _read(self, key, ext, mode):
+        path = self._path(key, ext)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                os.unlink(path)
+                raise FileNotFoundError(path)
+            with open(path, mode) as f:
+                data = f.read()
+            # 최근 사용 시각 갱신 (LRU 정리용)
+            os.utime(path, None)
+        except (OSError, ValueError):
+            self._record(hit=False)
+            return None
+        self._record(hit=True)
+        return data
+
+    def _write(self, key, ext, data):
+        path = self._path(key, ext)
+        # 부분 기록된 파일이 읽히지 않도록 임시 파일에 쓴 뒤 교체
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return
+        self.evict()
+
+    def _record(self, hit):
+        tracing.add_count('cache_hits' if hit else 'cache_misses')
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        """JSON 값 조회 (없으면 None)"""
+        data = self._read(key, "json", "r")
+        if data is None:
+            return None
+        try:
+            return json.loads(data)
+        except json.JSONDecodeError:
+            return None
+
+    def set(self, key, value):
+        """JSON 값 저장"""
+        self._write(key, "json", json.dumps(value, ensure_ascii=False).encode('utf-8'))
+
+    def get_bytes(self, key):
+        """바이트 값 조회 (없으면 None)"""
+        return self._read(key, "bin", "rb")
+
+    def set_bytes(self, key, data):
+        """바이트 값 저장"""
+        self._write(key, "bin", data)
+
+    def evict(self):
+        """만료된 항목 삭제 후, 최대 크기를 넘으면 오래 사용하지 않은 항목부터 삭제"""
+        entries = []
+        now = time.time()
+        with self._lock:
+            for path in self._entry_paths():
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if now - stat.st_mtime > self.ttl_seconds:
+                    self._safe_unlink(path)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                self._safe_unlink(path)
+                total -= size
+
+    def clear(self):
+        """캐시 항목 전체 삭제"""
+        with self._lock:
+            for path in self._entry_paths():
+                self._safe_unlink(path)
+
+    def _entry_paths(self):
+        """캐시가 기록한 항목 파일 경로 (같은 디렉터리의 다른 파일/하위 디렉터리는 제외)"""
+        return [
+            os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)
+            if name.endswith(CACHE_ENTRY_SUFFIXES) and os.path.isfile(os.path.join(self.cache_dir, name))
+        ]
+
+    def stats(self):
+        """적중/미스 횟수"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+    @staticmethod
+    def _safe_unlink(path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """프로세스 전역 캐시 인스턴스"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+        return _cache
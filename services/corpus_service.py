@@ -0,0 +1,336 @@
+# corpus_service.py - 여러 PDF를 한꺼번에 검색하는 로컬 페이지 색인 (해싱 벡터 + NumPy memmap + SQLite)
+
+import hashlib, math, os, sqlite3, threading, time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from functools import lru_cache
+import numpy as np
+from services.cache_service import CACHE_DIR
+from services.pdf_service import get_pdf_document
+from services.search_service import tokenize
+from utils import tracing
+
+# 색인 저장 위치와 페이지 벡터 차원 (차원을 바꾸면 새 디렉터리에 다시 색인해야 함)
+CORPUS_DIR = os.getenv("PDF_ANALYZER_CORPUS_DIR", os.path.join(CACHE_DIR, "corpus"))
+CORPUS_VECTOR_DIM = int(os.getenv("CORPUS_VECTOR_DIM", "2048"))
+# 벡터 파일을 늘릴 때 한 번에 확보할 최소 행 수
+CORPUS_GROW_ROWS = 4096
+# 검색 시 한 번에 읽어 점수를 계산할 행 수 (메모리 사용량 상한)
+CORPUS_QUERY_CHUNK_ROWS = int(os.getenv("CORPUS_QUERY_CHUNK_ROWS", "65536"))
+# 질의당 기본 후보 페이지 수
+CORPUS_TOP_K = int(os.getenv("CORPUS_TOP_K", "50"))
+
+VECTOR_DTYPE = np.float16
+
+@lru_cache(maxsize=1 << 16)
+def _token_hash(token):
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+
+def hash_vector(tokens, dim=CORPUS_VECTOR_DIM):
+    """토큰 목록의 부호 있는 해싱 벡터 (1 + log tf 가중치, L2 정규화, float32)"""
+    vector = np.zeros(dim, dtype=np.float32)
+    counts = Counter(tokens)
+    if not counts:
+        return vector
+    hashes = np.fromiter((_token_hash(token) for token in counts), dtype=np.uint64, count=len(counts))
+    weights = np.fromiter((1.0 + math.log(count) for count in counts.values()), dtype=np.float32, count=len(counts))
+    signs = np.where((hashes >> np.uint64(63)) & np.uint64(1), 1.0, -1.0).astype(np.float32)
+    np.add.at(vector, (hashes % np.uint64(dim)).astype(np.int64), signs * weights)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def extract_document_pages(path, dim=CORPUS_VECTOR_DIM):
+    """PDF 하나의 해시, 페이지 텍스트, 페이지 벡터 추출 (작업 프로세스에서 실행 가능)"""
+    stat = os.stat(path)
+    document = get_pdf_document(path)
+    texts = [document.page_text(page_num) for page_num in range(1, document.page_count + 1)]
+    vectors = np.stack([hash_vector(tokenize(text), dim) for text in texts]) if texts else np.zeros((0, dim))
+    return {
+        'path': os.path.abspath(path),
+        'sha256': document.sha256,
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'texts': texts,
+        'vectors': vectors.astype(VECTOR_DTYPE),
+    }
+
+class CorpusIndex:
+    """문서/페이지 메타데이터(SQLite)와 페이지 벡터(memmap 파일)로 된 증분 색인
+
+    페이지 벡터는 추가 전용 파일에 행 단위로 기록되어 검색 시 필요한 부분만 디스크에서
+    읽습니다. 내용이 바뀐 문서는 이전 행을 0으로 지우고 새 행을 뒤에 추가합니다.
+    """
+
+    def __init__(self, directory=CORPUS_DIR, dim=CORPUS_VECTOR_DIM):
+        self.directory = directory
+        self.dim = dim
+        self.db_path = os.path.join(directory, "corpus.sqlite3")
+        self.vectors_path = os.path.join(directory, "vectors.f16")
+        self.df_path = os.path.join(directory, "df.npy")
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    doc_id INTEGER PRIMARY KEY,
+                    path TEXT UNIQUE NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    page_count INTEGER NOT NULL,
+                    indexed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    row INTEGER PRIMARY KEY,
+                    doc_id INTEGER NOT NULL,
+                    page_num INTEGER NOT NULL,
+                    text TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS pages_doc ON pages (doc_id)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('dim', ?)", (str(dim),))
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('row_count', '0')")
+            stored_dim = int(conn.execute("SELECT value FROM meta WHERE key='dim'").fetchone()[0])
+        if stored_dim != dim:
+            raise ValueError(f"색인 벡터 차원({stored_dim})이 설정({dim})과 다릅니다. 다른 디렉터리를 사용하세요.")
+        self._df = np.load(self.df_path) if os.path.exists(self.df_path) else np.zeros(dim, dtype=np.float64)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _row_count(self, conn):
+        return int(conn.execute("SELECT value FROM meta WHERE key='row_count'").fetchone()[0])
+
+    def _open_vectors(self, rows, mode="r"):
+        """앞에서부터 rows행을 담는 벡터 memmap (쓰기 모드면 파일을 필요한 만큼 늘림)"""
+        row_bytes = self.dim * np.dtype(VECTOR_DTYPE).itemsize
+        if mode != "r":
+            size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+            if size < rows * row_bytes:
+                # 자주 늘리지 않도록 여유 행을 함께 확보
+                capacity = max(rows, size // row_bytes * 2, CORPUS_GROW_ROWS)
+                with open(self.vectors_path, "ab") as f:
+                    f.truncate(capacity * row_bytes)
+        return np.memmap(self.vectors_path, dtype=VECTOR_DTYPE, mode=mode, shape=(rows, self.dim))
+
+    def _save_df(self):
+        tmp_path = f"{self.df_path}.tmp.npy"
+        np.save(tmp_path, self._df)
+        os.replace(tmp_path, self.df_path)
+
+    def _remove_rows(self, conn, doc_id, row_count):
+        rows = [row for (row,) in conn.execute("SELECT row FROM pages WHERE doc_id=?", (doc_id,))]
+        if rows and row_count:
+            vectors = self._open_vectors(row_count, mode="r+")
+            self._df -= (np.asarray(vectors[rows]) != 0).sum(axis=0)
+            vectors[rows] = 0
+            vectors.flush()
+        conn.execute("DELETE FROM pages WHERE doc_id=?", (doc_id,))
+        conn.execute("DELETE FROM documents WHERE doc_id=?", (doc_id,))
+
+    def is_current(self, path):
+        """색인된 문서의 크기/수정 시각이 파일과 같으면 True"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self._connect() as conn:
+            row = conn.execute("SELECT size, mtime FROM documents WHERE path=?", (path,)).fetchone()
+        return row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime
+
+    def add_extracted(self, extracted):
+        """extract_document_pages 결과를 색인에 반영하고 새로 색인한 페이지 수 반환 (내용이 같으면 None)"""
+        with self._lock, self._connect() as conn:
+            existing = conn.execute(
+                "SELECT doc_id, sha256 FROM documents WHERE path=?", (extracted['path'],)
+            ).fetchone()
+            if existing is not None and existing[1] == extracted['sha256']:
+                # 내용은 같고 수정 시각만 바뀐 경우
+                conn.execute(
+                    "UPDATE documents SET size=?, mtime=? WHERE doc_id=?",
+                    (extracted['size'], extracted['mtime'], existing[0]),
+                )
+                return None
+
+            row_count = self._row_count(conn)
+            if existing is not None:
+                self._remove_rows(conn, existing[0], row_count)
+
+            vectors = extracted['vectors']
+            start = row_count
+            if len(vectors):
+                # 벡터를 먼저 기록하고, row_count는 메타데이터와 함께 커밋 (중단되면 다음 추가 때 덮어씀)
+                memmap = self._open_vectors(start + len(vectors), mode="r+")
+                memmap[start:start + len(vectors)] = vectors
+                memmap.flush()
+                del memmap
+                self._df += (vectors != 0).sum(axis=0)
+
+            cursor = conn.execute(
+                "INSERT INTO documents (path, sha256, size, mtime, page_count, indexed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (extracted['path'], extracted['sha256'], extracted['size'], extracted['mtime'], len(vectors), time.time()),
+            )
+            conn.executemany(
+                "INSERT INTO pages (row, doc_id, page_num, text) VALUES (?, ?, ?, ?)",
+                [(start + idx, cursor.lastrowid, idx + 1, text) for idx, text in enumerate(extracted['texts'])],
+            )
+            conn.execute("UPDATE meta SET value=? WHERE key='row_count'", (str(start + len(vectors)),))
+            self._save_df()
+        return len(vectors)
+
+    def add_document(self, path):
+        """PDF 하나를 색인 (변경되지 않았으면 건너뛰고 None 반환)"""
+        if self.is_current(path):
+            return None
+        return self.add_extracted(extract_document_pages(path, self.dim))
+
+    def remove_document(self, path):
+        """문서를 색인에서 제거 (없으면 False)"""
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT doc_id FROM documents WHERE path=?", (os.path.abspath(path),)).fetchone()
+            if row is None:
+                return False
+            self._remove_rows(conn, row[0], self._row_count(conn))
+            self._save_df()
+        return True
+
+    @tracing.traced("corpus_index_paths")
+    def index_paths(self, paths, workers=1, prune=False, on_progress=None):
+        """PDF 경로들을 증분 색인 (바뀐 문서만 workers개 프로세스로 추출)
+
+        prune이 True이면 paths에 없는 색인 문서를 제거합니다. on_progress(완료, 전체, 경로)는
+        문서가 끝날 때마다 호출되며, {'indexed', 'skipped', 'removed', 'pages', 'failed'}를 반환합니다.
+        """
+        paths = [os.path.abspath(path) for path in paths]
+        stale = [path for path in paths if not self.is_current(path)]
+        report = {'indexed': 0, 'skipped': len(paths) - len(stale), 'removed': 0, 'pages': 0, 'failed': []}
+
+        def apply(done, path, extracted):
+            pages = self.add_extracted(extracted)
+            if pages is None:
+                report['skipped'] += 1
+            else:
+                report['indexed'] += 1
+                report['pages'] += pages
+            if on_progress:
+                on_progress(done, len(stale), path)
+
+        if workers > 1 and len(stale) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(extract_document_pages, path, self.dim): path for path in stale}
+                for done, future in enumerate(as_completed(futures), start=1):
+                    try:
+                        apply(done, futures[future], future.result())
+                    except Exception as e:
+                        report['failed'].append((futures[future], str(e)))
+        else:
+            for done, path in enumerate(stale, start=1):
+                try:
+                    apply(done, path, extract_document_pages(path, self.dim))
+                except Exception as e:
+                    report['failed'].append((path, str(e)))
+
+        if prune:
+            keep = set(paths)
+            for path in self.document_paths():
+                if path not in keep and self.remove_document(path):
+                    report['removed'] += 1
+        tracing.set_attributes(indexed=report['indexed'], pages=report['pages'])
+        return report
+
+    def document_paths(self):
+        """색인된 문서 경로 목록"""
+        with self._connect() as conn:
+            return [path for (path,) in conn.execute("SELECT path FROM documents ORDER BY path")]
+
+    def query_vector(self, query):
+        """질의 벡터 (해싱 벡터에 문서 빈도 기반 IDF 가중치 적용)"""
+        with self._connect() as conn:
+            page_total = conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+        idf = np.log1p((page_total - self._df + 0.5) / (self._df + 0.5)).astype(np.float32)
+        vector = hash_vector(tokenize(query), self.dim) * idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @tracing.traced("corpus_search")
+    def search(self, query, top_k=CORPUS_TOP_K, chunk_rows=CORPUS_QUERY_CHUNK_ROWS):
+        """전체 색인에서 질의와 가장 비슷한 페이지 top_k개
+
+        [{'path', 'sha256', 'page', 'score', 'text'}] (점수 내림차순)를 반환합니다.
+        벡터는 chunk_rows행씩 읽어 점수를 계산하므로 색인 크기와 관계없이 메모리 사용량이 일정합니다.
+        """
+        query_vector = self.query_vector(query)
+        with self._connect() as conn:
+            row_count = self._row_count(conn)
+        if not row_count or not query_vector.any():
+            return []
+
+        vectors = self._open_vectors(row_count)
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, row_count, chunk_rows):
+            scores = np.asarray(vectors[start:start + chunk_rows], dtype=np.float32) @ query_vector
+            if len(scores) > top_k:
+                keep = np.argpartition(scores, -top_k)[-top_k:]
+            else:
+                keep = np.arange(len(scores))
+            best_rows = np.concatenate([best_rows, keep + start])
+            best_scores = np.concatenate([best_scores, scores[keep]])
+            if len(best_rows) > top_k:
+                keep = np.argpartition(best_scores, -top_k)[-top_k:]
+                best_rows, best_scores = best_rows[keep], best_scores[keep]
+        del vectors
+
+        order = np.argsort(-best_scores)
+        ranked = [(int(best_rows[idx]), float(best_scores[idx])) for idx in order if best_scores[idx] > 0]
+        if not ranked:
+            return []
+        with self._connect() as conn:
+            placeholders = ",".join("?" * len(ranked))
+            metadata = {
+                row: (path, sha256, page_num, text)
+                for row, path, sha256, page_num, text in conn.execute(
+                    f"""
+                    SELECT pages.row, documents.path, documents.sha256, pages.page_num, pages.text
+                    FROM pages JOIN documents ON documents.doc_id = pages.doc_id
+                    WHERE pages.row IN ({placeholders})
+                    """,
+                    [row for row, _ in ranked],
+                )
+            }
+        hits = []
+        for row, score in ranked:
+            if row in metadata:
+                path, sha256, page_num, text = metadata[row]
+                hits.append({'path': path, 'sha256': sha256, 'page': page_num, 'score': round(score, 4), 'text': text})
+        tracing.set_attributes(candidates=len(hits))
+        return hits
+
+    def stats(self):
+        """문서 수, 페이지 수, 벡터 행 수, 벡터 파일 크기"""
+        with self._connect() as conn:
+            documents = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            pages = conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+            rows = self._row_count(conn)
+        size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        return {'documents': documents, 'pages': pages, 'rows': rows, 'vector_bytes': size}
+
+_corpus_index = None
+_corpus_index_lock = threading.Lock()
+
+def get_corpus_index():
+    """프로세스 전역 코퍼스 색인"""
+    global _corpus_index
+    with _corpus_index_lock:
+        if _corpus_index is None:
+            _corpus_index = CorpusIndex()
+        return _corpus_index
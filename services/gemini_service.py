@@ -1,53 +1,339 @@
 # gemini_service.py - 배치 분석 및 검증 기능
 
-import io, os, tempfile, json, time
-import streamlit as st
-from PyPDF2 import PdfReader, PdfWriter
-import google.generativeai as genai
+import os, tempfile, json, time, threading, random, re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from services.cache_service import get_cache, make_cache_key
+from services.model_service import get_model_backend
+from services.pdf_service import as_pdf_document, SESSION_MEMORY_LIMIT_BYTES
+from services.upload_service import get_upload_registry
+from services.search_service import prefilter_pages
+from services.job_service import get_job_store
+from services.batch_service import (
+    plan_batches, plan_text_first_batches, is_text_batch, record_batch_result, resplit_failed_batches, BatchStream,
+    CHARS_PER_TOKEN, TEXT_FIRST_MODE, ADAPTIVE_RESPLIT_ROUNDS
+)
+from utils.rate_limiter import get_rate_limiter, get_retry_metrics, backoff_delay
+from utils import tracing
+from utils.json_stream import JsonArrayItemParser, parse_array_items, pages_array_pattern
 
 # 모델 상수
 GEMINI_MODEL = "gemini-2.5-flash"
 
-def call_gemini_with_retry(model, content, max_retries=3, base_delay=1, status_placeholder=None):
-    """Gemini API 호출을 재시도 로직과 함께 실행"""
-    for attempt in range(max_retries):
+# 동시에 처리할 최대 배치 수
+MAX_CONCURRENT_BATCHES = int(os.getenv("MAX_CONCURRENT_BATCHES", "4"))
+# 동시에 진행할 최대 업로드 수 (추론과 겹쳐서 미리 업로드)
+MAX_CONCURRENT_UPLOADS = int(os.getenv("MAX_CONCURRENT_UPLOADS", "2"))
+
+# 재시도 백오프 설정 (초)
+RETRY_MAX_DELAY = 30
+QUOTA_BASE_DELAY = 10
+QUOTA_MAX_DELAY = 60
+# 속도 제한용 파일 파트(배치 PDF) 토큰 추정치
+FILE_PART_TOKENS = 2580
+# 배치 PDF 생성 시 예상 크기 대비 필요한 메모리 배수 (writer 복제본 + 출력 버퍼)
+BATCH_BUFFER_MEMORY_FACTOR = 3
+# 비용 추정용 100만 토큰당 가격 (USD, 환경변수로 변경 가능)
+GEMINI_INPUT_COST_PER_MTOK = float(os.getenv("GEMINI_INPUT_COST_PER_MTOK", "0.30"))
+GEMINI_OUTPUT_COST_PER_MTOK = float(os.getenv("GEMINI_OUTPUT_COST_PER_MTOK", "2.50"))
+
+# 배치 분석 응답을 스트리밍으로 받아 페이지 항목을 완성되는 대로 처리
+GEMINI_STREAM_RESPONSES = os.getenv("GEMINI_STREAM_RESPONSES", "1") == "1"
+# 배치 분석 시 JSON 응답 스키마를 지정 (구조화 출력)
+GEMINI_STRUCTURED_OUTPUT = os.getenv("GEMINI_STRUCTURED_OUTPUT", "1") == "1"
+
+# 답변이 비어 있는 페이지에 표시할 문구
+EMPTY_ANSWER_TEXT = "관련 내용이 포함된 페이지"
+
+# 답변 검증 묶음 크기 (행 수/글자 수), 동시 검증 수, 묶음별 시도 횟수
+VALIDATION_SHARD_ROWS = int(os.getenv("VALIDATION_SHARD_ROWS", "20"))
+VALIDATION_SHARD_CHARS = int(os.getenv("VALIDATION_SHARD_CHARS", "8000"))
+VALIDATION_MAX_CONCURRENCY = int(os.getenv("VALIDATION_MAX_CONCURRENCY", "4"))
+VALIDATION_SHARD_ATTEMPTS = 3
+# 문서가 주어지면 페이지 텍스트와 비교해 명확한 답변은 모델 없이 판정
+VALIDATION_GROUNDING = os.getenv("VALIDATION_GROUNDING", "1") == "1"
+
+# 요약 한 번에 넣을 답변 글자 수 예산 (넘으면 묶음별 중간 요약 후 다시 합침)과 중간 요약 동시 호출 수
+SUMMARY_CHUNK_CHARS = int(os.getenv("SUMMARY_CHUNK_CHARS", "12000"))
+SUMMARY_MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "4"))
+# 중간 요약 최대 단계 수 (답변이 줄지 않는 경우 대비)
+SUMMARY_MAX_LEVELS = 6
+
+# 배치 분석 응답의 pages 배열 스키마 (Gemini 응답 스키마 형식)
+PAGES_ARRAY_SCHEMA = {
+    'type': 'ARRAY',
+    'items': {
+        'type': 'OBJECT',
+        'properties': {
+            'page_number': {'type': 'INTEGER'},
+            'answer': {'type': 'STRING'},
+            'relevance': {'type': 'STRING'},
+        },
+        'required': ['page_number', 'answer', 'relevance'],
+    },
+}
+
+# 모델 호출 횟수 계측 (재실행 시 불필요한 호출 여부 확인용)
+_model_call_count = 0
+_model_call_lock = threading.Lock()
+
+def get_model_call_count():
+    """지금까지 실행된 generate_content 호출 횟수"""
+    return _model_call_count
+
+# 배치 분석 프롬프트 공통 판단 기준 (단일/다중 질문 공용)
+BATCH_RELEVANCE_RULES = """
+    ## 엄격한 관련성 판단 기준
+    ⚠️ **매우 중요**: 다음 기준을 엄격히 적용하세요.
+
+    **상 (직접 답변)**  
+    - 페이지 안에 **사용자 질문에 대한 명시적·직접적 답변 내용**이 존재함  
+    - 질문 핵심 키워드뿐 아니라 **답변 내용 자체**가 포함되어 있음  
+    - ‘answer’ 필드에 사용자 질문에 대한 답변을 입력. 답변 형태 예시: 질문이 "홍길동의 직업이 뭐야" 면 답변은 "홍길동의 직업은 컨설턴트 입니다."
+    - 위 조건을 모두 충족하지 못하면 ‘상’으로 분류하지 말 것
+
+    **중 (간접 관련)**  
+    - 질문과 밀접한 배경·맥락·상위/하위 개념을 다룸  
+    - 직접적인 답은 없지만 문제 해결에 실질적으로 도움이 되는 정보 포함  
+    - ‘answer’ 필드는 **빈 문자열("")**로 두거나 생략
+
+    **하 (관련 없음)** – 결과에서 **제외**  
+    - 질문과 전혀 무관하거나 키워드가 우연히 등장하는 수준  
+    - 목차, 서문, 부록 등
+
+    ## 분석 지시사항
+    1. 각 페이지를 **독립적으로** 분석  
+    2. 페이지 좌측 상단 번호 확인  
+    3. **질문에 대한 직접 답변 문장이 있으면** 발췌하여 `answer`에 입력  
+    4. **‘상’ 또는 ‘중’**에 해당하는 페이지만 결과에 포함  
+    - **‘상’**: ③의 답변이 존재하며 조건 충족  
+    - **‘중’**: 답변은 없지만 유의미한 간접 정보 포함  
+    5. 확신이 없으면 제외(오탐 방지)
+    6. ⚠️ **절대 금지**: "~이/가 명시되어 있습니다", "~에 관한 정보가 있습니다" 같은 추상적 설명. 반드시 구체적인 사실이나 내용을 발췌해서 답변할 것
+"""
+
+class QuotaExhaustedError(Exception):
+    """재시도 후에도 API 할당량 초과가 계속되는 경우 (메시지는 기존 호환용 QUOTA_EXHAUSTED)"""
+
+    def __init__(self):
+        super().__init__("QUOTA_EXHAUSTED")
+
+def classify_gemini_error(error):
+    """API 오류 분류: "quota"(429/할당량), "transient"(일시 오류), "fatal"(재시도 무의미)"""
+    try:
+        from google.api_core import exceptions as api_exceptions
+        if isinstance(error, (api_exceptions.ResourceExhausted, api_exceptions.TooManyRequests)):
+            return "quota"
+        if isinstance(error, (api_exceptions.InvalidArgument, api_exceptions.PermissionDenied,
+                              api_exceptions.Unauthenticated, api_exceptions.NotFound)):
+            return "fatal"
+        if isinstance(error, api_exceptions.GoogleAPICallError):
+            return "transient"
+    except ImportError:
+        pass
+
+    # 예외 타입으로 판단할 수 없으면 메시지로 판단
+    error_msg = str(error).lower()
+    if "429" in error_msg or "quota" in error_msg or "rate limit" in error_msg:
+        return "quota"
+    return "transient"
+
+_RETRY_AFTER_PATTERNS = [
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)"),
+    re.compile(r"retry in\s*([\d.]+)\s*s", re.IGNORECASE),
+    re.compile(r"retry-after:?\s*([\d.]+)", re.IGNORECASE),
+]
+
+def parse_retry_after(error):
+    """오류에 포함된 재시도 대기 시간 힌트 (초, 없으면 None)"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers and headers.get("Retry-After"):
         try:
-            # API 호출 전 대기 (rate limiting)
-            if attempt > 0:
-                delay = base_delay * (2 ** attempt)  # 지수 백오프
-                if status_placeholder:
-                    status_placeholder.info(f"⏳ API 호출 대기 중... ({delay}초)")
-                time.sleep(delay)
-            
-            response = model.generate_content(content)
-            return response.text.strip()
-            
-        except Exception as e:
-            error_msg = str(e)
+            return float(headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            pass
+    error_msg = str(error)
+    for pattern in _RETRY_AFTER_PATTERNS:
+        match = pattern.search(error_msg)
+        if match:
+            return float(match.group(1))
+    return None
+
+def estimate_content_tokens(content):
+    """속도 제한용 요청 토큰 수 추정 (텍스트는 글자 수 기준, 파일은 고정값)"""
+    parts = content if isinstance(content, (list, tuple)) else [content]
+    tokens = 0
+    for part in parts:
+        if isinstance(part, str):
+            tokens += len(part) // CHARS_PER_TOKEN
+        else:
+            tokens += FILE_PART_TOKENS
+    return tokens
+
+def record_token_usage(response):
+    """응답 메타데이터의 토큰 사용량과 예상 비용을 현재 추적 span에 기록"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+    tracing.set_attributes(
+        prompt_tokens=prompt_tokens,
+        output_tokens=output_tokens,
+        total_tokens=getattr(usage, "total_token_count", 0) or prompt_tokens + output_tokens,
+        cost_usd=(prompt_tokens * GEMINI_INPUT_COST_PER_MTOK + output_tokens * GEMINI_OUTPUT_COST_PER_MTOK) / 1_000_000,
+    )
+
+def page_result_generation_config(question_ids=None):
+    """배치 분석용 구조화 출력 설정 (question_ids를 주면 질문 ID별 pages 스키마, 비활성화 시 None)"""
+    if not GEMINI_STRUCTURED_OUTPUT:
+        return None
+    if question_ids is None:
+        schema = {'type': 'OBJECT', 'properties': {'pages': PAGES_ARRAY_SCHEMA}, 'required': ['pages']}
+    else:
+        schema = {
+            'type': 'OBJECT',
+            'properties': {
+                'answers': {
+                    'type': 'OBJECT',
+                    'properties': {
+                        question_id: {'type': 'OBJECT', 'properties': {'pages': PAGES_ARRAY_SCHEMA}, 'required': ['pages']}
+                        for question_id in question_ids
+                    },
+                    'required': list(question_ids),
+                },
+            },
+            'required': ['answers'],
+        }
+    return {'response_mime_type': 'application/json', 'response_schema': schema}
+
+def _chunk_text(chunk):
+    # 안전 필터 등으로 내용이 없는 조각은 .text 접근 시 ValueError 발생
+    try:
+        return chunk.text or ""
+    except ValueError:
+        return ""
+
+def call_gemini_with_retry(model, content, max_retries=3, base_delay=1, status_placeholder=None,
+                           limiter=None, sleep=None, rng=None, generation_config=None, stream=False, on_chunk=None):
+    """Gemini API 호출을 재시도 로직과 함께 실행
+
+    호출 전 프로세스 전역 속도 제한기에서 요청/토큰을 확보하고, 실패 시 지터가 적용된
+    지수 백오프(오류의 retry-after 힌트 우선)로 재시도합니다. limiter/sleep/rng를 주입하면
+    가짜 시계로 테스트할 수 있습니다.
+    stream이 True이면 응답을 조각으로 받아 on_chunk(text)를 호출하고 전체 텍스트를 반환합니다.
+    재시도로 응답을 처음부터 다시 받을 때는 on_chunk(None)이 먼저 호출됩니다.
+    """
+    global _model_call_count
+    limiter = limiter or get_rate_limiter()
+    sleep = sleep or limiter.sleep
+    rng = rng or random
+    metrics = get_retry_metrics()
+    estimated_tokens = estimate_content_tokens(content)
+
+    with tracing.span("gemini.generate_content", model=GEMINI_MODEL, estimated_tokens=estimated_tokens):
+        for attempt in range(max_retries):
+            waited = limiter.acquire(estimated_tokens)
+            if waited:
+                tracing.add_count('rate_limit_wait_seconds', waited)
+            if waited and status_placeholder:
+                status_placeholder.info(f"⏳ API 호출 한도 대기 ({waited:.1f}초)")
+
+            try:
+                with _model_call_lock:
+                    _model_call_count += 1
+                metrics.add(calls=1)
+                options = {'generation_config': generation_config} if generation_config else {}
+                if not stream:
+                    response = model.generate_content(content, **options)
+                    record_token_usage(response)
+                    return response.text.strip()
+
+                if attempt and on_chunk:
+                    on_chunk(None)
+                response = model.generate_content(content, stream=True, **options)
+                parts = []
+                for chunk in response:
+                    text = _chunk_text(chunk)
+                    if text:
+                        parts.append(text)
+                        if on_chunk:
+                            on_chunk(text)
+                # 사용량 메타데이터는 스트림을 끝까지 읽은 뒤에 채워짐
+                record_token_usage(response)
+                return "".join(parts).strip()
             
-            if "429" in error_msg or "quota" in error_msg.lower():
-                # 할당량 초과 시
-                if attempt < max_retries - 1:
+            except Exception as e:
+                kind = classify_gemini_error(e)
+                retry_after = parse_retry_after(e)
+                last_attempt = attempt >= max_retries - 1
+
+                if kind == "quota":
+                    # 할당량 초과 시: 다른 호출자도 함께 쉬도록 속도 제한기를 멈춤
+                    metrics.add(throttles=1)
+                    delay = retry_after or backoff_delay(attempt, QUOTA_BASE_DELAY, QUOTA_MAX_DELAY, rng)
+                    limiter.pause(delay)
+                    if last_attempt:
+                        if status_placeholder:
+                            status_placeholder.error("❌ API 할당량이 완전히 소진되었습니다. 나중에 다시 시도해주세요.")
+                        raise QuotaExhaustedError()
                     if status_placeholder:
-                        status_placeholder.warning(f"⚠️ API 할당량 초과. 30초 대기 후 재시도... ({attempt + 1}/{max_retries})")
-                    time.sleep(30)
+                        status_placeholder.warning(f"⚠️ API 할당량 초과. {delay:.0f}초 대기 후 재시도... ({attempt + 1}/{max_retries})")
                 else:
+                    # 다른 오류 (재시도해도 소용없는 오류는 바로 전달)
+                    if kind == "fatal" or last_attempt:
+                        raise e
+                    delay = retry_after or backoff_delay(attempt, base_delay, RETRY_MAX_DELAY, rng)
                     if status_placeholder:
-                        status_placeholder.error("❌ API 할당량이 완전히 소진되었습니다. 나중에 다시 시도해주세요.")
-                    raise Exception("QUOTA_EXHAUSTED")
-            else:
-                # 다른 오류
-                if attempt < max_retries - 1:
-                    if status_placeholder:
-                        status_placeholder.warning(f"⚠️ API 호출 실패. 5초 대기 후 재시도... ({attempt + 1}/{max_retries})")
-                    time.sleep(5)
-                else:
-                    raise e
+                        status_placeholder.warning(f"⚠️ API 호출 실패. {delay:.0f}초 대기 후 재시도... ({attempt + 1}/{max_retries})")
+
+                metrics.add(retries=1, backoff_seconds=delay)
+                tracing.add_count('retries')
+                tracing.add_count('backoff_seconds', delay)
+                sleep(delay)
     
     raise Exception("최대 재시도 횟수 초과")
 
-def parse_page_info(gemini_response):
-    """개선된 페이지 정보 파싱 - JSON 형식 사용"""
+def extract_json_block(gemini_response):
+    """응답에서 JSON 문자열 부분 추출 (없으면 None)"""
+    if "```json" in gemini_response:
+        return gemini_response.split("```json")[1].split("```")[0].strip()
+    if "{" in gemini_response and "}" in gemini_response:
+        start = gemini_response.find("{")
+        end = gemini_response.rfind("}") + 1
+        return gemini_response[start:end]
+    return None
+
+def parse_page_items(items):
+    """JSON pages 배열을 (pages, page_info)로 변환"""
+    pages, page_info = [], {}
+    for item in items or []:
+        page_num = item.get("page_number")
+        if page_num:
+            # page_num이 list인 경우 첫 번째 값만 사용
+            if isinstance(page_num, list):
+                page_num = page_num[0] if page_num else None
+            if page_num and isinstance(page_num, (int, str)):
+                try:
+                    page_num = int(page_num)
+                    pages.append(page_num)
+                    page_info[page_num] = {
+                        'page_response': item.get('answer', ''),
+                        'relevance': item.get('relevance', '하')
+                    }
+                except (ValueError, TypeError):
+                    continue
+    return pages, page_info
+
+def parse_page_info(gemini_response, question_ids=None):
+    """개선된 페이지 정보 파싱 - JSON 형식 사용
+
+    question_ids를 주면 다중 질문 응답({"answers": {질문ID: {"pages": [...]}}})을
+    질문별 {질문ID: (pages, page_info)}로 나누어 반환합니다.
+    """
+    if question_ids is not None:
+        return parse_multi_question_page_info(gemini_response, question_ids)
+
     pages, page_info = [], {}
     
     try:
@@ -55,13 +341,8 @@ def parse_page_info(gemini_response):
         if not gemini_response or not gemini_response.strip():
             return pages, page_info
             
-        if "```json" in gemini_response:
-            json_str = gemini_response.split("```json")[1].split("```")[0].strip()
-        elif "{" in gemini_response and "}" in gemini_response:
-            start = gemini_response.find("{")
-            end = gemini_response.rfind("}") + 1
-            json_str = gemini_response[start:end]
-        else:
+        json_str = extract_json_block(gemini_response)
+        if json_str is None:
             return parse_page_info_legacy(gemini_response)
         
         data = json.loads(json_str)
@@ -70,45 +351,93 @@ def parse_page_info(gemini_response):
         if not data.get("pages"):
             return pages, page_info
             
-        for item in data.get("pages", []):
-            page_num = item.get("page_number")
-            if page_num:
-                # page_num이 list인 경우 첫 번째 값만 사용
-                if isinstance(page_num, list):
-                    page_num = page_num[0] if page_num else None
-                if page_num and isinstance(page_num, (int, str)):
-                    try:
-                        page_num = int(page_num)
-                        pages.append(page_num)
-                        page_info[page_num] = {
-                            'page_response': item.get('answer', ''),
-                            'relevance': item.get('relevance', '하')
-                        }
-                    except (ValueError, TypeError):
-                        continue
+        return parse_page_items(data.get("pages", []))
                 
-    except (json.JSONDecodeError, KeyError) as e:
+    except (json.JSONDecodeError, KeyError, AttributeError) as e:
+        # 잘린/깨진 JSON이면 완성된 pages 항목만이라도 복구
+        items = parse_array_items(gemini_response, pages_array_pattern())
+        if items is not None:
+            tracing.add_count('recovered_responses')
+            return parse_page_items(items)
         return parse_page_info_legacy(gemini_response)
-    
-    return pages, page_info
 
-def validate_answers_with_prompt(table_data, refined_prompt, status_placeholder=None):
-    """분석 결과의 답변이 실제로 질문에 대답하는지 검증하고 필터링"""
-    if not table_data:
-        return table_data
-    
+def parse_multi_question_page_info(gemini_response, question_ids):
+    """다중 질문 응답을 질문별 (pages, page_info)로 분리"""
+    results = {question_id: ([], {}) for question_id in question_ids}
+    if not gemini_response or not gemini_response.strip():
+        return results
+
+    json_str = extract_json_block(gemini_response)
+    if json_str is None:
+        return results
     try:
-        if status_placeholder:
-            status_placeholder.info("🔍 답변 검증 중...")
-        
-        # 페이지 번호와 답변을 문자열로 구성
-        pages_info = []
-        for item in table_data:
-            pages_info.append(f"페이지 {item['페이지']}: {item['답변']}")
-        
-        pages_text = "\n".join(pages_info)
-        
-        prompt = f"""
+        answers = json.loads(json_str).get("answers", {})
+    except (json.JSONDecodeError, AttributeError):
+        # 잘린/깨진 JSON이면 질문별로 완성된 pages 항목만 복구
+        recovered = False
+        for question_id in question_ids:
+            items = parse_array_items(gemini_response, pages_array_pattern(question_id))
+            if items is not None:
+                results[question_id] = parse_page_items(items)
+                recovered = True
+        if recovered:
+            tracing.add_count('recovered_responses')
+        return results
+
+    for question_id in question_ids:
+        entry = answers.get(question_id) if isinstance(answers, dict) else None
+        if isinstance(entry, dict):
+            results[question_id] = parse_page_items(entry.get("pages", []))
+    return results
+
+def normalize_answer(text):
+    """중복/자리표시 판단용 답변 정규화 (공백 통일, 대소문자 무시)"""
+    return " ".join((text or "").split()).casefold()
+
+# 검증할 필요 없이 제거하는 빈/자리표시 답변
+PLACEHOLDER_ANSWERS = {normalize_answer(text) for text in (EMPTY_ANSWER_TEXT, "-", "없음", "해당 없음", "n/a")}
+
+def precheck_validation_rows(table_data):
+    """검증 전 로컬 사전 점검: 빈/자리표시 답변은 제거하고 같은 답변은 대표 행 하나로 묶음
+
+    (대표 행 목록, {대표 페이지: 같은 답변의 페이지 목록}, 제거한 행 수)를 반환합니다.
+    """
+    representatives, groups, dropped = [], {}, 0
+    first_page_by_answer = {}
+    for row in table_data:
+        answer = normalize_answer(row.get('답변'))
+        if not answer or answer in PLACEHOLDER_ANSWERS:
+            dropped += 1
+            continue
+        first_page = first_page_by_answer.get(answer)
+        if first_page is None:
+            first_page_by_answer[answer] = row['페이지']
+            groups[row['페이지']] = [row['페이지']]
+            representatives.append(row)
+        else:
+            groups[first_page].append(row['페이지'])
+    return representatives, groups, dropped
+
+def shard_validation_rows(rows, max_rows=None, max_chars=None):
+    """검증할 행을 행 수/글자 수 제한 안에서 순서대로 묶음"""
+    max_rows = max_rows or VALIDATION_SHARD_ROWS
+    max_chars = max_chars or VALIDATION_SHARD_CHARS
+    shards, current, size = [], [], 0
+    for row in rows:
+        length = len(str(row['답변'])) + 16
+        if current and (len(current) >= max_rows or size + length > max_chars):
+            shards.append(current)
+            current, size = [], 0
+        current.append(row)
+        size += length
+    if current:
+        shards.append(current)
+    return shards
+
+def build_validation_prompt(rows, refined_prompt):
+    """검증 프롬프트 (페이지 번호와 답변 목록)"""
+    pages_text = "\n".join(f"페이지 {item['페이지']}: {item['답변']}" for item in rows)
+    return f"""
 다음은 PDF 분석 결과입니다. 각 페이지의 답변이 사용자 질문에 실제로 대답하는지 검증해주세요.
 
 사용자 질문: {refined_prompt}
@@ -136,64 +465,254 @@ def validate_answers_with_prompt(table_data, refined_prompt, status_placeholder=
 }}
 ```
 """
-        
-        model = genai.GenerativeModel(GEMINI_MODEL)
-        validation_response = call_gemini_with_retry(model, prompt, max_retries=2, base_delay=1)
-        
-        # JSON 파싱
+
+def parse_valid_pages(validation_response):
+    """검증 응답의 valid_pages를 페이지 번호 집합으로 변환 (형식이 맞지 않으면 ValueError)"""
+    json_str = extract_json_block(validation_response or "")
+    if json_str is None:
+        raise ValueError("검증 응답에서 JSON을 찾을 수 없습니다.")
+    try:
+        valid_pages = json.loads(json_str).get("valid_pages")
+    except (json.JSONDecodeError, AttributeError) as e:
+        raise ValueError(f"검증 응답 JSON 파싱 실패: {e}") from e
+    if not isinstance(valid_pages, list):
+        raise ValueError("검증 응답에 valid_pages 배열이 없습니다.")
+    pages = set()
+    for page in valid_pages:
         try:
-            if "```json" in validation_response:
-                json_str = validation_response.split("```json")[1].split("```")[0].strip()
-            elif "{" in validation_response and "}" in validation_response:
-                start = validation_response.find("{")
-                end = validation_response.rfind("}") + 1
-                json_str = validation_response[start:end]
-            else:
-                # 파싱 실패 시 원본 반환
-                if status_placeholder:
-                    status_placeholder.warning("⚠️ 답변 검증 파싱 실패, 원본 결과를 사용합니다.")
-                return table_data
-            
-            validation_data = json.loads(json_str)
-            valid_pages = validation_data.get("valid_pages", [])
-            
-            # 유효한 페이지만 필터링
-            filtered_data = [item for item in table_data if item['페이지'] in valid_pages]
-            
-            if status_placeholder:
-                removed_count = len(table_data) - len(filtered_data)
-                if removed_count > 0:
-                    status_placeholder.success(f"✅ 답변 검증 완료: {removed_count}개 부정확한 결과 제거됨")
-                else:
-                    status_placeholder.success("✅ 답변 검증 완료: 모든 결과가 유효함")
-            
-            return filtered_data
-            
-        except (json.JSONDecodeError, KeyError) as e:
-            if status_placeholder:
-                status_placeholder.warning("⚠️ 답변 검증 결과 파싱 실패, 원본 결과를 사용합니다.")
-            return table_data
-        
-    except Exception as e:
-        if status_placeholder:
-            status_placeholder.warning("⚠️ 답변 검증 실패, 원본 결과를 사용합니다.")
+            pages.add(int(page))
+        except (TypeError, ValueError):
+            continue
+    return pages
+
+def validate_shard(shard, refined_prompt, attempts=VALIDATION_SHARD_ATTEMPTS):
+    """검증 묶음 하나를 실행하고 유효한 페이지 집합 반환 (호출/파싱 실패 시 이 묶음만 재시도)"""
+    cache = get_cache()
+    cache_key = make_cache_key("validate_shard", model=GEMINI_MODEL, prompt=refined_prompt, rows=shard)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return set(cached)
+
+    prompt = build_validation_prompt(shard, refined_prompt)
+    model = get_model_backend().generative_model(GEMINI_MODEL)
+    last_error = None
+    for attempt in range(attempts):
+        try:
+            valid_pages = parse_valid_pages(call_gemini_with_retry(model, prompt, max_retries=2, base_delay=1))
+        except QuotaExhaustedError:
+            raise
+        except Exception as e:
+            last_error = e
+            tracing.add_count('retries')
+            continue
+        cache.set(cache_key, sorted(valid_pages))
+        return valid_pages
+    raise last_error
+
+@tracing.traced("validate_answers")
+def validate_answers_with_prompt(table_data, refined_prompt, status_placeholder=None, document=None):
+    """분석 결과의 답변이 실제로 질문에 대답하는지 검증하고 필터링
+
+    document가 주어지면 먼저 각 답변을 표시된 페이지 텍스트와 비교해 근거가 명확한 행은 채택하고
+    (이웃 페이지에서 찾으면 페이지 번호 수정), 근거가 없는 행은 제거합니다. 남은 행은 로컬 사전 점검
+    (빈/자리표시 답변 제거, 같은 답변 묶기) 후 크기 제한된 묶음으로 나누어 병렬로 모델 검증합니다.
+    실패한 묶음은 따로 재시도하고, 끝내 실패한 묶음의 행만 검증 없이 유지합니다.
+    """
+    if not table_data:
         return table_data
 
-def generate_final_summary(table_data, refined_prompt, status_placeholder=None):
-    """검증된 답변들을 종합하여 최종 요약 응답 생성"""
+    if document is not None and VALIDATION_GROUNDING:
+        document = as_pdf_document(document)
+    else:
+        document = None
+    cache = get_cache()
+    cache_key = make_cache_key(
+        "validate", model=GEMINI_MODEL, prompt=refined_prompt, rows=table_data,
+        **({'pdf': document.sha256} if document is not None else {})
+    )
+    cached = cache.get(cache_key)
+    if cached is not None:
+        if status_placeholder:
+            status_placeholder.success("✅ 답변 검증 완료 (캐시)")
+        return cached
+
+    # 근거가 명확한 행: 원래 페이지 -> (수정된) 페이지
+    grounded_pages = {}
+    rows_to_check = table_data
+    if document is not None:
+        from services.grounding_service import ground_answers, GROUNDED, AMBIGUOUS
+
+        verdicts = ground_answers(table_data, document)
+        grounded_pages = {
+            row['페이지']: verdict['page'] for row, verdict in zip(table_data, verdicts) if verdict['verdict'] == GROUNDED
+        }
+        rows_to_check = [row for row, verdict in zip(table_data, verdicts) if verdict['verdict'] == AMBIGUOUS]
+
+    representatives, groups, dropped = precheck_validation_rows(rows_to_check)
+    shards = shard_validation_rows(representatives)
+    tracing.set_attributes(
+        rows=len(table_data), grounded_rows=len(grounded_pages),
+        dropped=dropped, unique_rows=len(representatives), shards=len(shards)
+    )
+    if status_placeholder and shards:
+        status_placeholder.info(f"🔍 답변 검증 중... (답변 {len(representatives)}개, {len(shards)}개 묶음)")
+
+    valid_pages = set()
+    failed_shards = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(VALIDATION_MAX_CONCURRENCY, len(shards)))) as executor:
+        futures = {
+            executor.submit(tracing.bind_context(validate_shard), shard, refined_prompt): shard
+            for shard in shards
+        }
+        for future in as_completed(futures):
+            shard = futures[future]
+            try:
+                shard_valid = future.result()
+            except Exception:
+                # 이 묶음만 검증 없이 유지
+                failed_shards += 1
+                shard_valid = {row['페이지'] for row in shard}
+            # 대표 행의 판정을 같은 답변의 모든 페이지에 적용 (묶음에 없는 페이지 번호는 무시)
+            for page in shard_valid:
+                valid_pages.update(groups.get(page, []))
+
+    filtered_data = []
+    for item in table_data:
+        if item['페이지'] in grounded_pages:
+            page = grounded_pages[item['페이지']]
+            filtered_data.append(item if page == item['페이지'] else {**item, '페이지': page})
+        elif item['페이지'] in valid_pages:
+            filtered_data.append(item)
+    if not failed_shards:
+        cache.set(cache_key, filtered_data)
+
+    if status_placeholder:
+        removed_count = len(table_data) - len(filtered_data)
+        local_note = f" (페이지 텍스트로 {len(grounded_pages)}개 확인)" if grounded_pages else ""
+        if failed_shards:
+            status_placeholder.warning(
+                f"⚠️ 답변 검증 묶음 {len(shards)}개 중 {failed_shards}개 실패, 해당 결과는 검증 없이 사용합니다. ({removed_count}개 제거됨)"
+            )
+        elif removed_count > 0:
+            status_placeholder.success(f"✅ 답변 검증 완료: {removed_count}개 부정확한 결과 제거됨{local_note}")
+        else:
+            status_placeholder.success(f"✅ 답변 검증 완료: 모든 결과가 유효함{local_note}")
+
+    return filtered_data
+
+def summary_entry(row):
+    """결과 행을 요약 입력 항목으로 변환 (출처는 (문서, 페이지) 목록)"""
+    return {'sources': [(row.get('문서'), row['페이지'])], 'text': row['답변']}
+
+def format_sources(sources):
+    """출처 목록을 "페이지 1, 3" 또는 "a.pdf 페이지 2; b.pdf 페이지 5" 형태로 표시"""
+    by_document = {}
+    for document, page in sources:
+        by_document.setdefault(document, []).append(page)
+    labels = []
+    for document, pages in by_document.items():
+        label = f"페이지 {', '.join(str(page) for page in pages)}"
+        labels.append(f"{os.path.basename(document)} {label}" if document else label)
+    return "; ".join(labels)
+
+def format_summary_line(entry):
+    return f"{format_sources(entry['sources'])}: {entry['text']}"
+
+def chunk_summary_entries(entries, chunk_chars):
+    """요약 항목을 순서대로 글자 수 예산 안에서 묶음 (항목 하나가 예산보다 크면 단독 묶음)"""
+    chunks, current, size = [], [], 0
+    for entry in entries:
+        length = len(format_summary_line(entry)) + 1
+        if current and size + length > chunk_chars:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(entry)
+        size += length
+    if current:
+        chunks.append(current)
+    if len(chunks) == len(entries) > 1:
+        # 항목마다 예산을 넘으면 둘씩 묶어 단계마다 항목 수가 줄도록 함
+        chunks = [entries[idx:idx + 2] for idx in range(0, len(entries), 2)]
+    return chunks
+
+def summarize_entry_chunk(chunk, refined_prompt):
+    """답변 묶음 하나를 중간 요약 항목으로 축약 (출처는 묶음 전체를 합쳐 유지)"""
+    sources = list(dict.fromkeys(source for entry in chunk for source in entry['sources']))
+    lines = "\n".join(format_summary_line(entry) for entry in chunk)
+    cache = get_cache()
+    cache_key = make_cache_key("summary_partial", model=GEMINI_MODEL, prompt=refined_prompt, lines=lines)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return {'sources': sources, 'text': cached}
+
+    prompt = f"""
+다음은 PDF 문서에서 찾은 관련 정보의 일부입니다. 사용자 질문에 답하는 데 필요한 내용만 남겨 중간 요약을 작성해주세요.
+
+사용자 질문: {refined_prompt}
+
+찾은 정보:
+{lines}
+
+다음 지침에 따라 작성하세요:
+1. 질문과 관련된 구체적인 사실(정의, 수치, 조건, 절차 등)은 빠짐없이 유지
+2. 중복되는 내용은 통합하여 정리
+3. 500자 이내로 작성
+
+중간 요약만 출력하세요. 추가 설명이나 서두는 생략하세요.
+"""
+    model = get_model_backend().generative_model(GEMINI_MODEL)
+    text = call_gemini_with_retry(model, prompt, max_retries=2, base_delay=1).strip()
+    cache.set(cache_key, text)
+    return {'sources': sources, 'text': text}
+
+def reduce_summary_entries(entries, refined_prompt, chunk_chars=None, status_placeholder=None):
+    """요약 항목이 한 번의 요약 호출에 담길 때까지 묶음별 중간 요약을 병렬로 반복 (트리 축약)
+
+    단계마다 항목 수가 묶음 수로 줄어들므로 단계 수는 답변 수에 대해 로그 규모입니다.
+    """
+    chunk_chars = chunk_chars or SUMMARY_CHUNK_CHARS
+    level = 0
+    while level < SUMMARY_MAX_LEVELS:
+        chunks = chunk_summary_entries(entries, chunk_chars)
+        if len(chunks) <= 1:
+            break
+        level += 1
+        if status_placeholder:
+            status_placeholder.info(f"📝 중간 요약 {level}단계: 답변 {len(entries)}개를 {len(chunks)}개 묶음으로 요약 중...")
+        with ThreadPoolExecutor(max_workers=max(1, min(SUMMARY_MAX_CONCURRENCY, len(chunks)))) as executor:
+            futures = [
+                executor.submit(tracing.bind_context(summarize_entry_chunk), chunk, refined_prompt)
+                for chunk in chunks
+            ]
+            entries = [future.result() for future in futures]
+    tracing.set_attributes(summary_levels=level)
+    return entries
+
+@tracing.traced("generate_final_summary")
+def generate_final_summary(table_data, refined_prompt, status_placeholder=None, chunk_chars=None):
+    """검증된 답변들을 종합하여 최종 요약 응답 생성
+
+    답변이 chunk_chars(기본 SUMMARY_CHUNK_CHARS)보다 많으면 묶음별 중간 요약을 병렬로 만든 뒤
+    합쳐서 요약합니다. 각 단계의 요약은 출처 페이지를 함께 유지합니다.
+    """
     if not table_data:
         return "관련된 정보를 찾을 수 없습니다."
+
+    cache = get_cache()
+    cache_key = make_cache_key("summary", model=GEMINI_MODEL, prompt=refined_prompt, rows=table_data)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
     
     try:
         if status_placeholder:
             status_placeholder.info("📝 최종 요약 생성 중...")
         
-        # 답변들을 문자열로 구성
-        answers_text = []
-        for item in table_data:
-            answers_text.append(f"페이지 {item['페이지']}: {item['답변']}")
-        
-        combined_answers = "\n".join(answers_text)
+        # 답변들을 문자열로 구성 (많으면 중간 요약으로 먼저 축약)
+        entries = reduce_summary_entries(
+            [summary_entry(item) for item in table_data], refined_prompt, chunk_chars, status_placeholder
+        )
+        combined_answers = "\n".join(format_summary_line(entry) for entry in entries)
         
         prompt = f"""
 다음은 PDF 문서에서 찾은 관련 정보들입니다. 이 정보들을 종합하여 사용자의 질문에 대한 명확하고 완전한 답변을 작성해주세요.
@@ -213,12 +732,13 @@ def generate_final_summary(table_data, refined_prompt, status_placeholder=None):
 최종 답변만 출력하세요. 추가 설명이나 서두는 생략하세요.
 """
         
-        model = genai.GenerativeModel(GEMINI_MODEL)
+        model = get_model_backend().generative_model(GEMINI_MODEL)
         summary_response = call_gemini_with_retry(model, prompt, max_retries=2, base_delay=1)
         
         if status_placeholder:
             status_placeholder.success("✅ 최종 요약 생성 완료")
         
+        cache.set(cache_key, summary_response.strip())
         return summary_response.strip()
         
     except Exception as e:
@@ -246,75 +766,109 @@ def parse_page_info_legacy(gemini_response):
                 continue
     return pages, page_info
 
-def split_pdf_for_batch_analysis(pdf_bytes, batch_size=10):
-    """PDF를 배치로 나누어 처리하기 위한 함수"""
-    reader = PdfReader(io.BytesIO(pdf_bytes))
-    total_pages = len(reader.pages)
+@tracing.traced("split_pdf_for_batch_analysis")
+def split_pdf_for_batch_analysis(pdf_bytes, batch_size=10, stamp_page_numbers=True, pages=None, strategy=None, lazy=True,
+                                 text_first=None):
+    """PDF를 배치로 나누어 처리하기 위한 함수 (PdfDocument, PDF 바이트 또는 파일 경로)
+
+    stamp_page_numbers가 True이면 배치를 만들면서 페이지 번호를 삽입하므로
+    번호가 삽입된 전체 문서를 따로 만들 필요가 없습니다.
+    pages를 주면 해당 페이지들만 (연속되지 않아도) 배치로 묶습니다.
+    strategy는 "fixed"(batch_size 페이지씩) 또는 "adaptive"(예상 토큰 예산 기준)입니다.
+    기본(lazy)은 파일을 만들지 않고 배치 계획만 반환하며, 배치 PDF는 분석 시 BatchStream이
+    필요한 만큼만 생성하고 정리합니다. lazy=False이면 모든 배치 파일을 미리 만듭니다
+    (이 경우 cleanup_batch_files로 직접 삭제해야 함).
+    text_first가 True이면 (생략 시 TEXT_FIRST_MODE) 텍스트 레이어가 충분한 페이지는 파일 없이
+    추출 텍스트로 분석하는 텍스트 배치로 묶습니다.
+    """
+    document = as_pdf_document(pdf_bytes)
+    if text_first is None:
+        text_first = TEXT_FIRST_MODE
+    planner = plan_text_first_batches if text_first else plan_batches
     batches = []
     
-    for start_idx in range(0, total_pages, batch_size):
-        end_idx = min(start_idx + batch_size, total_pages)
-        
-        # 배치 PDF 생성
-        writer = PdfWriter()
-        for i in range(start_idx, end_idx):
-            writer.add_page(reader.pages[i])
-        
-        # 임시 파일로 저장
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            writer.write(tmp)
-            tmp_path = tmp.name
-        
-        batches.append({
-            'path': tmp_path,
-            'start_page': start_idx + 1,
-            'end_page': end_idx,
-            'pages': list(range(start_idx + 1, end_idx + 1))
-        })
+    for batch in planner(document, strategy=strategy, batch_size=batch_size, pages=pages):
+        if is_text_batch(batch):
+            # 텍스트 배치는 페이지 번호를 머리글로 전달하므로 파일/번호 삽입이 필요 없음
+            batches.append({'path': None, **batch})
+            continue
+        batch = {'path': None, 'stamp_page_numbers': stamp_page_numbers, **batch}
+        if not lazy:
+            materialize_batch_file(document, batch)
+        batches.append(batch)
     
     return batches
 
-def analyze_pdf_batch(batch_path, refined_prompt, batch_info, status_placeholder=None):
-    """단일 배치 PDF 분석"""
-    # 배치 파일을 Gemini에 업로드
-    batch_file = genai.upload_file(batch_path)
-    
-    prompt = f"""
-    이 PDF는 전체 문서의 {batch_info['start_page']}페이지부터 {batch_info['end_page']}페이지까지만 포함합니다.
+def materialize_batch_file(document, batch):
+    """배치 PDF 임시 파일을 생성하고 batch['path']에 기록"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
+        tmp.write(document.write_pages(batch['pages'], stamp_page_numbers=batch.get('stamp_page_numbers', True)))
+        batch['path'] = tmp.name
+    return batch['path']
 
-    중요: 각 페이지의 좌측 상단에 표시된 번호를 반드시 확인하고 사용하세요.
+def cleanup_batch_files(batches):
+    """split_pdf_for_batch_analysis/materialize_batch_file이 만든 임시 파일 삭제"""
+    for batch in batches:
+        path = batch.get('path')
+        if path and os.path.exists(path):
+            os.unlink(path)
 
-    ## 사용자 질문
-    {refined_prompt}
+def describe_batch_pages(batch_info):
+    """배치에 포함된 페이지 범위 설명 (연속되지 않은 배치는 페이지 목록으로 표시)"""
+    pages = batch_info['pages']
+    if pages == list(range(batch_info['start_page'], batch_info['end_page'] + 1)):
+        return f"전체 문서의 {batch_info['start_page']}페이지부터 {batch_info['end_page']}페이지까지만 포함합니다."
+    return f"전체 문서 중 다음 페이지만 포함합니다: {', '.join(str(p) for p in pages)}"
 
-    ## 엄격한 관련성 판단 기준
-    ⚠️ **매우 중요**: 다음 기준을 엄격히 적용하세요.
+def format_page_text_blocks(batch_info):
+    """텍스트 배치의 페이지별 텍스트를 페이지 번호 머리글이 붙은 블록으로 연결"""
+    return "\n\n".join(
+        f"=== 페이지 {page_num} ===\n{text}"
+        for page_num, text in zip(batch_info['pages'], batch_info['page_texts'])
+    )
 
-    **상 (직접 답변)**  
-    - 페이지 안에 **사용자 질문에 대한 명시적·직접적 답변 내용**이 존재함  
-    - 질문 핵심 키워드뿐 아니라 **답변 내용 자체**가 포함되어 있음  
-    - ‘answer’ 필드에 사용자 질문에 대한 답변을 입력. 답변 형태 예시: 질문이 "홍길동의 직업이 뭐야" 면 답변은 "홍길동의 직업은 컨설턴트 입니다."
-    - 위 조건을 모두 충족하지 못하면 ‘상’으로 분류하지 말 것
+def describe_batch_source(batch_info):
+    """배치 프롬프트 머리말과 page_number 안내 문구 (파일 배치 / 텍스트 배치)"""
+    if is_text_batch(batch_info):
+        intro = f"""위 텍스트는 PDF에서 추출한 것으로, {describe_batch_pages(batch_info)}
+    각 페이지는 "=== 페이지 N ===" 머리글로 구분되어 있습니다.
 
-    **중 (간접 관련)**  
-    - 질문과 밀접한 배경·맥락·상위/하위 개념을 다룸  
-    - 직접적인 답은 없지만 문제 해결에 실질적으로 도움이 되는 정보 포함  
-    - ‘answer’ 필드는 **빈 문자열("")**로 두거나 생략
+    중요: 페이지 번호는 반드시 해당 내용이 속한 머리글의 번호를 사용하세요."""
+        return intro, "내용이 속한 머리글의 페이지 번호"
+    intro = f"""이 PDF는 {describe_batch_pages(batch_info)}
 
-    **하 (관련 없음)** – 결과에서 **제외**  
-    - 질문과 전혀 무관하거나 키워드가 우연히 등장하는 수준  
-    - 목차, 서문, 부록 등
+    중요: 각 페이지의 좌측 상단에 표시된 번호를 반드시 확인하고 사용하세요."""
+    return intro, "좌측 상단의 실제 페이지 번호"
 
-    ## 분석 지시사항
-    1. 각 페이지를 **독립적으로** 분석  
-    2. 페이지 좌측 상단 번호 확인  
-    3. **질문에 대한 직접 답변 문장이 있으면** 발췌하여 `answer`에 입력  
-    4. **‘상’ 또는 ‘중’**에 해당하는 페이지만 결과에 포함  
-    - **‘상’**: ③의 답변이 존재하며 조건 충족  
-    - **‘중’**: 답변은 없지만 유의미한 간접 정보 포함  
-    5. 확신이 없으면 제외(오탐 방지)
-    6. ⚠️ **절대 금지**: "~이/가 명시되어 있습니다", "~에 관한 정보가 있습니다" 같은 추상적 설명. 반드시 구체적인 사실이나 내용을 발췌해서 답변할 것
+def build_batch_content(batch_info, batch_file, prompt):
+    """모델 입력 (파일 배치는 업로드 파일, 텍스트 배치는 페이지 텍스트 블록 + 프롬프트)"""
+    if is_text_batch(batch_info):
+        text = format_page_text_blocks(batch_info)
+        tracing.add_count('text_bytes', len(text.encode("utf-8")))
+        return [text, prompt]
+    return [batch_file, prompt]
 
+@tracing.traced("analyze_pdf_batch")
+def analyze_pdf_batch(batch_path, refined_prompt, batch_info, status_placeholder=None, batch_file=None, on_page=None):
+    """단일 배치 분석 (파일 배치는 batch_file이 없으면 레지스트리를 통해 업로드, 텍스트 배치는 텍스트 전송)
+
+    응답은 스트리밍으로 받으며, on_page(pages, page_info)는 pages 항목이 완성될 때마다
+    (작업 스레드에서) 호출됩니다. 반환값은 전체 응답 문자열입니다.
+    """
+    tracing.set_attributes(pages=len(batch_info['pages']), start_page=batch_info['start_page'],
+                           mode=batch_info.get('mode', "file"))
+    # 배치 파일을 Gemini에 업로드 (같은 내용이 이미 업로드되어 있으면 재사용)
+    if batch_file is None and not is_text_batch(batch_info):
+        batch_file = get_upload_registry().upload_path(batch_path)
+    
+    intro, page_number_hint = describe_batch_source(batch_info)
+    prompt = f"""
+    {intro}
+
+    ## 사용자 질문
+    {refined_prompt}
+
+{BATCH_RELEVANCE_RULES}
     ## 응답 형식
     관련성이 높은 페이지만 JSON으로 응답하세요:
 
@@ -322,7 +876,7 @@ def analyze_pdf_batch(batch_path, refined_prompt, batch_info, status_placeholder
     {{
         "pages": [
             {{
-                "page_number": [좌측 상단의 실제 페이지 번호],
+                "page_number": [{page_number_hint}],
                 "answer": "[사용자 질문에 대한 직접 답변 또는 빈 문자열]",
                 "relevance": "[상/중]"
             }}
@@ -333,11 +887,101 @@ def analyze_pdf_batch(batch_path, refined_prompt, batch_info, status_placeholder
     ⚠️ 관련성이 낮은 페이지는 절대 포함하지 마세요!
     """
     
-    model = genai.GenerativeModel(GEMINI_MODEL)
-    return call_gemini_with_retry(model, [batch_file, prompt], status_placeholder=status_placeholder)
+    model = get_model_backend().generative_model(GEMINI_MODEL)
+    return call_gemini_with_retry(
+        model,
+        build_batch_content(batch_info, batch_file, prompt),
+        status_placeholder=status_placeholder,
+        generation_config=page_result_generation_config(),
+        stream=GEMINI_STREAM_RESPONSES,
+        on_chunk=page_stream_handler(on_page),
+    )
+
+def page_stream_handler(on_page):
+    """스트리밍 조각에서 pages 항목을 꺼내 on_page(pages, page_info)로 전달하는 on_chunk 함수"""
+    started = time.monotonic()
+    parser = JsonArrayItemParser(pages_array_pattern())
+    emitted = set()
+
+    def on_chunk(text):
+        nonlocal parser
+        if text is None:
+            # 재시도로 응답을 처음부터 다시 받음 (이미 전달한 페이지는 다시 보내지 않음)
+            parser = JsonArrayItemParser(pages_array_pattern())
+            return
+        for item in parser.feed(text):
+            pages, page_info = parse_page_items([item])
+            pages = [page_num for page_num in pages if page_num not in emitted]
+            if not pages:
+                continue
+            if not emitted:
+                tracing.set_attributes(first_page_seconds=round(time.monotonic() - started, 3))
+            emitted.update(pages)
+            if on_page:
+                on_page(pages, {page_num: page_info[page_num] for page_num in pages})
+    return on_chunk
+
+@tracing.traced("analyze_pdf_batch_multi")
+def analyze_pdf_batch_multi(batch_path, questions, batch_info, status_placeholder=None, batch_file=None):
+    """단일 배치에서 여러 질문을 한 번에 분석 (질문 ID별 JSON 응답)"""
+    tracing.set_attributes(pages=len(batch_info['pages']), start_page=batch_info['start_page'], questions=len(questions),
+                           mode=batch_info.get('mode', "file"))
+    if batch_file is None and not is_text_batch(batch_info):
+        batch_file = get_upload_registry().upload_path(batch_path)
+
+    questions_text = "\n".join(f"    - {q['id']}: {q['question']}" for q in questions)
+    intro, page_number_hint = describe_batch_source(batch_info)
+    prompt = f"""
+    {intro}
+
+    ## 사용자 질문 목록 (질문 ID: 질문)
+{questions_text}
+
+    아래 기준을 **각 질문마다 독립적으로** 적용하세요.
+{BATCH_RELEVANCE_RULES}
+    ## 응답 형식
+    질문 ID를 키로 하여, 질문별로 관련성이 높은 페이지만 JSON으로 응답하세요.
+    관련 페이지가 없는 질문은 빈 배열을 사용하세요:
+
+    ```json
+    {{
+        "answers": {{
+            "[질문 ID]": {{
+                "pages": [
+                    {{
+                        "page_number": [{page_number_hint}],
+                        "answer": "[해당 질문에 대한 직접 답변 또는 빈 문자열]",
+                        "relevance": "[상/중]"
+                    }}
+                ]
+            }}
+        }}
+    }}
+    ```
+
+    ⚠️ 관련성이 낮은 페이지는 절대 포함하지 마세요!
+    """
+
+    model = get_model_backend().generative_model(GEMINI_MODEL)
+    return call_gemini_with_retry(
+        model,
+        build_batch_content(batch_info, batch_file, prompt),
+        status_placeholder=status_placeholder,
+        generation_config=page_result_generation_config([q['id'] for q in questions]),
+        stream=GEMINI_STREAM_RESPONSES,
+    )
 
+@tracing.traced("enhance_user_prompt")
 def enhance_user_prompt(user_prompt, status_placeholder=None):
     """사용자의 초기 프롬프트를 더 명확하고 구체적으로 개선"""
+    cache = get_cache()
+    cache_key = make_cache_key("enhance", model=GEMINI_MODEL, prompt=user_prompt)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        if status_placeholder:
+            status_placeholder.success(f"✅ 질문 분석 완료: {cached}")
+        return cached
+
     try:
         if status_placeholder:
             status_placeholder.info("🔍 질문 분석 중...")
@@ -357,12 +1001,13 @@ def enhance_user_prompt(user_prompt, status_placeholder=None):
 개선된 질문만 출력하세요. 추가 설명은 하지 마세요.
 """
         
-        model = genai.GenerativeModel(GEMINI_MODEL)
+        model = get_model_backend().generative_model(GEMINI_MODEL)
         enhanced_prompt = call_gemini_with_retry(model, prompt, max_retries=2, base_delay=1)
         
         if status_placeholder:
             status_placeholder.success(f"✅ 질문 분석 완료: {enhanced_prompt}")
         
+        cache.set(cache_key, enhanced_prompt.strip())
         return enhanced_prompt.strip()
         
     except Exception as e:
@@ -370,65 +1015,412 @@ def enhance_user_prompt(user_prompt, status_placeholder=None):
             status_placeholder.warning("⚠️ 질문 개선 실패, 원본 질문으로 진행합니다.")
         return user_prompt
 
-def find_relevant_pages_with_gemini(user_prompt, pdf_bytes=None, status_placeholder=None):
-    """배치 단위로 PDF 분석"""
+def batch_cache_key(pdf_hash, batch, refined_prompt):
+    """배치 분석 결과 캐시 키 (PDF 해시 + 배치 범위 + 모델 + 프롬프트, 텍스트 배치는 구분)"""
+    return make_cache_key(
+        "batch",
+        pdf=pdf_hash,
+        pages=batch['pages'],
+        model=GEMINI_MODEL,
+        prompt=refined_prompt,
+        **({'mode': "text"} if is_text_batch(batch) else {}),
+    )
+
+def encode_page_result(pages, page_info):
+    """파싱된 배치 결과를 JSON 저장용으로 변환 (페이지 번호 키 보존)"""
+    return {'pages': pages, 'page_info': [[page, info] for page, info in page_info.items()]}
+
+def decode_page_result(data):
+    """encode_page_result로 저장한 결과 복원"""
+    return data['pages'], {int(page): info for page, info in data['page_info']}
+
+def merge_page_results(results):
+    """배치 순서대로 (pages, page_info) 결과 병합 (중복 제거 및 정렬)"""
     all_pages = []
     all_page_info = {}
-    
-    if pdf_bytes:
-        # 프롬프트 개선
-        refined_prompt = enhance_user_prompt(user_prompt, status_placeholder)
-        
-        # 개선된 프롬프트를 세션에 저장
-        st.session_state.refined_prompt = refined_prompt
-        
-        # PDF를 배치로 나누어 분석
-        batches = split_pdf_for_batch_analysis(pdf_bytes, batch_size=10)
-        
-        progress_bar = st.progress(0)
-        for idx, batch in enumerate(batches):
-            progress_bar.progress((idx + 1) / len(batches))
-            
+    for result in results:
+        if result is None:
+            continue
+        pages, page_info = result
+        all_pages.extend(pages)
+        all_page_info.update(page_info)
+
+    unique_pages = list(dict.fromkeys(all_pages))
+    return sorted(unique_pages), all_page_info
+
+def memory_bounded_uploads(document, batches, memory_limit=None):
+    """세션 메모리 예산 안에서 동시에 생성/업로드할 수 있는 배치 수"""
+    largest = max((len(batch['pages']) for batch in batches if not is_text_batch(batch)), default=1)
+    per_batch = document.estimated_bytes(largest) * BATCH_BUFFER_MEMORY_FACTOR
+    return max(1, min(MAX_CONCURRENT_UPLOADS, (memory_limit or SESSION_MEMORY_LIMIT_BYTES) // max(1, per_batch)))
+
+def iter_batch_analysis(batches, cache_keys, analyze, parse, max_concurrency=None, on_batch_done=None, document=None,
+                        memory_limit=None):
+    """배치들을 동시에 분석하며 끝나는 순서대로 (배치 인덱스, 결과, 오류)를 생성
+
+    analyze(batch, batch_file)는 모델 응답 문자열을, parse(response)는 JSON 저장 가능한
+    결과를 반환해야 합니다. 캐시에 있는 배치는 분석하지 않고 먼저 생성되며, 실패한 배치는
+    결과 None과 오류를 생성합니다. on_batch_done(batch, seconds, error)은 분석한 배치가 끝날
+    때마다 호출됩니다. API 할당량이 소진되면 남은 작업을 취소하고 QuotaExhaustedError를
+    발생시킵니다. 소비를 중단해도 (generator close) 작업과 임시 파일이 정리됩니다.
+
+    파일이 없는 (lazy) 배치는 BatchStream으로 업로드 직전에 생성하고 업로드 후 바로 삭제하며,
+    동시에 존재하는 배치 수는 memory_limit(세션 메모리 예산) 안으로 제한합니다. 남은 배치
+    파일은 스트림의 임시 디렉터리와 함께 삭제됩니다. 텍스트 배치는 업로드 없이 batch_file None으로
+    analyze가 호출됩니다.
+    """
+    cache = get_cache()
+    max_workers = max(1, min(max_concurrency or MAX_CONCURRENT_BATCHES, len(batches) or 1))
+
+    # 작업 스레드에서는 Streamlit 요소를 건드리지 않음
+    registry = get_upload_registry()
+    lazy = any(not batch.get('path') and not is_text_batch(batch) for batch in batches)
+    if lazy and document is None:
+        raise ValueError("파일이 없는 배치를 분석하려면 document가 필요합니다.")
+    upload_workers = memory_bounded_uploads(document, batches, memory_limit) if lazy else MAX_CONCURRENT_UPLOADS
+    stream = BatchStream(document, lookahead=upload_workers).__enter__() if lazy else None
+    upload_executor = ThreadPoolExecutor(max_workers=upload_workers)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    batch_seconds = {}
+
+    def upload_batch(idx):
+        batch = batches[idx]
+        if is_text_batch(batch):
+            return None
+        if batch.get('path'):
+            return registry.upload_path(batch['path'])
+        # 업로드 직전에 생성하고 업로드가 끝나면 바로 삭제 (분석은 업로드된 파일만 사용)
+        with stream.open(batch) as buffer:
+            return registry.upload_path(buffer.path)
+
+    def run_batch(idx, upload_future):
+        # 업로드는 별도 풀에서 앞서 진행되므로 이전 배치 추론과 겹침
+        batch_file = upload_future.result()
+        started = time.monotonic()
+        try:
+            return analyze(batches[idx], batch_file)
+        finally:
+            batch_seconds[idx] = time.monotonic() - started
+
+    try:
+        pending_batches = []
+        for idx, key in enumerate(cache_keys):
+            cached = cache.get(key)
+            if cached is None:
+                pending_batches.append(idx)
+            else:
+                yield idx, cached, None
+
+        # 작업 스레드의 span이 현재 실행의 추적에 이어지도록 문맥을 함께 전달
+        upload_futures = {
+            idx: upload_executor.submit(tracing.bind_context(upload_batch), idx)
+            for idx in pending_batches
+        }
+        futures = {
+            executor.submit(tracing.bind_context(run_batch), idx, upload_futures[idx]): idx
+            for idx in pending_batches
+        }
+
+        for future in as_completed(futures):
+            idx = futures[future]
             try:
-                # 배치간 대기 시간 제거 (Paid API 사용)
-                
-                # 현재 배치 진행상황 표시
-                if status_placeholder:
-                    status_placeholder.info(f"🤖 배치 {idx + 1}/{len(batches)} 분석 중... (페이지 {batch['start_page']}-{batch['end_page']})")
-                
-                # 배치 분석 (내부에서 업로드 처리)
-                batch_response = analyze_pdf_batch(batch['path'], refined_prompt, batch, status_placeholder)
-                
                 # 결과 파싱
-                pages, page_info = parse_page_info(batch_response)
-                
-                # 전체 결과에 병합
-                all_pages.extend(pages)
-                all_page_info.update(page_info)
-                
+                result = parse(future.result())
             except Exception as e:
                 # API 할당량 소진 시 즉시 중단
                 if "QUOTA_EXHAUSTED" in str(e):
-                    if status_placeholder:
-                        status_placeholder.error("❌ API 할당량이 소진되어 분석을 완료할 수 없습니다.")
-                    progress_bar.empty()
-                    # 할당량 소진 시 빈 결과 반환 (부분 결과 X)
-                    return [], {}
-                else:
-                    if status_placeholder:
-                        status_placeholder.warning(f"⚠️ 배치 {idx + 1} 처리 실패: {e}")
-                    continue
-            finally:
-                # 임시 파일 삭제
-                if os.path.exists(batch['path']):
-                    os.unlink(batch['path'])
-        
-        progress_bar.empty()
-        
-        # 중복 제거 및 정렬
-        unique_pages = list(dict.fromkeys(all_pages))
-        return sorted(unique_pages), all_page_info
-    
-    else:
+                    for pending in list(futures) + list(upload_futures.values()):
+                        pending.cancel()
+                    raise QuotaExhaustedError() from e
+                if on_batch_done:
+                    on_batch_done(batches[idx], batch_seconds.get(idx, 0.0), e)
+                yield idx, None, e
+                continue
+
+            cache.set(cache_keys[idx], result)
+            if on_batch_done:
+                on_batch_done(batches[idx], batch_seconds.get(idx, 0.0), None)
+            yield idx, result, None
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        upload_executor.shutdown(wait=True, cancel_futures=True)
+        if stream is not None:
+            stream.close()
+        cleanup_batch_files(batches)
+
+def run_batch_analysis(batches, cache_keys, analyze, parse, status_placeholder=None, max_concurrency=None, on_batch_done=None,
+                       on_result=None, on_progress=None, document=None):
+    """iter_batch_analysis를 진행 상황 보고와 함께 실행하고 배치 순서대로 파싱 결과 반환
+
+    실패한 배치의 결과는 None입니다. on_result(batch, result)는 캐시 또는 분석으로 배치
+    결과를 얻을 때마다, on_progress(완료 배치 수, 전체 배치 수)는 배치가 끝날 때마다
+    (호출한 스레드에서) 호출됩니다.
+    API 할당량이 소진되면 남은 작업을 취소하고 None을 반환합니다.
+    """
+    # 배치 순서대로 결과를 모으기 위해 인덱스별로 저장
+    batch_results = [None] * len(batches)
+    completed = 0
+    if status_placeholder:
+        status_placeholder.info(f"🤖 배치 {len(batches)}개 분석 중... (동시 최대 {max_concurrency or MAX_CONCURRENT_BATCHES}개)")
+
+    try:
+        for idx, result, error in iter_batch_analysis(batches, cache_keys, analyze, parse, max_concurrency, on_batch_done,
+                                                      document=document):
+            batch = batches[idx]
+            completed += 1
+            if on_progress:
+                on_progress(completed, len(batches))
+
+            if error is not None:
+                if status_placeholder:
+                    status_placeholder.warning(f"⚠️ 배치 {idx + 1} 처리 실패: {error}")
+                continue
+
+            batch_results[idx] = result
+            if on_result:
+                on_result(batch, result)
+            if status_placeholder:
+                status_placeholder.info(f"🤖 배치 {completed}/{len(batches)} 분석 완료 (페이지 {batch['start_page']}-{batch['end_page']})")
+    except QuotaExhaustedError:
+        if status_placeholder:
+            status_placeholder.error("❌ API 할당량이 소진되어 분석을 완료할 수 없습니다.")
+        return None
+
+    return batch_results
+
+def iter_relevant_pages(refined_prompt, pdf_bytes, batches, pdf_hash=None, max_concurrency=None, batch_strategy=None):
+    """배치가 파싱되는 대로 (page, page_info) 생성 (배치 완료 순서)
+
+    batches는 prepare_analysis_batches 결과를 전달합니다. 할당량이 소진되면
+    QuotaExhaustedError가 발생하며, 그때까지 생성된 결과는 그대로 유효합니다.
+    """
+    pdf_hash = pdf_hash or as_pdf_document(pdf_bytes).sha256
+    cache_keys = [batch_cache_key(pdf_hash, batch, refined_prompt) for batch in batches]
+    stream = iter_batch_analysis(
+        batches,
+        cache_keys,
+        analyze=lambda batch, batch_file: analyze_pdf_batch(batch['path'], refined_prompt, batch, batch_file=batch_file),
+        parse=lambda response: encode_page_result(*parse_page_info(response)),
+        max_concurrency=max_concurrency,
+        on_batch_done=lambda batch, seconds, error: record_batch_result(batch, seconds, error, strategy=batch_strategy),
+        document=as_pdf_document(pdf_bytes),
+    )
+    for _, result, _ in stream:
+        if result is None:
+            continue
+        pages, page_info = decode_page_result(result)
+        for page in pages:
+            yield page, page_info.get(page, {})
+
+@tracing.traced("prepare_analysis_batches")
+def prepare_analysis_batches(pdf_bytes, refined_prompt=None, prefilter=False, prefilter_top_k=None, batch_strategy=None,
+                             exclude_pages=None, text_first=None):
+    """(사전 필터 적용 후) 분석용 배치 계획 생성 (배치 PDF는 분석 시점에 생성)
+
+    (batches, 사전 필터 보고서 또는 None)을 반환합니다. 사전 필터를 쓰지 않으면
+    refined_prompt 없이도 실행할 수 있어 질문 개선과 동시에 진행할 수 있습니다.
+    exclude_pages의 페이지(재개 시 이미 완료된 페이지)는 배치에서 제외합니다.
+    text_first는 split_pdf_for_batch_analysis로 전달됩니다.
+    Streamlit 요소를 사용하지 않으므로 작업 스레드에서 실행해도 됩니다.
+    """
+    document = as_pdf_document(pdf_bytes)
+    selected_pages, report = None, None
+    if prefilter:
+        prefilter_options = {'top_k': prefilter_top_k} if prefilter_top_k else {}
+        selected_pages, report = prefilter_pages(document, refined_prompt, **prefilter_options)
+    if exclude_pages:
+        candidates = selected_pages if selected_pages is not None else range(1, document.page_count + 1)
+        selected_pages = [page_num for page_num in candidates if page_num not in exclude_pages]
+    batches = split_pdf_for_batch_analysis(document, batch_size=10, pages=selected_pages, strategy=batch_strategy,
+                                           text_first=text_first)
+    return batches, report
+
+@tracing.traced("find_relevant_pages")
+def find_relevant_pages_with_gemini(user_prompt, pdf_bytes=None, status_placeholder=None, max_concurrency=None, pdf_hash=None,
+                                    prefilter=False, prefilter_top_k=None, batch_strategy=None,
+                                    refined_prompt=None, batches=None, on_batch_result=None, on_progress=None, text_first=None,
+                                    on_page_result=None, on_partial=None):
+    """배치 단위로 PDF 분석 (최대 max_concurrency개 배치를 동시에 처리)
+
+    pdf_bytes에는 PDF 바이트 또는 PdfDocument를 전달할 수 있습니다.
+    prefilter가 True이면 로컬 텍스트 검색으로 관련 가능성이 높은 페이지만 모아 분석합니다.
+    batch_strategy/text_first는 split_pdf_for_batch_analysis의 strategy/text_first로 전달됩니다.
+    refined_prompt/batches를 미리 준비해 전달하면 (파이프라인 병렬 실행) 해당 단계를 건너뜁니다.
+    on_batch_result(pages, page_info)는 배치 결과가 나올 때마다, on_progress(완료, 전체)는
+    배치가 끝날 때마다 호출됩니다. on_page_result(pages, page_info)는 스트리밍 응답에서 페이지
+    항목이 완성될 때마다 작업 스레드에서 호출되므로 스레드 안전해야 합니다 (배치 완료 전 미리보기 등).
+    Streamlit에 의존하지 않으므로 CLI 등에서도 사용할 수 있습니다.
+
+    완료된 배치 결과는 PDF 해시 + 사용자 질문 + 모델 기준 작업으로 즉시 기록되므로, 중단(할당량 소진,
+    새로고침 등) 후 같은 질문을 다시 실행하면 완료되지 않은 페이지만 분석합니다.
+    할당량이 소진되면 그때까지 완료된 배치(이전 실행 포함)의 결과를 반환하고, 결과가 일부뿐임을
+    on_partial(완료 배치 수, 전체 배치 수)로 알립니다.
+    batch_strategy가 "adaptive"이면 실패한 배치를 계획기로 더 작게 나누어 최대 ADAPTIVE_RESPLIT_ROUNDS번
+    다시 분석합니다 (고정 크기 전략의 실패 배치는 재시도하지 않음).
+    """
+    if not pdf_bytes:
         # pdf_bytes가 없는 경우 빈 결과 반환
-        return [], {}
\ No newline at end of file
+        return [], {}
+
+    document = as_pdf_document(pdf_bytes)
+    # 캐시 키는 원본 PDF 해시를 기준으로 함 (없으면 전달된 문서의 해시 사용)
+    pdf_hash = pdf_hash or document.sha256
+
+    # 프롬프트 개선
+    if refined_prompt is None:
+        refined_prompt = enhance_user_prompt(user_prompt, status_placeholder)
+
+    # 이전 실행에서 완료된 배치 결과 불러오기
+    job_store = get_job_store()
+    # 질문 개선 결과는 실행마다 달라질 수 있으므로 사용자 질문 기준으로 작업을 식별
+    job_id = job_store.make_job_id(pdf_hash, user_prompt, GEMINI_MODEL)
+    job_store.start_job(job_id, pdf_hash, user_prompt, GEMINI_MODEL)
+    previous_results = job_store.completed_batches(job_id)
+    completed_pages = {page_num for batch_pages, _ in previous_results for page_num in batch_pages}
+    if previous_results:
+        for _, result in previous_results:
+            if on_batch_result:
+                on_batch_result(*decode_page_result(result))
+        if status_placeholder:
+            status_placeholder.info(f"♻️ 이전 실행에서 완료된 {len(completed_pages)}페이지는 건너뛰고 이어서 분석합니다.")
+
+    # 로컬 사전 필터 적용 후 PDF를 배치로 나누어 분석
+    if batches is None:
+        batches, report = prepare_analysis_batches(
+            document, refined_prompt, prefilter=prefilter, prefilter_top_k=prefilter_top_k, batch_strategy=batch_strategy,
+            exclude_pages=completed_pages, text_first=text_first
+        )
+        if report and status_placeholder:
+            status_placeholder.info(f"⚡ 사전 필터: 전체 {report['total_pages']}페이지 중 {report['selected_pages']}페이지 분석 ({report['skipped_pages']}페이지 건너뜀)")
+    else:
+        # 미리 만든 배치 중 이미 완료된 배치는 제외
+        batches = [batch for batch in batches if not set(batch['pages']) <= completed_pages]
+    cache_keys = [batch_cache_key(pdf_hash, batch, refined_prompt) for batch in batches]
+
+    def on_result(batch, result):
+        # 완료 즉시 기록하여 중단되어도 다음 실행에서 재사용
+        job_store.record_batch(job_id, batch['pages'], result)
+        if on_batch_result:
+            on_batch_result(*decode_page_result(result))
+
+    run_options = dict(
+        analyze=lambda batch, batch_file: analyze_pdf_batch(
+            batch['path'], refined_prompt, batch, batch_file=batch_file, on_page=on_page_result
+        ),
+        parse=lambda response: encode_page_result(*parse_page_info(response)),
+        status_placeholder=status_placeholder,
+        max_concurrency=max_concurrency,
+        on_batch_done=lambda batch, seconds, error: record_batch_result(batch, seconds, error, strategy=batch_strategy),
+        on_result=on_result,
+        on_progress=on_progress,
+        document=document,
+    )
+    results = run_batch_analysis(batches, cache_keys, **run_options)
+
+    # 적응형 전략이면 실패한 배치를 (실패로 줄어든 예산의) 계획기로 더 작게 나누어 이번 실행 안에서 다시 분석
+    for _ in range(ADAPTIVE_RESPLIT_ROUNDS):
+        if results is None:
+            break
+        failed_batches = [batch for batch, result in zip(batches, results) if result is None]
+        retry_batches = resplit_failed_batches(document, failed_batches, strategy=batch_strategy)
+        if not retry_batches:
+            break
+        if status_placeholder:
+            status_placeholder.info(f"🔁 실패한 배치 {len(failed_batches)}개를 {len(retry_batches)}개로 나누어 다시 분석합니다.")
+        retry_results = run_batch_analysis(
+            retry_batches, [batch_cache_key(pdf_hash, batch, refined_prompt) for batch in retry_batches], **run_options
+        )
+        if retry_results is None:
+            results = None
+            break
+        # 병합 결과가 페이지 순서를 유지하도록 완료된 배치와 재시도 배치를 시작 페이지 순으로 정렬
+        merged = sorted(
+            [(batch, result) for batch, result in zip(batches, results) if result is not None]
+            + list(zip(retry_batches, retry_results)),
+            key=lambda item: item[0]['start_page'],
+        )
+        batches = [batch for batch, _ in merged]
+        results = [result for _, result in merged]
+
+    if results is None:
+        # 할당량 소진 시 지금까지 완료된 배치 결과 반환 (작업 저장소에 남아 다음 실행에서 이어서 분석)
+        finished_results = job_store.completed_batches(job_id)
+        job_store.finish_job(job_id, "aborted")
+        total_batches = len(previous_results) + len(batches)
+        tracing.set_attributes(partial=True, finished_batches=len(finished_results), total_batches=total_batches)
+        if status_placeholder:
+            status_placeholder.error(
+                f"❌ API 할당량이 소진되었습니다. 완료된 {len(finished_results)}개 배치의 결과만 표시합니다. "
+                "같은 질문으로 다시 실행하면 남은 배치부터 이어서 분석합니다."
+            )
+        if on_partial:
+            on_partial(len(finished_results), total_batches)
+        return merge_page_results([decode_page_result(result) for _, result in finished_results])
+    job_store.finish_job(job_id, "completed")
+
+    # 페이지 순서대로 결과 병합 (이전 실행 결과 포함)
+    return merge_page_results(
+        [decode_page_result(result) for _, result in previous_results]
+        + [decode_page_result(result) for result in results if result is not None]
+    )
+
+def build_question_list(question_texts):
+    """질문 문자열 목록을 ID가 붙은 질문 목록으로 변환 (빈 줄/중복 제거)"""
+    questions = []
+    for text in dict.fromkeys(t.strip() for t in question_texts):
+        if text:
+            questions.append({'id': f"q{len(questions) + 1}", 'question': text})
+    return questions
+
+@tracing.traced("find_relevant_pages_for_questions")
+def find_relevant_pages_for_questions(questions, pdf_bytes=None, status_placeholder=None, max_concurrency=None, pdf_hash=None,
+                                      on_progress=None, text_first=None):
+    """여러 질문을 배치당 한 번의 호출로 함께 분석
+
+    questions는 build_question_list 형식의 목록이며, 질문 ID별 (pages, page_info)를 반환합니다.
+    """
+    question_ids = [q['id'] for q in questions]
+    if not pdf_bytes or not questions:
+        return {question_id: ([], {}) for question_id in question_ids}
+
+    document = as_pdf_document(pdf_bytes)
+    pdf_hash = pdf_hash or document.sha256
+
+    batches = split_pdf_for_batch_analysis(document, batch_size=10, text_first=text_first)
+    cache_keys = [
+        make_cache_key(
+            "multi_batch",
+            pdf=pdf_hash,
+            pages=batch['pages'],
+            model=GEMINI_MODEL,
+            questions=questions,
+            **({'mode': "text"} if is_text_batch(batch) else {}),
+        )
+        for batch in batches
+    ]
+
+    def parse(response):
+        parsed = parse_page_info(response, question_ids=question_ids)
+        return {question_id: encode_page_result(*result) for question_id, result in parsed.items()}
+
+    results = run_batch_analysis(
+        batches,
+        cache_keys,
+        analyze=lambda batch, batch_file: analyze_pdf_batch_multi(batch['path'], questions, batch, batch_file=batch_file),
+        parse=parse,
+        status_placeholder=status_placeholder,
+        max_concurrency=max_concurrency,
+        on_progress=on_progress,
+        document=document,
+    )
+    if results is None:
+        return {question_id: ([], {}) for question_id in question_ids}
+
+    return {
+        question_id: merge_page_results(
+            decode_page_result(result[question_id])
+            for result in results
+            if result is not None and question_id in result
+        )
+        for question_id in question_ids
+    }
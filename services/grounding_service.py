@@ -0,0 +1,106 @@
+# grounding_service.py - 답변이 해당 페이지 텍스트에 근거하는지 로컬에서 판정 (글자 n-gram 겹침)
+
+import os, re
+import numpy as np
+from services.pdf_service import as_pdf_document
+from utils import tracing
+
+# 글자 n-gram 길이 (한글은 3글자면 단어 일부까지 구분됨)
+GROUNDING_NGRAM = 3
+# 답변 n-gram 중 페이지에 있는 비율이 이 이상이면 근거 있음, 이 미만이면 근거 없음 (사이는 모델 검증)
+GROUNDING_ACCEPT_RATIO = float(os.getenv("GROUNDING_ACCEPT_RATIO", "0.6"))
+GROUNDING_REJECT_RATIO = float(os.getenv("GROUNDING_REJECT_RATIO", "0.15"))
+# 이보다 n-gram이 적은 짧은 답변은 판단하지 않음
+GROUNDING_MIN_NGRAMS = 8
+# 잘못된 페이지 번호를 찾기 위해 함께 비교할 앞뒤 페이지 수
+GROUNDING_NEIGHBOR_WINDOW = 1
+# 이보다 텍스트가 적은 페이지(스캔/이미지)는 판단하지 않음
+GROUNDING_MIN_PAGE_CHARS = 50
+
+_NON_WORD_PATTERN = re.compile(r"[^0-9a-z가-힣]+")
+
+GROUNDED = "grounded"
+UNGROUNDED = "ungrounded"
+AMBIGUOUS = "ambiguous"
+
+def char_ngrams(text, n=GROUNDING_NGRAM):
+    """공백/문장부호를 제거하고 소문자로 바꾼 텍스트의 글자 n-gram 집합"""
+    normalized = _NON_WORD_PATTERN.sub("", (text or "").casefold())
+    return {normalized[idx:idx + n] for idx in range(len(normalized) - n + 1)}
+
+@tracing.traced("ground_answers")
+def ground_answers(rows, pdf_bytes, neighbor_window=GROUNDING_NEIGHBOR_WINDOW,
+                   accept_ratio=GROUNDING_ACCEPT_RATIO, reject_ratio=GROUNDING_REJECT_RATIO):
+    """각 행의 답변이 해당 페이지 텍스트에 근거하는지 판정
+
+    행마다 {'verdict': GROUNDED/UNGROUNDED/AMBIGUOUS, 'score', 'page'}를 반환합니다.
+    표시된 페이지보다 앞뒤 페이지가 답변과 더 잘 맞으면 (다른 행이 차지하지 않은 경우)
+    'page'에 그 페이지를 담아 GROUNDED로 판정합니다. 점수는 모든 행과 후보 페이지에 대해
+    한 번의 행렬 곱으로 계산합니다.
+    """
+    document = as_pdf_document(pdf_bytes)
+    verdicts = [{'verdict': AMBIGUOUS, 'score': None, 'page': row.get('페이지')} for row in rows]
+    answer_grams = [char_ngrams(row.get('답변')) for row in rows]
+    vocabulary = {gram: idx for idx, gram in enumerate(set().union(*answer_grams))}
+    claimed_pages = {row.get('페이지') for row in rows}
+    # 페이지 번호를 고칠 때 다른 행과 겹치지 않도록 이미 차지한 페이지
+    taken_pages = set(claimed_pages)
+    candidate_pages = sorted({
+        page + offset
+        for page in claimed_pages if isinstance(page, int)
+        for offset in range(-neighbor_window, neighbor_window + 1)
+        if 1 <= page + offset <= document.page_count
+    })
+    if not vocabulary or not candidate_pages:
+        return verdicts
+
+    answers = np.zeros((len(rows), len(vocabulary)), dtype=np.float32)
+    for row_idx, grams in enumerate(answer_grams):
+        answers[row_idx, [vocabulary[gram] for gram in grams]] = 1.0
+    pages = np.zeros((len(candidate_pages), len(vocabulary)), dtype=np.float32)
+    textless = set()
+    for page_idx, page_num in enumerate(candidate_pages):
+        text = document.page_text(page_num)
+        if len(text.strip()) < GROUNDING_MIN_PAGE_CHARS:
+            textless.add(page_num)
+            continue
+        grams = char_ngrams(text) & vocabulary.keys()
+        pages[page_idx, [vocabulary[gram] for gram in grams]] = 1.0
+
+    gram_counts = answers.sum(axis=1)
+    # (행 × 후보 페이지) 답변 n-gram 중 페이지에 있는 비율
+    overlap = (answers @ pages.T) / np.maximum(gram_counts, 1.0)[:, None]
+    page_index = {page_num: idx for idx, page_num in enumerate(candidate_pages)}
+
+    for row_idx, row in enumerate(rows):
+        page_num = row.get('페이지')
+        if page_num not in page_index or gram_counts[row_idx] < GROUNDING_MIN_NGRAMS or page_num in textless:
+            continue
+        score = float(overlap[row_idx, page_index[page_num]])
+        verdict = verdicts[row_idx]
+        verdict['score'] = round(score, 3)
+        if score >= accept_ratio:
+            verdict['verdict'] = GROUNDED
+            continue
+
+        neighbors = [
+            page_num + offset for offset in range(-neighbor_window, neighbor_window + 1)
+            if offset and page_num + offset in page_index and page_num + offset not in taken_pages
+        ]
+        best = max(neighbors, key=lambda other: overlap[row_idx, page_index[other]], default=None)
+        best_score = float(overlap[row_idx, page_index[best]]) if best is not None else 0.0
+        if best is not None and best_score >= accept_ratio:
+            # 답변 내용은 맞지만 페이지 번호가 틀린 경우
+            verdict.update(verdict=GROUNDED, score=round(best_score, 3), page=best)
+            taken_pages.add(best)
+        elif score < reject_ratio and best_score < reject_ratio and not any(other in textless for other in neighbors):
+            # 표시된 페이지와 이웃 페이지 모두 근거 없음 (이웃이 스캔 페이지면 판단하지 않음)
+            verdict['verdict'] = UNGROUNDED
+
+    tracing.set_attributes(
+        grounded=sum(1 for verdict in verdicts if verdict['verdict'] == GROUNDED),
+        ungrounded=sum(1 for verdict in verdicts if verdict['verdict'] == UNGROUNDED),
+        ambiguous=sum(1 for verdict in verdicts if verdict['verdict'] == AMBIGUOUS),
+        corrected_pages=sum(1 for verdict, row in zip(verdicts, rows) if verdict['page'] != row.get('페이지')),
+    )
+    return verdicts
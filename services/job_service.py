@@ -0,0 +1,131 @@
+# job_service.py - 재개 가능한 분석 작업 저장소 (SQLite)
+
+import json, os, sqlite3, threading, time
+from contextlib import contextmanager
+from services.cache_service import STATE_DIR, CACHE_TTL_SECONDS, make_cache_key
+
+# 캐시 정리(evict/clear) 대상이 아닌 상태 디렉터리에 둠
+JOB_DB_PATH = os.getenv("PDF_ANALYZER_JOB_DB", os.path.join(STATE_DIR, "jobs.sqlite3"))
+# 이 시간 동안 갱신되지 않은 작업은 삭제 (기본값은 캐시 TTL과 같음)
+JOB_TTL_SECONDS = int(os.getenv("PDF_ANALYZER_JOB_TTL", str(CACHE_TTL_SECONDS)))
+
+class JobStore:
+    """배치 결과를 완료 즉시 기록하여 중단된 분석을 남은 배치부터 재개할 수 있게 하는 저장소
+
+    배치 결과는 작업이 끝나지 않은 동안만 보관합니다. 완료된 작업의 결과는 디스크 캐시(크기/TTL 제한)가
+    맡고, 중단된 채 ttl_seconds 동안 갱신되지 않은 작업은 삭제됩니다.
+    """
+
+    def __init__(self, path=JOB_DB_PATH, ttl_seconds=JOB_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    pdf_hash TEXT NOT NULL,
+                    prompt TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS batch_results (
+                    job_id TEXT NOT NULL,
+                    pages TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    completed_at REAL NOT NULL,
+                    PRIMARY KEY (job_id, pages)
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        # 호출마다 연결을 새로 열어 Streamlit 세션/작업 스레드 간 공유 문제를 피함
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_job_id(pdf_hash, prompt, model):
+        """PDF 해시 + 사용자 질문 + 모델로 작업 ID 생성"""
+        return make_cache_key("job", pdf=pdf_hash, prompt=prompt, model=model)
+
+    def start_job(self, job_id, pdf_hash, prompt, model):
+        """작업 생성 또는 기존 작업을 실행 중으로 표시 (만료된 작업은 먼저 삭제)"""
+        self.expire()
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO jobs (job_id, pdf_hash, prompt, model, status, created_at, updated_at)
+                VALUES (?, ?, ?, ?, 'running', ?, ?)
+                ON CONFLICT(job_id) DO UPDATE SET status='running', updated_at=excluded.updated_at
+                """,
+                (job_id, pdf_hash, prompt, model, now, now),
+            )
+
+    def record_batch(self, job_id, pages, result):
+        """완료된 배치의 파싱 결과 기록"""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO batch_results (job_id, pages, result, completed_at) VALUES (?, ?, ?, ?)",
+                (job_id, json.dumps(sorted(pages)), json.dumps(result, ensure_ascii=False), time.time()),
+            )
+            conn.execute("UPDATE jobs SET updated_at=? WHERE job_id=?", (time.time(), job_id))
+
+    def completed_batches(self, job_id):
+        """기록된 (페이지 목록, 결과) 목록 (완료 순서)"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT pages, result FROM batch_results WHERE job_id=? ORDER BY completed_at", (job_id,)
+            ).fetchall()
+        return [(json.loads(pages), json.loads(result)) for pages, result in rows]
+
+    def finish_job(self, job_id, status):
+        """작업 상태 변경 ("completed" 또는 "aborted", 완료된 작업의 배치 결과는 삭제)"""
+        with self._lock, self._connect() as conn:
+            conn.execute("UPDATE jobs SET status=?, updated_at=? WHERE job_id=?", (status, time.time(), job_id))
+            if status == "completed":
+                conn.execute("DELETE FROM batch_results WHERE job_id=?", (job_id,))
+
+    def expire(self):
+        """ttl_seconds 동안 갱신되지 않은 작업과 배치 결과 삭제 (삭제한 작업 수 반환)"""
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "DELETE FROM batch_results WHERE job_id IN (SELECT job_id FROM jobs WHERE updated_at < ?)", (cutoff,)
+            )
+            return conn.execute("DELETE FROM jobs WHERE updated_at < ?", (cutoff,)).rowcount
+
+    def get_job(self, job_id):
+        """작업 정보와 완료된 배치 수 (없으면 None)"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT job_id, pdf_hash, prompt, model, status, created_at, updated_at FROM jobs WHERE job_id=?",
+                (job_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            completed = conn.execute("SELECT COUNT(*) FROM batch_results WHERE job_id=?", (job_id,)).fetchone()[0]
+        keys = ('job_id', 'pdf_hash', 'prompt', 'model', 'status', 'created_at', 'updated_at')
+        return {**dict(zip(keys, row)), 'completed_batches': completed}
+
+_job_store = None
+_job_store_lock = threading.Lock()
+
+def get_job_store():
+    """프로세스 전역 작업 저장소"""
+    global _job_store
+    with _job_store_lock:
+        if _job_store is None:
+            _job_store = JobStore()
+        return _job_store
@@ -0,0 +1,213 @@
+# model_service.py - 모델 호출/파일 업로드 백엔드 (실제 Gemini / 오프라인용 가짜 백엔드)
+
+import hashlib, json, os, random, re, threading, time
+from collections import Counter
+import google.generativeai as genai
+
+# 사용할 백엔드: "gemini" (기본) 또는 "fake" (API를 호출하지 않는 결정적 응답, 벤치마크/오프라인 점검용)
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "gemini")
+
+class GeminiBackend:
+    """google.generativeai 모듈을 그대로 사용하는 백엔드"""
+
+    name = "gemini"
+
+    def generative_model(self, model_name):
+        return genai.GenerativeModel(model_name)
+
+    def upload_file(self, path):
+        return genai.upload_file(path)
+
+    def get_file(self, name):
+        return genai.get_file(name)
+
+    def delete_file(self, name):
+        return genai.delete_file(name)
+
+class FakeQuotaError(Exception):
+    """가짜 백엔드가 주입하는 429 오류 (메시지에 재시도 대기 힌트 포함)"""
+
+class FakeTransientError(Exception):
+    """가짜 백엔드가 주입하는 일시 오류"""
+
+class FakeFile:
+    """가짜 업로드 파일 객체"""
+
+    def __init__(self, name, path, size):
+        self.name = name
+        self.path = path
+        self.size = size
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+class FakeStreamResponse:
+    """stream=True 응답처럼 chunk_size 글자씩 나누어 생성되는 응답"""
+
+    def __init__(self, text, chunk_size=64, chunk_delay=0.0, sleep=time.sleep):
+        self.text = text
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.sleep = sleep
+
+    def __iter__(self):
+        for start in range(0, len(self.text), self.chunk_size):
+            if self.chunk_delay:
+                self.sleep(self.chunk_delay)
+            yield FakeResponse(self.text[start:start + self.chunk_size])
+
+class FakeModel:
+    def __init__(self, backend, model_name):
+        self.backend = backend
+        self.model_name = model_name
+
+    def generate_content(self, content, generation_config=None, stream=False):
+        return self.backend.generate_content(self.model_name, content, stream=stream)
+
+_BATCH_RANGE_PATTERN = re.compile(r"(\d+)페이지부터 (\d+)페이지까지")
+_BATCH_LIST_PATTERN = re.compile(r"다음 페이지만 포함합니다: ([\d, ]+)")
+_QUESTION_ID_PATTERN = re.compile(r"^\s*- (q\d+):", re.MULTILINE)
+_TABLE_PAGE_PATTERN = re.compile(r"^페이지 (\d+):", re.MULTILINE)
+_ORIGINAL_QUESTION_PATTERN = re.compile(r"원본 질문: (.*)")
+
+class FakeBackend:
+    """API를 호출하지 않고 프롬프트 종류에 맞는 고정 형식 JSON/텍스트를 돌려주는 백엔드
+
+    latency(+ 0~latency_jitter 초)만큼 지연하고, error_rate/quota_error_rate 확률로 일시 오류/429를
+    발생시킵니다. 같은 seed와 같은 프롬프트이면 같은 응답을 돌려주며, 페이지는 relevant_ratio
+    비율만큼 관련 페이지로 선택됩니다. calls에 메서드별 호출 횟수를 기록합니다.
+    스트리밍 호출은 응답을 stream_chunk_size 글자씩, 조각마다 stream_chunk_delay초 간격으로 생성합니다.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency=0.0, latency_jitter=0.0, error_rate=0.0, quota_error_rate=0.0,
+                 quota_retry_after=0.1, relevant_ratio=0.2, seed=0, sleep=time.sleep, stream_chunk_size=64,
+                 stream_chunk_delay=0.0):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.quota_error_rate = quota_error_rate
+        self.quota_retry_after = quota_retry_after
+        self.relevant_ratio = relevant_ratio
+        self.seed = seed
+        self.sleep = sleep
+        self.stream_chunk_size = stream_chunk_size
+        self.stream_chunk_delay = stream_chunk_delay
+        self.calls = Counter()
+        self._files = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _count(self, method):
+        with self._lock:
+            self.calls[method] += 1
+
+    def call_counts(self):
+        with self._lock:
+            return dict(self.calls)
+
+    def generative_model(self, model_name):
+        return FakeModel(self, model_name)
+
+    def upload_file(self, path):
+        self._count('upload_file')
+        with open(path, "rb") as f:
+            data = f.read()
+        handle = FakeFile(f"files/fake-{hashlib.sha256(data).hexdigest()[:16]}", path, len(data))
+        with self._lock:
+            self._files[handle.name] = handle
+        return handle
+
+    def get_file(self, name):
+        self._count('get_file')
+        with self._lock:
+            handle = self._files.get(name)
+        if handle is None:
+            raise FakeTransientError(f"404 file not found: {name}")
+        return handle
+
+    def delete_file(self, name):
+        self._count('delete_file')
+        with self._lock:
+            self._files.pop(name, None)
+
+    def generate_content(self, model_name, content, stream=False):
+        self._count('generate_content')
+        with self._lock:
+            delay = self.latency + self._rng.uniform(0, self.latency_jitter)
+            roll = self._rng.random()
+        if delay:
+            self.sleep(delay)
+        if roll < self.quota_error_rate:
+            raise FakeQuotaError(f"429 Resource has been exhausted (check quota). Please retry in {self.quota_retry_after}s")
+        if roll < self.quota_error_rate + self.error_rate:
+            raise FakeTransientError("503 The service is currently unavailable (fake)")
+
+        parts = content if isinstance(content, list) else [content]
+        prompt = "\n".join(part for part in parts if isinstance(part, str))
+        if stream:
+            return FakeStreamResponse(self.respond(prompt), self.stream_chunk_size, self.stream_chunk_delay, self.sleep)
+        return FakeResponse(self.respond(prompt))
+
+    def _is_relevant(self, key, page_num):
+        digest = hashlib.sha256(f"{self.seed}:{key}:{page_num}".encode("utf-8")).digest()
+        return digest[0] / 256 < self.relevant_ratio
+
+    def _page_items(self, key, pages):
+        return [
+            {'page_number': page_num, 'answer': f"{page_num}페이지의 관련 내용", 'relevance': "상" if page_num % 2 else "중"}
+            for page_num in pages if self._is_relevant(key, page_num)
+        ]
+
+    def respond(self, prompt):
+        """프롬프트 종류(배치 분석/다중 질문/검증/요약/질문 개선)에 맞는 응답 문자열"""
+        batch_pages = self._batch_pages(prompt)
+        if batch_pages is not None:
+            question_ids = _QUESTION_ID_PATTERN.findall(prompt)
+            if question_ids:
+                answers = {qid: {'pages': self._page_items(qid, batch_pages)} for qid in question_ids}
+                return "```json\n" + json.dumps({'answers': answers}, ensure_ascii=False) + "\n```"
+            return "```json\n" + json.dumps({'pages': self._page_items("single", batch_pages)}, ensure_ascii=False) + "\n```"
+        if "valid_pages" in prompt:
+            pages = [int(page) for page in _TABLE_PAGE_PATTERN.findall(prompt)]
+            return json.dumps({'valid_pages': pages})
+        match = _ORIGINAL_QUESTION_PATTERN.search(prompt)
+        if match:
+            return match.group(1).strip()
+        return "가짜 백엔드가 생성한 최종 요약입니다."
+
+    def _batch_pages(self, prompt):
+        match = _BATCH_RANGE_PATTERN.search(prompt)
+        if match:
+            return list(range(int(match.group(1)), int(match.group(2)) + 1))
+        match = _BATCH_LIST_PATTERN.search(prompt)
+        if match:
+            return [int(page) for page in match.group(1).replace(" ", "").split(",") if page]
+        return None
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def create_backend(name):
+    """이름으로 백엔드 생성"""
+    if name == "gemini":
+        return GeminiBackend()
+    if name == "fake":
+        return FakeBackend()
+    raise ValueError(f"알 수 없는 모델 백엔드: {name}")
+
+def get_model_backend():
+    """프로세스 전역 모델 백엔드 (MODEL_BACKEND 환경변수로 선택)"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend(MODEL_BACKEND)
+        return _backend
+
+def set_model_backend(backend):
+    """프로세스 전역 모델 백엔드 교체 (벤치마크/오프라인 실행용)"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
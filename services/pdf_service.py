@@ -1,55 +1,457 @@
-import io
+import io, os, logging, mmap, shutil, tempfile, threading, time
+from collections import OrderedDict
 from PyPDF2 import PdfReader, PdfWriter
-from pdf2image import convert_from_bytes
+from pdf2image import convert_from_bytes, convert_from_path
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import mm
-import streamlit as st
+from services.cache_service import sha256_bytes, sha256_file
+from utils import tracing
+
+logger = logging.getLogger(__name__)
+
+# 페이지 미리보기 이미지 캐시 설정
+PAGE_IMAGE_DPI = 100
+PAGE_IMAGE_JPEG_QUALITY = 80
+PAGE_IMAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_IMAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# 파싱된 PdfDocument를 보관할 최대 문서 수
+PDF_DOCUMENT_CACHE_SIZE = int(os.getenv("PDF_DOCUMENT_CACHE_SIZE", "4"))
+
+# 저메모리 모드: 업로드를 디스크에 저장(spool)하고 mmap으로 읽으며, 배치는 필요할 때 하나씩 생성
+LOW_MEMORY_MODE = os.getenv("LOW_MEMORY_MODE", "0") == "1"
+# 이 크기 이상인 업로드는 설정과 관계없이 저메모리 모드로 처리
+LOW_MEMORY_THRESHOLD_BYTES = int(os.getenv("LOW_MEMORY_THRESHOLD_MB", "50")) * 1024 * 1024
+# 세션당 분석 중 메모리 상한 (배치 버퍼 동시 생성 수를 이 예산 안으로 제한)
+SESSION_MEMORY_LIMIT_BYTES = int(os.getenv("SESSION_MEMORY_LIMIT_MB", "256")) * 1024 * 1024
+# 디스크 기반 문서에서 이만큼 페이지를 읽을 때마다 파싱된 객체 캐시를 비움 (PdfReader는 읽은 객체를 모두 보관)
+LOW_MEMORY_READER_RESET_PAGES = int(os.getenv("LOW_MEMORY_READER_RESET_PAGES", "200"))
+# 업로드 spool 파일 위치와 보관 기간
+SPOOL_DIR = os.path.join(tempfile.gettempdir(), "pdf_analyzer_uploads")
+SPOOL_TTL_SECONDS = 24 * 3600
+
+class PageImageCache:
+    """JPEG 바이트를 보관하는 바이트 크기 제한 LRU 캐시"""
+
+    def __init__(self, max_bytes=PAGE_IMAGE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            if key in self._items:
+                self.total_bytes -= len(self._items.pop(key))
+            # 한 장이 한도를 넘으면 보관하지 않음
+            if len(data) > self.max_bytes:
+                return
+            self._items[key] = data
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+_page_image_cache = PageImageCache()
+
+def _render_page_jpeg(pdf_source, page_num, dpi):
+    """단일 페이지를 JPEG 바이트로 렌더링 (PDF 바이트 또는 파일 경로, 오류는 호출자가 처리)"""
+    if isinstance(pdf_source, (str, os.PathLike)):
+        images = convert_from_path(pdf_source, dpi=dpi, first_page=page_num, last_page=page_num)
+    else:
+        images = convert_from_bytes(pdf_source, dpi=dpi, first_page=page_num, last_page=page_num)
+    if not images:
+        return None
+    buffer = io.BytesIO()
+    images[0].convert("RGB").save(buffer, format="JPEG", quality=PAGE_IMAGE_JPEG_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+@tracing.traced("render_page_image")
+def render_page_image(pdf_bytes, page_num, dpi=PAGE_IMAGE_DPI, pdf_hash=None):
+    """요청된 페이지 하나만 JPEG 바이트로 렌더링 (LRU 캐시 사용)"""
+    key = (pdf_hash or sha256_bytes(pdf_bytes), page_num, dpi)
+    cached = _page_image_cache.get(key)
+    if cached is not None:
+        return cached
 
-def convert_pdf_to_images(pdf_bytes):
-    """PDF를 이미지로 변환"""
     try:
-        return convert_from_bytes(pdf_bytes, dpi=100, fmt='jpeg')
+        data = _render_page_jpeg(pdf_bytes, page_num, dpi)
     except Exception as e:
-        st.warning(f"이미지 변환 오류: {e}")
-        return []
+        logger.warning("이미지 변환 오류: %s", e)
+        return None
+    if data is not None:
+        _page_image_cache.put(key, data)
+    return data
 
-def annotate_pdf_with_page_numbers(pdf_bytes):
-    """PDF에 페이지 번호 오버레이 추가"""
-    reader = PdfReader(io.BytesIO(pdf_bytes))
-    writer = PdfWriter()
+def render_pages_from_queue(pdf_bytes, page_queue, dpi=PAGE_IMAGE_DPI):
+    """큐로 전달되는 페이지 목록을 차례로 렌더링하여 캐시에 보관 (None을 받으면 종료)
 
-    for idx, page in enumerate(reader.pages):
-        width = float(page.mediabox.width)
-        height = float(page.mediabox.height)
+    분석이 진행되는 동안 백그라운드 단계로 실행하여 결과 페이지 미리보기를 준비합니다.
+    렌더링한 페이지 수를 반환합니다.
+    """
+    document = as_pdf_document(pdf_bytes)
+    rendered = 0
+    while True:
+        page_nums = page_queue.get()
+        if page_nums is None:
+            return rendered
+        for page_num in page_nums:
+            key = (document.sha256, page_num, dpi)
+            if key in _page_image_cache:
+                continue
+            try:
+                data = _render_page_jpeg(document.render_source, page_num, dpi)
+            except Exception:
+                continue
+            if data is not None:
+                _page_image_cache.put(key, data)
+                rendered += 1
 
-        packet = io.BytesIO()
-        c = canvas.Canvas(packet, pagesize=(width, height))
-        c.setFont("Helvetica", 9)
-        c.drawString(10 * mm, height - 15 * mm, str(idx + 1))
-        c.save()
+class PdfDocument:
+    """한 번만 파싱하여 파이프라인 전체에서 공유하는 PDF 문서 모델
+
+    path를 주면 파일을 mmap으로 열어 내용을 메모리에 복사하지 않으며 (저메모리 모드),
+    파싱된 객체 캐시도 주기적으로 비워 큰 문서에서도 메모리 사용량이 일정하게 유지됩니다.
+    """
+
+    def __init__(self, pdf_bytes=None, pdf_hash=None, path=None):
+        self.path = path
+        self._pdf_bytes = pdf_bytes
+        self._file = None
+        self._mmap = None
+        if path is not None:
+            self._open_file()
+            self.size = len(self._mmap)
+            self.sha256 = pdf_hash or sha256_file(path)
+        else:
+            self.size = len(pdf_bytes)
+            self.sha256 = pdf_hash or sha256_bytes(pdf_bytes)
+        self._reader = self._open_reader()
+        # PdfReader는 스레드 안전하지 않으므로 페이지 접근을 직렬화
+        self._lock = threading.RLock()
+        self._page_count = None
+        self._page_texts = {}
+        self._pages_since_reset = 0
+
+    @classmethod
+    def from_path(cls, path, pdf_hash=None):
+        """디스크의 PDF를 mmap으로 여는 문서"""
+        return cls(pdf_hash=pdf_hash, path=path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _open_file(self):
+        self._file = open(self.path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _open_reader(self):
+        if self.path is not None:
+            if self._mmap is None:
+                # close() 이후 다시 사용하는 경우
+                self._open_file()
+            # mmap은 read/seek/tell을 지원하므로 복사 없이 스트림으로 사용
+            self._mmap.seek(0)
+            return PdfReader(self._mmap)
+        return PdfReader(io.BytesIO(self._pdf_bytes))
+
+    def _current_reader(self):
+        """현재 reader (닫힌 문서면 다시 엶, 잠금 안에서 호출)"""
+        if self._reader is None:
+            self._reader = self._open_reader()
+            self._pages_since_reset = 0
+        return self._reader
+
+    def close(self):
+        """파싱된 reader와 추출 텍스트를 버리고 mmap/파일 핸들 해제
+
+        닫은 뒤에도 다시 사용하면 필요할 때 파일을 다시 열므로, 캐시에서 밀려난 문서를
+        다른 세션이 아직 참조하고 있어도 안전합니다.
+        """
+        with self._lock:
+            self._reader = None
+            self._page_texts = {}
+            if self._mmap is not None:
+                try:
+                    self._mmap.close()
+                except BufferError:
+                    # 아직 사용 중인 버퍼가 있으면 참조가 사라질 때 해제됨
+                    pass
+                self._mmap = None
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    @property
+    def is_disk_backed(self):
+        return self.path is not None
+
+    @property
+    def pdf_bytes(self):
+        """PDF 전체 바이트 (디스크 기반 문서는 읽을 때마다 복사하므로 render_source 사용 권장)"""
+        if self.path is not None:
+            with self._lock:
+                self._current_reader()
+                return self._mmap[:]
+        return self._pdf_bytes
+
+    @property
+    def render_source(self):
+        """이미지 렌더링 입력 (디스크 기반이면 파일 경로)"""
+        return self.path if self.path is not None else self._pdf_bytes
+
+    @property
+    def page_count(self):
+        """전체 페이지 수"""
+        with self._lock:
+            if self._page_count is None:
+                self._page_count = len(self._current_reader().pages)
+            return self._page_count
+
+    def page(self, page_num):
+        """1부터 시작하는 페이지 번호로 페이지 객체 조회 (필요할 때 파싱)"""
+        if not 1 <= page_num <= self.page_count:
+            raise IndexError(f"페이지 범위 초과: {page_num}")
+        with self._lock:
+            reader = self._current_reader()
+            if self.path is not None:
+                self._pages_since_reset += 1
+                if self._pages_since_reset > LOW_MEMORY_READER_RESET_PAGES:
+                    # 이미 반환된 페이지는 이전 reader를 참조하므로 그대로 유효
+                    reader = self._reader = self._open_reader()
+                    self._pages_since_reset = 1
+            return reader.pages[page_num - 1]
 
-        packet.seek(0)
-        overlay_pdf = PdfReader(packet)
-        page.merge_page(overlay_pdf.pages[0])
-        writer.add_page(page)
+    def page_size(self, page_num):
+        """페이지 크기 (너비, 높이)"""
+        with self._lock:
+            page = self.page(page_num)
+            return float(page.mediabox.width), float(page.mediabox.height)
 
-    output_stream = io.BytesIO()
-    writer.write(output_stream)
-    return output_stream.getvalue()
+    def write_pages(self, page_nums, stamp_page_numbers=False):
+        """지정한 페이지들만 담은 PDF 바이트 생성 (필요 시 페이지 번호 삽입)"""
+        page_nums = list(page_nums)
+        overlay = None
+        if stamp_page_numbers:
+            overlay = build_page_number_overlay([(n, *self.page_size(n)) for n in page_nums])
 
+        writer = PdfWriter()
+        with self._lock:
+            for idx, page_num in enumerate(page_nums):
+                # 공유 문서의 페이지를 변경하지 않도록 writer에 추가된 복제본에 병합
+                page = writer.add_page(self.page(page_num))
+                if overlay is not None:
+                    page.merge_page(overlay.pages[idx])
+            output_stream = io.BytesIO()
+            writer.write(output_stream)
+        return output_stream.getvalue()
+
+    def slice_bytes(self, start_page, end_page, stamp_page_numbers=False):
+        """start_page~end_page (포함) 범위의 PDF 바이트 생성"""
+        return self.write_pages(range(start_page, end_page + 1), stamp_page_numbers=stamp_page_numbers)
+
+    def page_text(self, page_num):
+        """페이지에서 추출한 텍스트 (한 번 추출하면 보관)"""
+        with self._lock:
+            if page_num not in self._page_texts:
+                try:
+                    self._page_texts[page_num] = self.page(page_num).extract_text() or ""
+                except Exception:
+                    # 손상되었거나 텍스트 레이어가 없는 페이지
+                    self._page_texts[page_num] = ""
+            return self._page_texts[page_num]
+
+    def page_stats(self, page_num):
+        """배치 비용 추정용 페이지 통계 (텍스트 길이, 이미지 수, 콘텐츠 바이트)"""
+        text_chars = len(self.page_text(page_num).strip())
+        image_count = 0
+        content_bytes = 0
+        with self._lock:
+            page = self.page(page_num)
+            try:
+                resources = page.get("/Resources")
+                xobjects = resources.get_object().get("/XObject") if resources else None
+                if xobjects:
+                    for xobject in xobjects.get_object().values():
+                        if xobject.get_object().get("/Subtype") == "/Image":
+                            image_count += 1
+            except Exception:
+                pass
+            try:
+                contents = page.get_contents()
+                content_bytes = len(contents.get_data()) if contents is not None else 0
+            except Exception:
+                pass
+        return {'text_chars': text_chars, 'image_count': image_count, 'content_bytes': content_bytes}
+
+    def iter_batches(self, batch_size=10, pages=None):
+        """batch_size 단위 페이지 묶음 정보 생성 (pages를 주면 해당 페이지만 순서대로 묶음)"""
+        if pages is None:
+            pages = range(1, self.page_count + 1)
+        pages = sorted(pages)
+        for start_idx in range(0, len(pages), batch_size):
+            batch_pages = pages[start_idx:start_idx + batch_size]
+            yield {
+                'start_page': batch_pages[0],
+                'end_page': batch_pages[-1],
+                'pages': batch_pages
+            }
+
+    def render_page(self, page_num, dpi=PAGE_IMAGE_DPI):
+        """페이지 미리보기 이미지 (JPEG 바이트, LRU 캐시 사용)"""
+        return render_page_image(self.render_source, page_num, dpi=dpi, pdf_hash=self.sha256)
+
+    def estimated_bytes(self, page_count):
+        """page_count페이지짜리 배치 PDF의 예상 크기 (평균 페이지 크기 기준)"""
+        return self.size * page_count // max(1, self.page_count)
+
+_documents = OrderedDict()
+_documents_lock = threading.Lock()
+
+@tracing.traced("get_pdf_document")
+def get_pdf_document(pdf_bytes, pdf_hash=None):
+    """캐시된 PdfDocument 반환 (없으면 파싱)
+
+    PDF 바이트는 내용 해시로, 파일 경로는 (경로, 수정 시각, 크기)로 캐시하며
+    파일 경로는 mmap으로 여는 디스크 기반 문서가 됩니다.
+    """
+    if isinstance(pdf_bytes, PdfDocument):
+        return pdf_bytes
+    if isinstance(pdf_bytes, (str, os.PathLike)):
+        cache_key = _document_cache_key(pdf_bytes)
+    else:
+        pdf_hash = pdf_hash or sha256_bytes(pdf_bytes)
+        cache_key = pdf_hash
+    with _documents_lock:
+        document = _documents.get(cache_key)
+        if document is not None:
+            _documents.move_to_end(cache_key)
+            return document
+
+    if isinstance(pdf_bytes, (str, os.PathLike)):
+        document = PdfDocument.from_path(os.fspath(pdf_bytes), pdf_hash=pdf_hash)
+    else:
+        document = PdfDocument(pdf_bytes, pdf_hash=pdf_hash)
+    evicted = []
+    with _documents_lock:
+        _documents[cache_key] = document
+        while len(_documents) > PDF_DOCUMENT_CACHE_SIZE:
+            evicted.append(_documents.popitem(last=False)[1])
+    for old_document in evicted:
+        old_document.close()
+    return document
+
+def _document_cache_key(path):
+    stat = os.stat(path)
+    return ("path", os.path.realpath(path), stat.st_mtime_ns, stat.st_size)
+
+def release_pdf_document(source):
+    """캐시에서 문서를 빼고 mmap/파일 핸들 해제 (spool 파일을 지우기 전에 호출)"""
+    if isinstance(source, PdfDocument):
+        with _documents_lock:
+            for key in [key for key, document in _documents.items() if document is source]:
+                del _documents[key]
+        source.close()
+        return
+    try:
+        cache_key = _document_cache_key(source) if isinstance(source, (str, os.PathLike)) else sha256_bytes(source)
+    except OSError:
+        return
+    with _documents_lock:
+        document = _documents.pop(cache_key, None)
+    if document is not None:
+        document.close()
+
+def as_pdf_document(source):
+    """PdfDocument, PDF 바이트 또는 파일 경로를 PdfDocument로 변환"""
+    if isinstance(source, PdfDocument):
+        return source
+    return get_pdf_document(source)
+
+def use_low_memory_mode(size_bytes):
+    """이 크기의 업로드를 저메모리 모드로 처리할지 여부"""
+    return LOW_MEMORY_MODE or size_bytes >= LOW_MEMORY_THRESHOLD_BYTES
+
+# 이 프로세스의 세션이 사용 중인 spool 파일 (release_spool_file로 해제하기 전까지 정리하지 않음)
+_active_spool_paths = set()
+_active_spool_lock = threading.Lock()
+
+def spool_pdf_upload(fileobj, directory=SPOOL_DIR, chunk_size=1024 * 1024):
+    """업로드 파일 객체를 디스크에 나누어 복사하고 경로 반환
+
+    사용이 끝나면 release_spool_file로 삭제해야 합니다. 오래된 spool 파일은 정리하되,
+    이 프로세스에서 아직 사용 중이거나 문서가 열려 있는 파일은 건너뜁니다.
+    """
+    os.makedirs(directory, exist_ok=True)
+    now = time.time()
+    with _active_spool_lock:
+        in_use = {os.path.realpath(path) for path in _active_spool_paths}
+    with _documents_lock:
+        in_use.update(key[1] for key in _documents if isinstance(key, tuple) and key[0] == "path")
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if os.path.realpath(path) in in_use:
+            continue
+        try:
+            if now - os.path.getmtime(path) > SPOOL_TTL_SECONDS:
+                os.unlink(path)
+        except OSError:
+            pass
+
+    if hasattr(fileobj, "seek"):
+        fileobj.seek(0)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf", dir=directory) as tmp:
+        shutil.copyfileobj(fileobj, tmp, chunk_size)
+    with _active_spool_lock:
+        _active_spool_paths.add(tmp.name)
+    return tmp.name
+
+def release_spool_file(path):
+    """spool 파일의 문서를 닫고 파일 삭제 (세션 초기화/새 업로드 시 호출)"""
+    release_pdf_document(path)
+    with _active_spool_lock:
+        _active_spool_paths.discard(path)
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+def build_page_number_overlay(pages):
+    """(페이지 번호, 너비, 높이) 목록으로 여러 페이지짜리 번호 오버레이를 한 번에 생성"""
+    packet = io.BytesIO()
+    c = canvas.Canvas(packet)
+    for page_num, width, height in pages:
+        c.setPageSize((width, height))
+        c.setFont("Helvetica", 9)
+        c.drawString(10 * mm, height - 15 * mm, str(page_num))
+        c.showPage()
+    c.save()
+
+    packet.seek(0)
+    return PdfReader(packet)
+
+@tracing.traced("extract_single_page_pdf")
 def extract_single_page_pdf(pdf_bytes, page_num):
     """PDF에서 특정 페이지만 추출"""
     try:
-        reader = PdfReader(io.BytesIO(pdf_bytes))
-        if 1 <= page_num <= len(reader.pages):
-            writer = PdfWriter()
-            writer.add_page(reader.pages[page_num - 1])
-            
-            output_stream = io.BytesIO()
-            writer.write(output_stream)
-            return output_stream.getvalue()
+        document = as_pdf_document(pdf_bytes)
+        if 1 <= page_num <= document.page_count:
+            return document.write_pages([page_num])
         else:
             return None
     except Exception as e:
-        st.error(f"페이지 추출 오류: {e}")
+        logger.error("페이지 추출 오류: %s", e)
         return None
\ No newline at end of file
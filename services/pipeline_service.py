@@ -0,0 +1,181 @@
+# pipeline_service.py - Streamlit 없이 실행하는 분석 파이프라인 (CLI/일괄 작업용)
+
+import logging, os
+from utils import tracing
+from services.pdf_service import get_pdf_document
+from services.gemini_service import (
+    enhance_user_prompt, prepare_analysis_batches, split_pdf_for_batch_analysis, find_relevant_pages_with_gemini,
+    validate_answers_with_prompt, generate_final_summary, EMPTY_ANSWER_TEXT
+)
+
+logger = logging.getLogger(__name__)
+
+class CallbackStatus:
+    """status_placeholder 대신 전달하는 상태 보고 객체
+
+    on_status(level, message)가 있으면 호출하고, 없으면 로그로 남깁니다.
+    """
+
+    LOG_LEVELS = {'info': logging.INFO, 'success': logging.INFO, 'warning': logging.WARNING, 'error': logging.ERROR}
+
+    def __init__(self, on_status=None, prefix=""):
+        self.on_status = on_status
+        self.prefix = prefix
+
+    def _emit(self, level, message):
+        message = f"{self.prefix}{message}"
+        if self.on_status:
+            self.on_status(level, message)
+        else:
+            logger.log(self.LOG_LEVELS[level], message)
+
+    def info(self, message):
+        self._emit('info', message)
+
+    def success(self, message):
+        self._emit('success', message)
+
+    def warning(self, message):
+        self._emit('warning', message)
+
+    def error(self, message):
+        self._emit('error', message)
+
+    def empty(self):
+        pass
+
+def build_table_rows(pages, page_info):
+    """(pages, page_info)를 페이지/답변/관련도 행 목록으로 변환 (검증/요약 입력 형식)"""
+    rows = []
+    for page_num in pages:
+        if page_num not in page_info:
+            continue
+        info = page_info[page_num]
+        answer = info.get('page_response') or ""
+        rows.append({
+            '페이지': page_num,
+            '답변': answer if answer.strip() else EMPTY_ANSWER_TEXT,
+            '관련도': info.get('relevance', ''),
+        })
+    return rows
+
+@tracing.traced("analyze_question")
+def analyze_question(pdf_bytes, question, prefilter=False, batch_strategy=None, max_concurrency=None,
+                     validate=True, summarize=True, on_status=None, on_progress=None, on_batch_result=None,
+                     text_first=None, on_page_result=None):
+    """질문 개선 → 배치 분석 → 답변 검증 → 최종 요약을 차례로 실행하고 결과 dict 반환
+
+    pdf_bytes에는 PDF 바이트 또는 PdfDocument를 전달할 수 있습니다. 진행 상황은
+    on_status(level, message), on_progress(완료 배치 수, 전체 배치 수)로 전달됩니다.
+    text_first가 True이면 텍스트 레이어가 충분한 페이지는 PDF 대신 추출 텍스트로 분석합니다.
+    on_page_result(pages, page_info)는 스트리밍 응답에서 페이지가 나올 때마다 작업 스레드에서 호출됩니다.
+    """
+    document = get_pdf_document(pdf_bytes)
+    status = CallbackStatus(on_status)
+
+    refined_prompt = enhance_user_prompt(question, status)
+    batches, report = prepare_analysis_batches(document, refined_prompt, prefilter=prefilter, batch_strategy=batch_strategy,
+                                               text_first=text_first)
+    partial = []
+    pages, page_info = find_relevant_pages_with_gemini(
+        question,
+        pdf_bytes=document,
+        status_placeholder=status,
+        max_concurrency=max_concurrency,
+        batch_strategy=batch_strategy,
+        refined_prompt=refined_prompt,
+        batches=batches,
+        on_batch_result=on_batch_result,
+        on_progress=on_progress,
+        on_page_result=on_page_result,
+        on_partial=lambda done, total: partial.append((done, total)),
+    )
+
+    candidate_rows = build_table_rows(pages, page_info)
+    rows = validate_answers_with_prompt(candidate_rows, refined_prompt, status, document=document) if validate else candidate_rows
+    summary = generate_final_summary(rows, refined_prompt, status) if summarize and rows else None
+
+    return {
+        'question': question,
+        'refined_question': refined_prompt,
+        'page_count': document.page_count,
+        'pages': [row['페이지'] for row in rows],
+        'rows': rows,
+        'candidate_count': len(candidate_rows),
+        'summary': summary,
+        'prefilter_report': report,
+        # 할당량 소진으로 일부 배치만 분석된 경우 True
+        'partial': bool(partial),
+    }
+
+def analyze_questions(pdf_bytes, questions, **options):
+    """한 문서에 대해 질문 목록을 차례로 분석 (문서는 한 번만 파싱)
+
+    options는 analyze_question의 키워드 인자로 전달됩니다.
+    """
+    document = get_pdf_document(pdf_bytes)
+    return [analyze_question(document, question, **options) for question in questions]
+
+def group_corpus_hits(hits):
+    """코퍼스 검색 결과를 문서별 후보 페이지로 묶음 ({경로: (sha256, 페이지 목록)}, 최고 점수 문서 순)"""
+    grouped = {}
+    for hit in hits:
+        _, pages = grouped.setdefault(hit['path'], (hit['sha256'], []))
+        pages.append(hit['page'])
+    return {path: (sha256, sorted(pages)) for path, (sha256, pages) in grouped.items()}
+
+@tracing.traced("analyze_corpus_question")
+def analyze_corpus_question(question, top_k=None, index=None, max_concurrency=None, validate=True, summarize=True,
+                            on_status=None, text_first=None):
+    """코퍼스 색인에서 후보 페이지를 찾고, 해당 페이지만 배치 분석 → 검증 → 요약
+
+    후보 페이지는 문서별로 모아 분석하며, 검증은 문서마다 (페이지 번호가 겹치지 않도록),
+    요약은 전체 문서의 결과를 합쳐 실행합니다. 결과 행에는 '문서' 경로가 추가됩니다.
+    """
+    from services.corpus_service import get_corpus_index, CORPUS_TOP_K
+
+    index = index or get_corpus_index()
+    status = CallbackStatus(on_status)
+    refined_prompt = enhance_user_prompt(question, status)
+    hits = index.search(refined_prompt, top_k=top_k or CORPUS_TOP_K)
+    candidates = group_corpus_hits(hits)
+    status.info(f"후보 페이지 {len(hits)}개 ({len(candidates)}개 문서)")
+
+    rows = []
+    partial = []
+    for path, (sha256, pages) in candidates.items():
+        doc_status = CallbackStatus(on_status, prefix=f"{os.path.basename(path)}: ")
+        try:
+            document = get_pdf_document(path)
+        except OSError as e:
+            doc_status.warning(f"문서를 열 수 없어 건너뜁니다 ({e})")
+            continue
+        if document.sha256 != sha256:
+            # 색인 이후 파일이 바뀌면 페이지 번호가 맞지 않을 수 있음
+            doc_status.warning("색인 이후 파일이 변경되었습니다. 다시 색인하세요.")
+            continue
+        batches = split_pdf_for_batch_analysis(document, pages=pages, text_first=text_first)
+        found_pages, page_info = find_relevant_pages_with_gemini(
+            question,
+            pdf_bytes=document,
+            status_placeholder=doc_status,
+            max_concurrency=max_concurrency,
+            refined_prompt=refined_prompt,
+            batches=batches,
+            on_partial=lambda done, total, path=path: partial.append(path),
+        )
+        doc_rows = build_table_rows(found_pages, page_info)
+        if validate and doc_rows:
+            doc_rows = validate_answers_with_prompt(doc_rows, refined_prompt, doc_status, document=document)
+        rows.extend({'문서': path, **row} for row in doc_rows)
+
+    summary = generate_final_summary(rows, refined_prompt, status) if summarize and rows else None
+    return {
+        'question': question,
+        'refined_question': refined_prompt,
+        'candidate_count': len(hits),
+        'documents': sorted({row['문서'] for row in rows}),
+        'rows': rows,
+        'summary': summary,
+        'partial': bool(partial),
+    }
@@ -0,0 +1,103 @@
+# search_service.py - 로컬 텍스트 기반 페이지 사전 필터 (BM25)
+
+import math, re
+from collections import Counter
+from services.pdf_service import as_pdf_document
+from utils import tracing
+
+# 사전 필터 기본값
+PREFILTER_TOP_K = 30
+# 상위 점수 대비 이 비율 이상이면 top_k 밖이어도 포함
+PREFILTER_MIN_SCORE_RATIO = 0.35
+# 선택된 페이지 앞뒤로 함께 포함할 페이지 수 (내용이 페이지를 넘어가는 경우 대비)
+PREFILTER_NEIGHBOR_WINDOW = 1
+# 이보다 텍스트가 적은 페이지는 스캔/이미지 페이지로 보고 항상 포함
+PREFILTER_MIN_TEXT_CHARS = 50
+
+_WORD_PATTERN = re.compile(r"[0-9A-Za-z가-힣]+")
+_HANGUL_PATTERN = re.compile(r"[가-힣]")
+
+def tokenize(text):
+    """단어 토큰 + 한글 단어의 글자 바이그램 (조사가 붙은 형태도 매칭되도록)"""
+    tokens = []
+    for word in _WORD_PATTERN.findall((text or "").lower()):
+        tokens.append(word)
+        if len(word) > 2 and _HANGUL_PATTERN.search(word):
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+class BM25Index:
+    """페이지 텍스트에 대한 메모리 내 BM25 색인"""
+
+    def __init__(self, documents_tokens, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(tokens) for tokens in documents_tokens]
+        self.lengths = [len(tokens) for tokens in documents_tokens]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0
+        doc_freqs = Counter()
+        for term_freq in self.term_freqs:
+            doc_freqs.update(term_freq.keys())
+        n_docs = len(self.term_freqs)
+        self.idf = {
+            term: math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for term, df in doc_freqs.items()
+        }
+
+    def score(self, query_tokens):
+        """질의 토큰에 대한 문서별 BM25 점수 목록"""
+        query_terms = [term for term in dict.fromkeys(query_tokens) if term in self.idf]
+        scores = []
+        for term_freq, length in zip(self.term_freqs, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_length) if self.avg_length else self.k1
+            total = 0.0
+            for term in query_terms:
+                freq = term_freq.get(term)
+                if freq:
+                    total += self.idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            scores.append(total)
+        return scores
+
+@tracing.traced("prefilter_pages")
+def prefilter_pages(pdf_bytes, query, top_k=PREFILTER_TOP_K, min_score_ratio=PREFILTER_MIN_SCORE_RATIO,
+                    neighbor_window=PREFILTER_NEIGHBOR_WINDOW, min_text_chars=PREFILTER_MIN_TEXT_CHARS):
+    """질문과 관련 있을 가능성이 높은 페이지만 선택
+
+    top_k/min_score_ratio/neighbor_window가 클수록 재현율(놓치는 페이지 방지)이 높아집니다.
+    (선택된 페이지 목록, 보고서 dict)를 반환합니다.
+    """
+    document = as_pdf_document(pdf_bytes)
+    page_nums = list(range(1, document.page_count + 1))
+    texts = [document.page_text(page_num) for page_num in page_nums]
+
+    # 텍스트를 추출할 수 없는 페이지는 판단할 수 없으므로 항상 분석
+    untextable = {page_num for page_num, text in zip(page_nums, texts) if len(text.strip()) < min_text_chars}
+
+    index = BM25Index([tokenize(text) for text in texts])
+    scores = index.score(tokenize(query))
+    best = max(scores) if scores else 0
+
+    selected = set(untextable)
+    if best > 0:
+        ranked = sorted(zip(page_nums, scores), key=lambda item: item[1], reverse=True)
+        for rank, (page_num, score) in enumerate(ranked):
+            if score <= 0:
+                break
+            if rank < top_k or score >= best * min_score_ratio:
+                selected.add(page_num)
+        for page_num in list(selected - untextable):
+            for offset in range(-neighbor_window, neighbor_window + 1):
+                if 1 <= page_num + offset <= document.page_count:
+                    selected.add(page_num + offset)
+    else:
+        # 질문과 겹치는 단어가 전혀 없으면 필터링하지 않음 (재현율 우선)
+        selected = set(page_nums)
+
+    selected_pages = sorted(selected)
+    report = {
+        'total_pages': document.page_count,
+        'selected_pages': len(selected_pages),
+        'skipped_pages': document.page_count - len(selected_pages),
+        'untextable_pages': len(untextable),
+    }
+    return selected_pages, report
@@ -0,0 +1,167 @@
+# upload_service.py - Gemini 업로드 파일 재사용 레지스트리
+
+import os, sqlite3, threading, time
+from contextlib import contextmanager
+from services.cache_service import STATE_DIR, sha256_bytes
+from services.model_service import get_model_backend
+from utils import tracing
+
+# Gemini Files API 파일은 48시간 후 만료되므로 여유를 두고 재사용 기간 설정
+UPLOAD_TTL_SECONDS = int(os.getenv("GEMINI_UPLOAD_TTL", str(47 * 3600)))
+# 여러 프로세스(CLI 작업자, Streamlit 세션)가 함께 쓰므로 SQLite로 기록 (캐시 정리 대상 아님)
+UPLOAD_REGISTRY_PATH = os.path.join(STATE_DIR, "uploads.sqlite3")
+# 만료 파일 정리 주기
+UPLOAD_SWEEP_INTERVAL_SECONDS = 600
+
+class UploadRegistry:
+    """배치 내용 해시 기준으로 업로드된 원격 파일을 재사용하는 레지스트리
+
+    client에는 upload_file/get_file/delete_file을 제공하는 객체를 전달하며, 생략하면
+    호출 시점의 모델 백엔드(get_model_backend)를 사용합니다. 기록은 SQLite에 행 단위로
+    저장하므로 여러 프로세스가 같은 레지스트리를 써도 서로의 기록을 덮어쓰지 않습니다.
+    """
+
+    def __init__(self, client=None, path=UPLOAD_REGISTRY_PATH, ttl_seconds=UPLOAD_TTL_SECONDS, clock=time.time):
+        self.client = client
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        # 내용 해시별 업로드 진행 중 잠금 (같은 배치를 동시에 두 번 올리지 않도록)
+        self._key_locks = {}
+        # 이번 프로세스에서 얻은 파일 객체 (get_file 호출 생략용)
+        self._handles = {}
+        self._last_sweep = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS uploads (
+                    key TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+
+    @property
+    def backend(self):
+        return self.client or get_model_backend()
+
+    @contextmanager
+    def _connect(self):
+        # 호출마다 연결을 새로 열어 스레드/프로세스 간 공유 문제를 피함
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def upload_path(self, path):
+        """파일 경로의 내용으로 업로드 (같은 내용이 유효하게 남아 있으면 재사용)"""
+        with tracing.span("upload_file") as upload_span:
+            with open(path, "rb") as f:
+                key = sha256_bytes(f.read())
+            return self._get_or_upload(key, path, upload_span)
+
+    def _get_or_upload(self, key, path, upload_span=None):
+        self.sweep()
+        with self._key_lock(key):
+            handle = self._lookup(key)
+            if handle is not None:
+                if upload_span:
+                    upload_span.set(reused=True)
+                return handle
+
+            handle = self.backend.upload_file(path)
+            if upload_span:
+                upload_span.set(reused=False, upload_bytes=os.path.getsize(path))
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO uploads (key, name, expires_at) VALUES (?, ?, ?)",
+                    (key, handle.name, self.clock() + self.ttl_seconds),
+                )
+            with self._lock:
+                self._handles[key] = (handle.name, handle)
+            return handle
+
+    def _lookup(self, key):
+        """유효한 업로드가 있으면 파일 객체 반환"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT name, expires_at FROM uploads WHERE key=?", (key,)).fetchone()
+        if row is None or row[1] <= self.clock():
+            return None
+        name = row[0]
+        with self._lock:
+            cached = self._handles.get(key)
+        if cached is not None and cached[0] == name:
+            return cached[1]
+
+        # 다른 세션/프로세스에서 업로드된 파일은 원격에 남아 있는지 확인
+        try:
+            handle = self.backend.get_file(name)
+        except Exception:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM uploads WHERE key=? AND name=?", (key, name))
+            return None
+        with self._lock:
+            self._handles[key] = (name, handle)
+        return handle
+
+    def entries(self):
+        """등록된 업로드 {내용 해시: {'name', 'expires_at'}}"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT key, name, expires_at FROM uploads").fetchall()
+        return {key: {'name': name, 'expires_at': expires_at} for key, name, expires_at in rows}
+
+    def _pop_entries(self, where="", params=()):
+        """조건에 맞는 항목을 기록에서 지우고 원격 파일 이름 목록 반환"""
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT key, name FROM uploads {where}", params).fetchall()
+            conn.executemany("DELETE FROM uploads WHERE key=? AND name=?", rows)
+        with self._lock:
+            for key, _ in rows:
+                self._handles.pop(key, None)
+        return [name for _, name in rows]
+
+    def sweep(self, force=False):
+        """만료된 항목의 원격 파일 삭제"""
+        now = self.clock()
+        with self._lock:
+            if not force and now - self._last_sweep < UPLOAD_SWEEP_INTERVAL_SECONDS:
+                return
+            self._last_sweep = now
+        for name in self._pop_entries("WHERE expires_at <= ?", (now,)):
+            self._delete_remote(name)
+
+    def delete_all(self):
+        """등록된 모든 원격 파일 삭제 (삭제한 파일 수 반환)
+
+        다른 프로세스가 같은 파일로 분석 중일 수 있으므로 분석이 모두 끝난 뒤 호출해야 합니다.
+        """
+        names = self._pop_entries()
+        for name in names:
+            self._delete_remote(name)
+        return len(names)
+
+    def _delete_remote(self, name):
+        try:
+            self.backend.delete_file(name)
+        except Exception:
+            # 이미 만료되어 삭제된 파일일 수 있음
+            pass
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_upload_registry():
+    """프로세스 전역 업로드 레지스트리"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = UploadRegistry()
+        return _registry
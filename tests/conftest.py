@@ -0,0 +1,62 @@
+# conftest.py - 테스트 공통 설정 (캐시/작업 저장소를 임시 디렉터리로 격리하고 가짜 모델 백엔드 사용)
+
+import os, sys, tempfile
+import pytest
+
+# 서비스 모듈은 불러올 때 경로 설정을 읽으므로 테스트 모듈을 불러오기 전에 격리
+_TEST_CACHE_DIR = tempfile.mkdtemp(prefix="pdf_analyzer_test_")
+os.environ["PDF_ANALYZER_CACHE_DIR"] = _TEST_CACHE_DIR
+os.environ["PDF_ANALYZER_STATE_DIR"] = os.path.join(_TEST_CACHE_DIR, "state")
+os.environ["MODEL_BACKEND"] = "fake"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 느린 테스트(대용량 메모리 측정 등)는 RUN_SLOW_TESTS=1일 때만 실행
+RUN_SLOW_TESTS = os.getenv("RUN_SLOW_TESTS", "0") == "1"
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: 오래 걸리는 테스트 (RUN_SLOW_TESTS=1일 때만 실행)")
+
+def pytest_collection_modifyitems(config, items):
+    if RUN_SLOW_TESTS:
+        return
+    skip_slow = pytest.mark.skip(reason="RUN_SLOW_TESTS=1일 때만 실행")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip_slow)
+
+class FakeClock:
+    """sleep하면 시간만 앞으로 가는 가짜 시계"""
+
+    def __init__(self, now=0.0):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture(scope="session")
+def synthetic_pdf(tmp_path_factory):
+    """텍스트 줄이 채워진 30페이지 합성 PDF 경로"""
+    from benchmarks.run_benchmarks import make_synthetic_pdf
+
+    return make_synthetic_pdf(str(tmp_path_factory.mktemp("pdf") / "synthetic_30p.pdf"), 30)
+
+@pytest.fixture
+def fake_backend():
+    """지연 없는 가짜 백엔드를 프로세스 전역 모델 백엔드로 설정"""
+    from services.model_service import FakeBackend, get_model_backend, set_model_backend
+
+    previous = get_model_backend()
+    backend = FakeBackend()
+    set_model_backend(backend)
+    yield backend
+    set_model_backend(previous)
@@ -0,0 +1,21 @@
+# test_cli.py - 가짜 모델 백엔드로 명령줄 일괄 분석 전체 실행
+
+import json, shutil
+import cli
+
+def test_analyze_runs_with_fake_backend_without_api_key(synthetic_pdf, tmp_path, monkeypatch):
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    # .env의 키를 다시 읽지 않도록 함
+    monkeypatch.setattr(cli, "load_dotenv", lambda *args, **kwargs: None)
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    shutil.copy(synthetic_pdf, pdf_dir / "filing.pdf")
+    questions = tmp_path / "questions.txt"
+    questions.write_text("capital requirement (cli)\n", encoding="utf-8")
+    output = tmp_path / "results.jsonl"
+
+    assert cli.main(["analyze", str(pdf_dir), str(questions), "-o", str(output), "--workers", "1"]) == 0
+    records = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert len(records) == 1
+    assert records[0]['error'] is None
+    assert records[0]['page_count'] == 30
@@ -0,0 +1,113 @@
+# test_gemini_service.py - 동시 배치 분석의 결과 순서, 할당량 소진 시 취소, 실패 배치 재분할 (가짜 모델 백엔드)
+
+import threading, time
+import pytest
+from services.model_service import FakeBackend, FakeQuotaError, FakeTransientError, set_model_backend, get_model_backend
+
+class PageLatencyBackend(FakeBackend):
+    """배치 첫 페이지별로 지연/429를 주입하고 시작·완료 순서를 기록하는 가짜 백엔드"""
+
+    def __init__(self, delays=None, quota_pages=(), **options):
+        super().__init__(**options)
+        self.delays = delays or {}
+        self.quota_pages = set(quota_pages)
+        self.started = []
+        self.finished = []
+        self._order_lock = threading.Lock()
+
+    def generate_content(self, model_name, content, stream=False):
+        parts = content if isinstance(content, list) else [content]
+        pages = self._batch_pages("\n".join(part for part in parts if isinstance(part, str)))
+        first_page = pages[0] if pages else None
+        with self._order_lock:
+            self.started.append(first_page)
+        if first_page in self.quota_pages:
+            self._count('generate_content')
+            raise FakeQuotaError("429 Resource has been exhausted (check quota). Please retry in 0s")
+        time.sleep(self.delays.get(first_page, 0.0))
+        response = super().generate_content(model_name, content, stream=stream)
+        with self._order_lock:
+            self.finished.append(first_page)
+        return response
+
+@pytest.fixture
+def use_backend(monkeypatch):
+    import services.gemini_service as gemini_service
+
+    monkeypatch.setattr(gemini_service, "QUOTA_BASE_DELAY", 0)
+    previous = get_model_backend()
+
+    def install(backend):
+        set_model_backend(backend)
+        return backend
+
+    yield install
+    set_model_backend(previous)
+
+def test_out_of_order_batches_are_returned_in_page_order(synthetic_pdf, use_backend):
+    from services.gemini_service import find_relevant_pages_with_gemini
+
+    # 첫 배치가 가장 늦게 끝나도록 지연
+    backend = use_backend(PageLatencyBackend(delays={1: 1.0}, relevant_ratio=1.0))
+    question = "capital requirement (out of order)"
+    pages, page_info = find_relevant_pages_with_gemini(
+        question, pdf_bytes=synthetic_pdf, refined_prompt=question, max_concurrency=3,
+    )
+
+    assert backend.finished[-1] == 1
+    assert pages == list(range(1, 31))
+    assert list(page_info) == pages
+
+def test_quota_error_cancels_remaining_batches_and_returns_partial(tmp_path, use_backend):
+    from benchmarks.run_benchmarks import make_synthetic_pdf
+    from services.gemini_service import find_relevant_pages_with_gemini
+
+    pdf_path = make_synthetic_pdf(str(tmp_path / "synthetic_80p.pdf"), 80)
+    # 두 번째 배치가 429를 내는 동안 첫 배치는 아직 분석 중
+    backend = use_backend(PageLatencyBackend(delays={1: 0.3}, quota_pages={11}, relevant_ratio=1.0))
+    question = "capital requirement (quota mid-run)"
+    partial = []
+    pages, page_info = find_relevant_pages_with_gemini(
+        question, pdf_bytes=pdf_path, refined_prompt=question, max_concurrency=2,
+        on_partial=lambda done, total: partial.append((done, total)),
+    )
+
+    # 남은 배치는 시작되지 않고 이미 끝난 배치의 결과만 반환
+    assert not {41, 51, 61, 71} & set(backend.started)
+    assert partial and partial[0][1] == 8 and partial[0][0] < 8
+    assert pages == sorted(pages)
+    assert set(pages) <= {page for first in backend.finished for page in range(first, first + 10)}
+    assert set(page_info) == set(pages)
+
+class LargeBatchFailureBackend(FakeBackend):
+    """max_pages보다 큰 배치는 항상 실패하는 가짜 백엔드 (요청 크기 초과 흉내)"""
+
+    def __init__(self, max_pages, **options):
+        super().__init__(**options)
+        self.max_pages = max_pages
+        self.batch_sizes = []
+
+    def generate_content(self, model_name, content, stream=False):
+        parts = content if isinstance(content, list) else [content]
+        pages = self._batch_pages("\n".join(part for part in parts if isinstance(part, str))) or []
+        self.batch_sizes.append(len(pages))
+        if len(pages) > self.max_pages:
+            self._count('generate_content')
+            raise FakeTransientError("503 request too large (fake). Please retry in 0.001s")
+        return super().generate_content(model_name, content, stream=stream)
+
+def test_adaptive_strategy_resplits_failed_batches_in_same_run(synthetic_pdf, use_backend, monkeypatch):
+    import services.batch_service as batch_service
+    from services.gemini_service import find_relevant_pages_with_gemini
+
+    monkeypatch.setattr(batch_service, "_planner", batch_service.AdaptiveBatchPlanner(token_budget=batch_service.ADAPTIVE_MAX_TOKEN_BUDGET))
+    backend = use_backend(LargeBatchFailureBackend(max_pages=5, relevant_ratio=1.0))
+    question = "capital requirement (resplit)"
+    pages, page_info = find_relevant_pages_with_gemini(
+        question, pdf_bytes=synthetic_pdf, refined_prompt=question, batch_strategy="adaptive",
+    )
+
+    # 20 + 10페이지 배치가 실패한 뒤 10페이지, 5페이지로 나뉘어 모든 페이지를 분석
+    assert max(backend.batch_sizes) == 20
+    assert pages == list(range(1, 31))
+    assert list(page_info) == pages
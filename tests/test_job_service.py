@@ -0,0 +1,97 @@
+# test_job_service.py - 작업 저장소 재개/만료와 할당량 소진 시 부분 결과 (가짜 모델 백엔드)
+
+import os
+import pytest
+from services.cache_service import ResultCache
+from services.job_service import JobStore, JOB_DB_PATH
+from services.model_service import FakeBackend, FakeQuotaError, set_model_backend, get_model_backend
+
+class QuotaAfterBackend(FakeBackend):
+    """limit번 호출한 뒤에는 429만 돌려주는 가짜 백엔드"""
+
+    def __init__(self, limit, **options):
+        super().__init__(**options)
+        self.limit = limit
+
+    def generate_content(self, model_name, content, stream=False):
+        if self.limit is not None and self.call_counts().get('generate_content', 0) >= self.limit:
+            self._count('generate_content')
+            raise FakeQuotaError("429 Resource has been exhausted (check quota). Please retry in 0s")
+        return super().generate_content(model_name, content, stream=stream)
+
+@pytest.fixture
+def quota_backend(monkeypatch):
+    import services.gemini_service as gemini_service
+
+    monkeypatch.setattr(gemini_service, "QUOTA_BASE_DELAY", 0)
+    previous = get_model_backend()
+    backend = QuotaAfterBackend(limit=2, relevant_ratio=0.5)
+    set_model_backend(backend)
+    yield backend
+    set_model_backend(previous)
+
+def test_quota_exhaustion_returns_finished_batches_and_resumes(synthetic_pdf, quota_backend):
+    from services.gemini_service import find_relevant_pages_with_gemini
+
+    question = "capital requirement (quota)"
+    partial = []
+    pages, page_info = find_relevant_pages_with_gemini(
+        question, pdf_bytes=synthetic_pdf, refined_prompt=question, max_concurrency=1,
+        on_partial=lambda done, total: partial.append((done, total)),
+    )
+    assert partial == [(2, 3)]
+    assert pages and set(pages) <= set(range(1, 21))
+    assert set(page_info) == set(pages)
+
+    # 할당량이 돌아오면 남은 배치만 분석
+    quota_backend.limit = None
+    calls_before = quota_backend.call_counts()['generate_content']
+    resumed_pages, _ = find_relevant_pages_with_gemini(question, pdf_bytes=synthetic_pdf, refined_prompt=question)
+    assert quota_backend.call_counts()['generate_content'] == calls_before + 1
+    assert set(pages) <= set(resumed_pages)
+
+def test_completed_job_drops_batch_rows(tmp_path):
+    store = JobStore(path=str(tmp_path / "jobs.sqlite3"))
+    job_id = store.make_job_id("pdf", "질문", "model")
+    store.start_job(job_id, "pdf", "질문", "model")
+    store.record_batch(job_id, [1, 2], {'pages': [1], 'page_info': []})
+    assert store.get_job(job_id)['completed_batches'] == 1
+
+    store.finish_job(job_id, "completed")
+    assert store.completed_batches(job_id) == []
+    assert store.get_job(job_id)['status'] == "completed"
+
+def test_stale_jobs_expire(tmp_path):
+    store = JobStore(path=str(tmp_path / "jobs.sqlite3"), ttl_seconds=0)
+    job_id = store.make_job_id("pdf", "질문", "model")
+    store.start_job(job_id, "pdf", "질문", "model")
+    store.record_batch(job_id, [1], {'pages': [], 'page_info': []})
+    store.finish_job(job_id, "aborted")
+
+    assert store.expire() == 1
+    assert store.get_job(job_id) is None
+    assert store.completed_batches(job_id) == []
+
+@pytest.mark.parametrize("in_cache_dir", [False, True])
+def test_cache_eviction_keeps_job_store(tmp_path, in_cache_dir):
+    cache_dir = tmp_path / "cache"
+    db_path = cache_dir / "jobs.sqlite3" if in_cache_dir else cache_dir / "state" / "jobs.sqlite3"
+    store = JobStore(path=str(db_path))
+    cache = ResultCache(cache_dir=str(cache_dir), max_bytes=20000)
+    job_id = store.make_job_id("pdf", "질문", "model")
+    store.start_job(job_id, "pdf", "질문", "model")
+    store.record_batch(job_id, [1, 2], {'pages': [1], 'page_info': [[1, {'relevance': "상"}]]})
+
+    # 크기 한도를 넘겨 정리가 일어나도 캐시 항목만 삭제
+    for idx in range(10):
+        cache.set_bytes(f"page-{idx}", b"x" * 8000)
+    cache.clear()
+    assert db_path.exists()
+
+    store.start_job(job_id, "pdf", "질문", "model")
+    assert store.completed_batches(job_id) == [([1, 2], {'pages': [1], 'page_info': [[1, {'relevance': "상"}]]})]
+
+def test_default_job_store_is_outside_cache_entries():
+    from services.cache_service import CACHE_DIR
+
+    assert os.path.dirname(JOB_DB_PATH) != os.path.abspath(CACHE_DIR)
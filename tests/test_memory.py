@@ -0,0 +1,24 @@
+# test_memory.py - 대용량 PDF에서 저메모리 모드와 메모리 로드 방식의 최대 RSS 비교 (별도 프로세스에서 측정)
+
+import multiprocessing, os
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+from benchmarks.bench_memory import run_mode
+from benchmarks.run_benchmarks import make_synthetic_pdf
+
+# 페이지 수에 비례하는 메모리 차이가 잡음보다 커지도록 벤치마크와 같은 크기 사용
+MEMORY_TEST_PAGES = int(os.getenv("MEMORY_TEST_PAGES", "3000"))
+
+@pytest.mark.slow
+@pytest.mark.skipif(not os.path.exists("/proc/self/status"), reason="RSS 측정에 /proc 필요")
+def test_low_memory_mode_peak_rss_is_below_in_memory(tmp_path):
+    pdf_path = make_synthetic_pdf(str(tmp_path / f"synthetic_{MEMORY_TEST_PAGES}p.pdf"), MEMORY_TEST_PAGES)
+
+    results = {}
+    for mode in ("in_memory", "low_memory"):
+        # 테스트 프로세스와 다른 모드의 메모리가 섞이지 않도록 모드마다 새 프로세스에서 실행
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            results[mode] = executor.submit(run_mode, mode, pdf_path, str(tmp_path / mode)).result()
+
+    assert results['low_memory']['pages'] == MEMORY_TEST_PAGES
+    assert results['low_memory']['peak_rss_mb'] < results['in_memory']['peak_rss_mb']
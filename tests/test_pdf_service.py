@@ -0,0 +1,61 @@
+# test_pdf_service.py - 디스크 기반 문서의 mmap 해제와 spool 파일 정리
+
+import io, os, time
+from services.pdf_service import (PdfDocument, get_pdf_document, release_pdf_document, _documents, spool_pdf_upload,
+                                  release_spool_file, SPOOL_TTL_SECONDS)
+
+def test_close_releases_mmap_and_reopens_on_use(synthetic_pdf):
+    document = PdfDocument.from_path(synthetic_pdf)
+    text = document.page_text(3)
+    assert document.is_disk_backed
+
+    document.close()
+    assert document._mmap is None and document._file is None
+    # 닫은 뒤 다시 사용하면 파일을 다시 엶
+    assert document.page_text(3) == text
+    assert document.page_count == 30
+    document.close()
+
+def test_context_manager_closes_document(synthetic_pdf):
+    with PdfDocument.from_path(synthetic_pdf) as document:
+        document.page_size(1)
+    assert document._mmap is None
+
+def test_release_drops_cached_document(synthetic_pdf):
+    document = get_pdf_document(synthetic_pdf)
+    assert document in _documents.values()
+
+    release_pdf_document(synthetic_pdf)
+    assert document not in _documents.values()
+    assert document._mmap is None
+    assert get_pdf_document(synthetic_pdf) is not document
+
+def test_evicted_documents_are_closed(synthetic_pdf, monkeypatch):
+    import services.pdf_service as pdf_service
+
+    monkeypatch.setattr(pdf_service, "PDF_DOCUMENT_CACHE_SIZE", 1)
+    document = get_pdf_document(synthetic_pdf)
+    with open(synthetic_pdf, "rb") as f:
+        # 다른 문서가 캐시에 들어오면 밀려난 문서의 mmap을 해제
+        get_pdf_document(f.read())
+    assert document._mmap is None
+
+def test_spool_cleanup_skips_files_in_use(tmp_path):
+    directory = str(tmp_path / "spool")
+    active = spool_pdf_upload(io.BytesIO(b"%PDF-active"), directory=directory)
+    stale = os.path.join(directory, "stale.pdf")
+    with open(stale, "wb") as f:
+        f.write(b"%PDF-stale")
+    # 두 파일 모두 TTL보다 오래된 것으로 만듦
+    old = time.time() - SPOOL_TTL_SECONDS - 60
+    for path in (active, stale):
+        os.utime(path, (old, old))
+
+    fresh = spool_pdf_upload(io.BytesIO(b"%PDF-fresh"), directory=directory)
+
+    # 다른 세션이 사용 중인 파일은 남고 주인 없는 오래된 파일만 삭제됨
+    assert os.path.exists(active)
+    assert not os.path.exists(stale)
+    release_spool_file(active)
+    release_spool_file(fresh)
+    assert os.listdir(directory) == []
@@ -0,0 +1,33 @@
+# test_pipeline_service.py - 같은 입력으로 다시 실행할 때 모델 호출 재사용 (가짜 모델 백엔드)
+
+from services.gemini_service import get_model_call_count, validate_answers_with_prompt, generate_final_summary
+from services.pipeline_service import analyze_question
+
+def test_rerun_with_same_inputs_makes_no_model_calls(synthetic_pdf, fake_backend):
+    question = "capital requirement (rerun)"
+    first = analyze_question(synthetic_pdf, question)
+    calls_after_first = get_model_call_count()
+    backend_calls = fake_backend.call_counts()
+    assert first['rows'] and backend_calls.get('generate_content')
+
+    second = analyze_question(synthetic_pdf, question)
+    assert get_model_call_count() == calls_after_first
+    assert fake_backend.call_counts() == backend_calls
+    assert second['rows'] == first['rows']
+    assert second['summary'] == first['summary']
+
+def test_validation_and_summary_are_reused(fake_backend):
+    rows = [
+        {'페이지': 3, '답변': "요구자본은 보유 위험을 반영한 자본입니다.", '관련도': "상"},
+        {'페이지': 7, '답변': "지급여력비율은 가용자본을 요구자본으로 나눈 값입니다.", '관련도': "중"},
+    ]
+    prompt = "요구자본의 정의 (rerun)"
+    validated = validate_answers_with_prompt(rows, prompt)
+    summary = generate_final_summary(validated, prompt)
+    calls = get_model_call_count()
+    assert calls > 0
+
+    # 화면 재실행처럼 같은 입력으로 다시 호출하면 캐시를 사용
+    assert validate_answers_with_prompt(rows, prompt) == validated
+    assert generate_final_summary(validated, prompt) == summary
+    assert get_model_call_count() == calls
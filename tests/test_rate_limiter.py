@@ -0,0 +1,126 @@
+# test_rate_limiter.py - 속도 제한기/재시도 스케줄러 (가짜 시계)
+
+import random
+import pytest
+from utils.rate_limiter import TokenBucket, RateLimiter, RetryMetrics, get_retry_metrics
+
+def test_token_bucket_refills_up_to_capacity(clock):
+    bucket = TokenBucket(rate_per_second=2.0, capacity=4, clock=clock)
+
+    bucket.consume(4)
+    assert bucket.wait_time(1) == pytest.approx(0.5)
+
+    clock.now += 1.0
+    assert bucket.wait_time(2) == 0.0
+    assert bucket.wait_time(3) == pytest.approx(0.5)
+
+    # 오래 쉬어도 capacity 이상은 쌓이지 않음
+    clock.now += 60.0
+    bucket.wait_time(0)
+    assert bucket.tokens == 4
+
+def test_rate_limiter_waits_for_request_refill(clock):
+    metrics = RetryMetrics()
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=1_000_000, clock=clock, sleep=clock.sleep, metrics=metrics)
+
+    for _ in range(60):
+        assert limiter.acquire() == 0.0
+    # 분당 60건을 다 쓰면 다음 요청은 1초 뒤에 가능
+    assert limiter.acquire() == pytest.approx(1.0)
+    assert clock.now == pytest.approx(1.0)
+    assert metrics.snapshot()['wait_seconds'] == pytest.approx(1.0)
+
+def test_rate_limiter_waits_for_token_budget(clock):
+    limiter = RateLimiter(requests_per_minute=1000, tokens_per_minute=600, clock=clock, sleep=clock.sleep, metrics=RetryMetrics())
+
+    assert limiter.acquire(600) == 0.0
+    # 초당 10토큰씩 채워지므로 100토큰은 10초 대기
+    assert limiter.acquire(100) == pytest.approx(10.0)
+
+def test_pause_blocks_every_caller(clock):
+    limiter = RateLimiter(clock=clock, sleep=clock.sleep, metrics=RetryMetrics())
+
+    limiter.pause(5.0)
+    # 더 짧은 pause는 기존 대기 시각을 줄이지 않음
+    limiter.pause(1.0)
+    assert limiter.acquire() == pytest.approx(5.0)
+    assert limiter.acquire() == 0.0
+
+class ScriptedModel:
+    """errors를 차례로 발생시킨 뒤 text를 응답하는 모델"""
+
+    def __init__(self, errors, text="ok"):
+        self.errors = list(errors)
+        self.text = text
+        self.calls = 0
+
+    def generate_content(self, content, **options):
+        from services.model_service import FakeResponse
+
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return FakeResponse(self.text)
+
+def make_limiter(clock):
+    return RateLimiter(clock=clock, sleep=clock.sleep, metrics=RetryMetrics())
+
+def test_quota_error_pauses_limiter_and_retries(clock):
+    from services.gemini_service import call_gemini_with_retry
+    from services.model_service import FakeQuotaError
+
+    limiter = make_limiter(clock)
+    model = ScriptedModel([FakeQuotaError("429 Resource has been exhausted (check quota). Please retry in 7s")])
+    get_retry_metrics().reset()
+
+    assert call_gemini_with_retry(model, "prompt", limiter=limiter, rng=random.Random(0)) == "ok"
+    assert model.calls == 2
+    # 429의 재시도 힌트만큼 모든 호출자가 멈춤
+    assert limiter.paused_until == pytest.approx(7.0)
+    assert clock.now == pytest.approx(7.0)
+
+    metrics = get_retry_metrics().snapshot()
+    assert metrics['calls'] == 2
+    assert metrics['retries'] == 1
+    assert metrics['throttles'] == 1
+    assert metrics['backoff_seconds'] == pytest.approx(7.0)
+
+def test_quota_backoff_without_hint_is_jittered_exponential(clock):
+    from services.gemini_service import call_gemini_with_retry, QUOTA_BASE_DELAY
+    from services.model_service import FakeQuotaError
+
+    model = ScriptedModel([FakeQuotaError("429 quota exceeded"), FakeQuotaError("429 quota exceeded")])
+    get_retry_metrics().reset()
+
+    call_gemini_with_retry(model, "prompt", limiter=make_limiter(clock), rng=random.Random(0))
+    first, second = clock.sleeps
+    assert QUOTA_BASE_DELAY / 2 <= first <= QUOTA_BASE_DELAY
+    assert QUOTA_BASE_DELAY <= second <= QUOTA_BASE_DELAY * 2
+    assert get_retry_metrics().snapshot()['throttles'] == 2
+
+def test_quota_exhausted_after_last_attempt(clock):
+    from services.gemini_service import call_gemini_with_retry, QuotaExhaustedError
+    from services.model_service import FakeQuotaError
+
+    model = ScriptedModel([FakeQuotaError("429 quota exceeded. Please retry in 1s")] * 3)
+    get_retry_metrics().reset()
+
+    with pytest.raises(QuotaExhaustedError):
+        call_gemini_with_retry(model, "prompt", max_retries=3, limiter=make_limiter(clock), rng=random.Random(0))
+    metrics = get_retry_metrics().snapshot()
+    assert metrics['calls'] == 3
+    assert metrics['throttles'] == 3
+    # 마지막 시도 후에는 재시도하지 않음
+    assert metrics['retries'] == 2
+
+def test_transient_error_uses_base_backoff(clock):
+    from services.gemini_service import call_gemini_with_retry
+    from services.model_service import FakeTransientError
+
+    model = ScriptedModel([FakeTransientError("503 The service is currently unavailable (fake)")])
+    get_retry_metrics().reset()
+
+    assert call_gemini_with_retry(model, "prompt", base_delay=2, limiter=make_limiter(clock), rng=random.Random(0)) == "ok"
+    assert 1.0 <= clock.sleeps[0] <= 2.0
+    metrics = get_retry_metrics().snapshot()
+    assert metrics['retries'] == 1 and metrics['throttles'] == 0
@@ -0,0 +1,122 @@
+# test_upload_service.py - 업로드 파일 재사용 레지스트리 (가짜 모델 백엔드)
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+from services.model_service import FakeBackend
+from services.upload_service import UploadRegistry, UPLOAD_SWEEP_INTERVAL_SECONDS
+
+@pytest.fixture
+def backend():
+    return FakeBackend()
+
+@pytest.fixture
+def batch_file(tmp_path):
+    path = tmp_path / "batch.pdf"
+    path.write_bytes(b"%PDF-1.4 fake batch")
+    return str(path)
+
+def make_registry(backend, tmp_path, clock, ttl_seconds=100):
+    return UploadRegistry(client=backend, path=str(tmp_path / "uploads.sqlite3"), ttl_seconds=ttl_seconds, clock=clock)
+
+def test_same_content_is_uploaded_once(backend, batch_file, tmp_path, clock):
+    registry = make_registry(backend, tmp_path, clock)
+
+    first = registry.upload_path(batch_file)
+    second = registry.upload_path(batch_file)
+    assert second is first
+    assert backend.call_counts().get('upload_file') == 1
+
+def test_other_process_reuses_registered_file(backend, batch_file, tmp_path, clock):
+    make_registry(backend, tmp_path, clock).upload_path(batch_file)
+
+    # 레지스트리 파일을 공유하는 새 인스턴스는 원격 파일 존재만 확인하고 재사용
+    handle = make_registry(backend, tmp_path, clock).upload_path(batch_file)
+    counts = backend.call_counts()
+    assert counts.get('upload_file') == 1
+    assert counts.get('get_file') == 1
+    assert handle.path == batch_file
+
+def test_missing_remote_file_is_uploaded_again(backend, batch_file, tmp_path, clock):
+    handle = make_registry(backend, tmp_path, clock).upload_path(batch_file)
+    backend.delete_file(handle.name)
+
+    make_registry(backend, tmp_path, clock).upload_path(batch_file)
+    assert backend.call_counts().get('upload_file') == 2
+
+def test_expired_upload_is_uploaded_again(backend, batch_file, tmp_path, clock):
+    registry = make_registry(backend, tmp_path, clock, ttl_seconds=100)
+    registry.upload_path(batch_file)
+
+    clock.now += 99
+    registry.upload_path(batch_file)
+    assert backend.call_counts().get('upload_file') == 1
+
+    clock.now += 1
+    registry.upload_path(batch_file)
+    assert backend.call_counts().get('upload_file') == 2
+
+def test_sweep_deletes_expired_remote_files(backend, batch_file, tmp_path, clock):
+    registry = make_registry(backend, tmp_path, clock, ttl_seconds=100)
+    handle = registry.upload_path(batch_file)
+
+    clock.now += 100
+    registry.sweep(force=True)
+    assert backend.call_counts().get('delete_file') == 1
+    with pytest.raises(Exception):
+        backend.get_file(handle.name)
+    assert registry.entries() == {}
+
+def test_sweep_keeps_live_files_and_respects_interval(backend, batch_file, tmp_path, clock):
+    ttl_seconds = UPLOAD_SWEEP_INTERVAL_SECONDS * 2
+    registry = make_registry(backend, tmp_path, clock, ttl_seconds=ttl_seconds)
+    registry.upload_path(batch_file)
+
+    # 아직 유효한 파일은 삭제하지 않음
+    clock.now += ttl_seconds - 10
+    registry.sweep(force=True)
+    assert backend.call_counts().get('delete_file') is None
+
+    # 만료되었어도 정리 주기가 지나기 전에는 강제하지 않으면 건너뜀
+    clock.now += 10
+    registry.sweep()
+    assert backend.call_counts().get('delete_file') is None
+
+    clock.now += UPLOAD_SWEEP_INTERVAL_SECONDS
+    registry.sweep()
+    assert backend.call_counts().get('delete_file') == 1
+
+def test_delete_all_removes_every_remote_file(backend, tmp_path, clock):
+    registry = make_registry(backend, tmp_path, clock)
+    handles = []
+    for idx in range(3):
+        path = tmp_path / f"batch_{idx}.pdf"
+        path.write_bytes(f"%PDF-1.4 batch {idx}".encode())
+        handles.append(registry.upload_path(str(path)))
+
+    assert registry.delete_all() == 3
+    assert backend.call_counts().get('delete_file') == 3
+    assert registry.entries() == {}
+    for handle in handles:
+        with pytest.raises(Exception):
+            backend.get_file(handle.name)
+
+def upload_in_process(registry_path, batch_path):
+    """별도 프로세스에서 레지스트리로 업로드하고 파일 이름 반환"""
+    from services.model_service import FakeBackend
+
+    return UploadRegistry(client=FakeBackend(), path=registry_path).upload_path(batch_path).name
+
+def test_processes_do_not_overwrite_each_others_records(tmp_path):
+    registry_path = str(tmp_path / "uploads.sqlite3")
+    batch_paths = []
+    for idx in range(4):
+        path = tmp_path / f"batch_{idx}.pdf"
+        path.write_bytes(f"%PDF-1.4 batch {idx}".encode())
+        batch_paths.append(str(path))
+
+    with ProcessPoolExecutor(max_workers=4, mp_context=multiprocessing.get_context("spawn")) as executor:
+        names = list(executor.map(upload_in_process, [registry_path] * 4, batch_paths))
+
+    entries = UploadRegistry(client=FakeBackend(), path=registry_path).entries()
+    assert sorted(entry['name'] for entry in entries.values()) == sorted(names)
@@ -0,0 +1,94 @@
+# json_stream.py - 스트리밍 응답에서 JSON 배열 항목을 완성되는 대로 꺼내는 증분 파서
+
+import json, re
+
+class JsonArrayItemParser:
+    """start_pattern 뒤에 오는 JSON 배열의 객체 항목을 하나씩 완성되는 대로 반환
+
+    start_pattern은 배열을 여는 '['까지 일치해야 합니다 (예: r'"pages"\\s*:\\s*\\[').
+    응답이 중간에 끊겨도 그때까지 완성된 항목은 그대로 얻을 수 있습니다.
+    """
+
+    def __init__(self, start_pattern):
+        self.start_pattern = re.compile(start_pattern)
+        self.buffer = ""
+        self.items = []
+        self.finished = False
+        self._pos = None
+        self._depth = 0
+        self._item_start = None
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def started(self):
+        """배열 시작 위치를 찾았는지 여부"""
+        return self._pos is not None
+
+    def feed(self, text):
+        """텍스트 조각을 추가하고 새로 완성된 항목 목록 반환"""
+        if self.finished or not text:
+            return []
+        self.buffer += text
+        if self._pos is None:
+            match = self.start_pattern.search(self.buffer)
+            if match is None:
+                return []
+            self._pos = match.end()
+
+        new_items = []
+        buffer = self.buffer
+        pos = self._pos
+        while pos < len(buffer):
+            ch = buffer[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if self._depth == 0:
+                    self._item_start = pos
+                self._depth += 1
+            elif ch in "}]":
+                if self._depth == 0:
+                    # 배열이 닫힘
+                    self.finished = True
+                    pos += 1
+                    break
+                self._depth -= 1
+                if self._depth == 0 and self._item_start is not None:
+                    item = self._decode(buffer[self._item_start:pos + 1])
+                    if item is not None:
+                        new_items.append(item)
+                    self._item_start = None
+            pos += 1
+        self._pos = pos
+        self.items.extend(new_items)
+        return new_items
+
+    @staticmethod
+    def _decode(fragment):
+        try:
+            item = json.loads(fragment)
+        except json.JSONDecodeError:
+            return None
+        return item if isinstance(item, dict) else None
+
+def parse_array_items(text, start_pattern):
+    """완성된 응답 또는 중간에 끊긴 응답에서 배열 항목 목록 (배열을 찾지 못하면 None)"""
+    parser = JsonArrayItemParser(start_pattern)
+    parser.feed(text or "")
+    if not parser.started:
+        return None
+    return parser.items
+
+def pages_array_pattern(question_id=None):
+    """pages 배열 시작 패턴 (question_id를 주면 다중 질문 응답의 해당 질문 pages 배열)"""
+    if question_id is None:
+        return r'"pages"\s*:\s*\['
+    return rf'"{re.escape(question_id)}"\s*:\s*\{{\s*"pages"\s*:\s*\['
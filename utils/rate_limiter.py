@@ -0,0 +1,124 @@
+# rate_limiter.py - 프로세스 전역 API 호출 속도 제한 및 재시도 지표
+
+import os, random, threading, time
+
+# Gemini API 한도 (환경변수로 변경 가능)
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_RPM", "1000"))
+GEMINI_TOKENS_PER_MINUTE = float(os.getenv("GEMINI_TPM", "1000000"))
+
+class TokenBucket:
+    """초당 rate만큼 채워지고 최대 capacity까지 쌓이는 토큰 버킷"""
+
+    def __init__(self, rate_per_second, capacity, clock=time.monotonic):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """amount를 꺼내기 위해 기다려야 하는 시간 (초)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+class RateLimiter:
+    """분당 요청 수/토큰 수 버킷을 함께 확인하는 속도 제한기
+
+    clock/sleep을 주입할 수 있어 가짜 시계로 테스트할 수 있습니다.
+    """
+
+    def __init__(self, requests_per_minute=GEMINI_REQUESTS_PER_MINUTE, tokens_per_minute=GEMINI_TOKENS_PER_MINUTE,
+                 clock=time.monotonic, sleep=time.sleep, metrics=None):
+        self.clock = clock
+        self.sleep = sleep
+        self.metrics = metrics
+        self.requests = TokenBucket(requests_per_minute / 60.0, requests_per_minute, clock)
+        self.tokens = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute, clock)
+        # 429 응답 후 모든 호출자가 함께 쉬어야 하는 시각
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=0):
+        """요청 1건과 tokens개를 사용할 수 있을 때까지 대기하고, 대기한 시간(초)을 반환"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                wait = max(
+                    self.paused_until - self.clock(),
+                    self.requests.wait_time(1),
+                    self.tokens.wait_time(tokens),
+                )
+                if wait <= 0:
+                    self.requests.consume(1)
+                    self.tokens.consume(tokens)
+                    (self.metrics or get_retry_metrics()).add(wait_seconds=waited)
+                    return waited
+            self.sleep(wait)
+            waited += wait
+
+    def pause(self, seconds):
+        """할당량 초과 시 모든 호출자를 seconds 동안 멈춤 (공유 백오프)"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, self.clock() + seconds)
+
+def backoff_delay(attempt, base_delay, max_delay, rng=random):
+    """지터가 적용된 지수 백오프 시간 (attempt는 0부터)"""
+    ceiling = min(max_delay, base_delay * (2 ** attempt))
+    # 상한의 절반은 보장하고 나머지는 무작위로 분산 (동시 재시도 몰림 방지)
+    return ceiling / 2 + rng.uniform(0, ceiling / 2)
+
+class RetryMetrics:
+    """재시도/스로틀/대기 시간 누적 지표"""
+
+    FIELDS = ('calls', 'retries', 'throttles', 'wait_seconds', 'backoff_seconds')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._values = {field: 0 for field in self.FIELDS}
+
+    def add(self, **values):
+        with self._lock:
+            for field, value in values.items():
+                self._values[field] += value
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+_retry_metrics = RetryMetrics()
+
+def get_rate_limiter():
+    """프로세스 전역 속도 제한기 (모든 세션이 같은 API 키 한도를 공유)"""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter()
+        return _rate_limiter
+
+def set_rate_limiter(limiter):
+    """프로세스 전역 속도 제한기 교체 (여러 프로세스가 한도를 나눠 쓸 때 사용)"""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        _rate_limiter = limiter
+
+def get_retry_metrics():
+    """프로세스 전역 재시도 지표"""
+    return _retry_metrics
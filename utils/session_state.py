@@ -8,7 +8,7 @@ def init_session_state():
         st.session_state.page_info = {}
     if 'user_prompt' not in st.session_state:
         st.session_state.user_prompt = ""
-    if 'original_pdf_bytes' not in st.session_state:
-        st.session_state.original_pdf_bytes = None
-    if 'pdf_images' not in st.session_state:
-        st.session_state.pdf_images = []
\ No newline at end of file
+    if 'original_pdf_source' not in st.session_state:
+        st.session_state.original_pdf_source = None
+    if 'pdf_hash' not in st.session_state:
+        st.session_state.pdf_hash = None
\ No newline at end of file
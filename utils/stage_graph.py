@@ -0,0 +1,77 @@
+# stage_graph.py - 의존 관계 기반 단계 병렬 실행기
+
+import threading, time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from utils import tracing
+
+class StageGraph:
+    """의존하는 단계가 끝나는 대로 각 단계를 실행하고 단계별 소요 시간을 기록
+
+    각 단계 함수는 의존 단계들의 결과를 deps 순서대로 인자로 받습니다.
+    Streamlit 요소를 다뤄야 하는 단계는 graph.timed(name)으로 메인 스레드에서 실행합니다.
+    """
+
+    def __init__(self):
+        self._stages = []
+        self._futures = {}
+        self._executor = None
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self.timings = {}
+
+    def add(self, name, fn, deps=()):
+        """단계 추가 (의존 단계는 먼저 추가되어 있어야 함)"""
+        known = {stage[0] for stage in self._stages}
+        missing = [dep for dep in deps if dep not in known]
+        if missing:
+            raise ValueError(f"정의되지 않은 의존 단계: {missing}")
+        self._stages.append((name, fn, tuple(deps)))
+        return self
+
+    def start(self):
+        """모든 단계를 시작 (의존 단계가 끝날 때까지 각 단계는 대기)"""
+        # 단계마다 스레드 하나씩 배정하므로 대기 중인 단계가 다른 단계를 막지 않음
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(self._stages)), thread_name_prefix="stage")
+        for name, fn, deps in self._stages:
+            dep_futures = [self._futures[dep] for dep in deps]
+            # 각 단계의 span이 시작한 쪽의 추적에 이어지도록 문맥을 함께 전달
+            self._futures[name] = self._executor.submit(tracing.bind_context(self._run_stage), name, fn, dep_futures)
+        return self
+
+    def _run_stage(self, name, fn, dep_futures):
+        # 의존 단계가 실패하면 같은 예외로 실패
+        args = [future.result() for future in dep_futures]
+        with self.timed(name), tracing.span(f"stage:{name}"):
+            return fn(*args)
+
+    def result(self, name, timeout=None):
+        """단계 결과 (끝날 때까지 대기)"""
+        return self._futures[name].result(timeout=timeout)
+
+    @contextmanager
+    def timed(self, name):
+        """블록 실행 시간을 name 단계의 소요 시간으로 기록"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.timings[name] = {
+                    'start': start - self._origin,
+                    'end': end - self._origin,
+                    'seconds': end - start,
+                }
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+    def timing_rows(self):
+        """시작 순서대로 정렬한 단계별 소요 시간 목록"""
+        with self._lock:
+            return [
+                {'단계': name, '시작(초)': round(t['start'], 2), '종료(초)': round(t['end'], 2), '소요(초)': round(t['seconds'], 2)}
+                for name, t in sorted(self.timings.items(), key=lambda item: item[1]['start'])
+            ]
@@ -0,0 +1,199 @@
+# tracing.py - 단계별 실행 시간/비용 추적 (경량 span, JSON 및 OTLP JSON 내보내기)
+
+import contextvars, functools, os, threading, time, uuid
+from collections import deque
+from contextlib import contextmanager
+
+# 추적 사용 여부와 보관할 최대 span 수 (오래된 span부터 버림)
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") != "0"
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "20000"))
+TRACE_SERVICE_NAME = "pdf-analyzer"
+
+# 합계를 내는 수치 속성 (요약 표시용)
+SUMMED_ATTRIBUTES = (
+    'prompt_tokens', 'output_tokens', 'total_tokens', 'cost_usd', 'retries', 'backoff_seconds',
+    'rate_limit_wait_seconds', 'cache_hits', 'cache_misses', 'upload_bytes', 'text_bytes',
+    'recovered_responses',
+)
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    """이름, 시작/종료 시각, 속성을 가진 추적 단위 (부모 span과 trace_id를 공유)"""
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self._lock = threading.Lock()
+
+    @property
+    def seconds(self):
+        end_ns = self.end_ns or time.time_ns()
+        return (end_ns - self.start_ns) / 1e9
+
+    def set(self, **attributes):
+        with self._lock:
+            self.attributes.update(attributes)
+
+    def add(self, key, amount=1):
+        with self._lock:
+            self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def to_dict(self):
+        with self._lock:
+            attributes = dict(self.attributes)
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'seconds': round(self.seconds, 6),
+            'attributes': attributes,
+            'error': self.error,
+        }
+
+class Tracer:
+    """종료된 span을 보관하는 프로세스 전역 수집기"""
+
+    def __init__(self, max_spans=TRACE_MAX_SPANS):
+        self._spans = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def record(self, span):
+        with self._lock:
+            self._spans.append(span)
+
+    def spans(self, trace_id=None):
+        with self._lock:
+            spans = list(self._spans)
+        return [span for span in spans if trace_id is None or span.trace_id == trace_id]
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+
+_tracer = Tracer()
+
+def get_tracer():
+    """프로세스 전역 span 수집기"""
+    return _tracer
+
+def current_span():
+    """현재 실행 중인 span (없으면 None)"""
+    return _current_span.get()
+
+@contextmanager
+def span(name, **attributes):
+    """블록을 span으로 기록 (현재 span의 자식). 추적을 끄면 아무것도 기록하지 않음"""
+    if not TRACING_ENABLED:
+        yield None
+        return
+    new_span = Span(name, parent=_current_span.get(), attributes=attributes)
+    token = _current_span.set(new_span)
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        new_span.end_ns = time.time_ns()
+        _current_span.reset(token)
+        _tracer.record(new_span)
+
+def traced(name=None):
+    """함수 호출 전체를 span으로 기록하는 데코레이터"""
+    def decorator(fn):
+        span_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def current_trace_id():
+    """현재 span의 trace_id (없으면 None)"""
+    current = _current_span.get()
+    return current.trace_id if current is not None else None
+
+def set_attributes(**attributes):
+    """현재 span에 속성 기록 (span이 없으면 무시)"""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attributes)
+
+def add_count(key, amount=1):
+    """현재 span의 수치 속성 누적 (span이 없으면 무시)"""
+    current = _current_span.get()
+    if current is not None:
+        current.add(key, amount)
+
+def bind_context(fn):
+    """현재 span 문맥을 작업 스레드로 넘기도록 fn을 감쌈 (executor.submit 직전에 호출)"""
+    context = contextvars.copy_context()
+    return functools.partial(context.run, fn)
+
+def summarize_trace(trace_id):
+    """span 이름별 호출 수/소요 시간과 수치 속성 합계"""
+    spans = _tracer.spans(trace_id)
+    by_name = {}
+    totals = {key: 0 for key in SUMMED_ATTRIBUTES}
+    for item in spans:
+        row = by_name.setdefault(item.name, {'span': item.name, 'count': 0, 'seconds': 0.0, 'errors': 0})
+        row['count'] += 1
+        row['seconds'] += item.seconds
+        row['errors'] += 1 if item.error else 0
+        for key in SUMMED_ATTRIBUTES:
+            value = item.attributes.get(key)
+            if isinstance(value, (int, float)):
+                totals[key] += value
+    rows = sorted(by_name.values(), key=lambda row: row['seconds'], reverse=True)
+    for row in rows:
+        row['seconds'] = round(row['seconds'], 3)
+    return {'spans': rows, 'totals': totals}
+
+def export_json(trace_id=None):
+    """span 목록을 JSON 직렬화 가능한 dict 목록으로"""
+    return [item.to_dict() for item in _tracer.spans(trace_id)]
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+def export_otlp(trace_id=None):
+    """OpenTelemetry OTLP/JSON (ExportTraceServiceRequest) 형식으로 변환"""
+    spans = []
+    for item in _tracer.spans(trace_id):
+        otlp_span = {
+            'traceId': item.trace_id,
+            'spanId': item.span_id,
+            'name': item.name,
+            'kind': 1,
+            'startTimeUnixNano': str(item.start_ns),
+            'endTimeUnixNano': str(item.end_ns or item.start_ns),
+            'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in item.attributes.items()],
+            'status': {'code': 2, 'message': item.error} if item.error else {'code': 1},
+        }
+        if item.parent_id:
+            otlp_span['parentSpanId'] = item.parent_id
+        spans.append(otlp_span)
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': TRACE_SERVICE_NAME}}]},
+            'scopeSpans': [{'scope': {'name': 'pdf_analyzer.tracing'}, 'spans': spans}],
+        }]
+    }